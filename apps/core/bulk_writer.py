@@ -0,0 +1,170 @@
+"""
+Bulk Writer for Aura Core.
+
+Scans used to persist a whole directory's face records as one insert: a
+large scan made one huge request that could hit PostgREST's body limit or
+the statement timeout, and a failure lost every row. Re-running a scan
+after a partial failure then inserted the surviving rows again.
+
+write_chunks() / write_chunks_async() split records, in order, into chunks
+of at most DB_WRITE_CHUNK_ROWS rows and about DB_WRITE_CHUNK_BYTES of JSON,
+send up to DB_WRITE_CONCURRENCY chunks at once, and retry a failed chunk
+up to DB_WRITE_RETRIES times with jittered exponential backoff
+(DB_WRITE_BACKOFF seconds, doubling). Consecutive records of one file
+(same org_id and path) always share a chunk, so the data layers can write
+each file's faces as a whole: upsert_photo_faces (migration 008) upserts on
+(org_id, path, face_index) and drops faces the file no longer has, so
+retries and repeated scans leave exactly the current rows.
+
+write_fn returns counters for its chunk ({"stored", "bytes_added"}). Both
+return one report per chunk, so callers know exactly which records didn't
+make it:
+    {"stored", "failed", "bytes_added",
+     "chunks": [{"start", "rows", "stored", "bytes_added", "attempts", "error"}]}
+where start is the chunk's offset in records and bytes_added only counts
+chunks that were stored.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rows and approximate JSON bytes per request
+DB_WRITE_CHUNK_ROWS = int(os.getenv("DB_WRITE_CHUNK_ROWS", 500))
+DB_WRITE_CHUNK_BYTES = int(os.getenv("DB_WRITE_CHUNK_BYTES", 2 * 1024 * 1024))
+# Chunks in flight at once, attempts per chunk, first retry delay (doubles)
+DB_WRITE_CONCURRENCY = int(os.getenv("DB_WRITE_CONCURRENCY", 4))
+DB_WRITE_RETRIES = int(os.getenv("DB_WRITE_RETRIES", 3))
+DB_WRITE_BACKOFF = float(os.getenv("DB_WRITE_BACKOFF", 0.5))
+
+
+def chunk_records(
+    records: List[Dict[str, Any]],
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Split records, in order, into chunks of at most max_rows rows and about
+    max_bytes of JSON, never splitting a file's consecutive records (a file
+    larger than the bounds gets a chunk of its own). Defaults to
+    DB_WRITE_CHUNK_ROWS / DB_WRITE_CHUNK_BYTES.
+    """
+    max_rows = max(1, max_rows or DB_WRITE_CHUNK_ROWS)
+    max_bytes = max_bytes or DB_WRITE_CHUNK_BYTES
+    chunks: List[List[Dict[str, Any]]] = []
+    chunk: List[Dict[str, Any]] = []
+    size = 0
+    for _, group in groupby(records, key=lambda r: (r.get("org_id"), r.get("path"))):
+        group = list(group)
+        group_bytes = sum(len(json.dumps(record, default=str)) for record in group)
+        if chunk and (len(chunk) + len(group) > max_rows or size + group_bytes > max_bytes):
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.extend(group)
+        size += group_bytes
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _plan(records: List[Dict[str, Any]]):
+    chunks = chunk_records(records)
+    reports, offset = [], 0
+    for chunk in chunks:
+        reports.append({
+            "start": offset, "rows": len(chunk), "stored": 0, "bytes_added": 0, "attempts": 0, "error": None
+        })
+        offset += len(chunk)
+    return chunks, reports
+
+
+def _delay(attempt: int) -> float:
+    return DB_WRITE_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+
+def _failed(report: Dict[str, Any], attempt: int, e: Exception) -> bool:
+    # Records the failure; True if the chunk gets another attempt
+    report["error"] = str(e) or type(e).__name__
+    logger.warning(f"Chunk at {report['start']} ({report['rows']} rows) failed, attempt {attempt}: {e}")
+    if attempt < max(1, DB_WRITE_RETRIES):
+        return True
+    logger.error(f"Chunk at {report['start']} ({report['rows']} rows) failed after {attempt} attempts")
+    return False
+
+
+def _summary(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    stored = sum(r["stored"] for r in reports)
+    failed = sum(r["rows"] for r in reports if r["error"])
+    bytes_added = sum(r["bytes_added"] for r in reports if not r["error"])
+    logger.info(f"Stored {stored} records in {len(reports)} chunks ({failed} rows failed)")
+    return {"stored": stored, "failed": failed, "bytes_added": bytes_added, "chunks": reports}
+
+
+def write_chunks(
+    records: List[Dict[str, Any]],
+    write_fn: Callable[[List[Dict[str, Any]]], Dict[str, int]]
+) -> Dict[str, Any]:
+    """
+    Write records through write_fn (chunk -> counters, raising on failure)
+    in chunks on a small thread pool. Returns the chunk report.
+    """
+    chunks, reports = _plan(records)
+
+    def write(i: int) -> None:
+        report = reports[i]
+        attempt = 0
+        while True:
+            attempt += 1
+            report["attempts"] = attempt
+            try:
+                report.update(write_fn(chunks[i]))
+                report["error"] = None
+                return
+            except Exception as e:
+                if not _failed(report, attempt, e):
+                    return
+            time.sleep(_delay(attempt))
+
+    workers = min(max(1, DB_WRITE_CONCURRENCY), len(chunks))
+    if workers <= 1:
+        for i in range(len(chunks)):
+            write(i)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db-write") as pool:
+            list(pool.map(write, range(len(chunks))))
+    return _summary(reports)
+
+
+async def write_chunks_async(
+    records: List[Dict[str, Any]],
+    write_fn: Callable[[List[Dict[str, Any]]], Awaitable[Dict[str, int]]]
+) -> Dict[str, Any]:
+    """write_chunks for the async data layer: chunks are gathered on the loop."""
+    chunks, reports = _plan(records)
+    slots = asyncio.Semaphore(max(1, DB_WRITE_CONCURRENCY))
+
+    async def write(i: int) -> None:
+        report = reports[i]
+        attempt = 0
+        async with slots:
+            while True:
+                attempt += 1
+                report["attempts"] = attempt
+                try:
+                    report.update(await write_fn(chunks[i]))
+                    report["error"] = None
+                    return
+                except Exception as e:
+                    if not _failed(report, attempt, e):
+                        return
+                await asyncio.sleep(_delay(attempt))
+
+    await asyncio.gather(*(write(i) for i in range(len(chunks))))
+    return _summary(reports)
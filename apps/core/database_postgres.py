@@ -0,0 +1,309 @@
+"""
+Direct Postgres Backend for Aura Pro.
+
+With the Supabase adapters every similarity search goes SDK -> PostgREST ->
+match_faces(_tenant) plpgsql, encoding the 512-float query vector as JSON
+text on the way and adding an HTTP hop. With DB_BACKEND=postgres the hot
+paths talk to Postgres directly instead:
+
+- search_similar, upsert_photo_faces and add_photo_matches run
+  through a psycopg connection pool (DB_POOL_MIN..DB_POOL_MAX),
+- statements are prepared server-side on first use (DB_PREPARE),
+- vectors travel in pgvector's binary format, not as text.
+
+database_supabase and database_supabase_async delegate those helpers here
+when use_postgres() is true; everything else still goes through Supabase.
+Results match the Supabase helpers (ids and dates as strings).
+
+Needs `pip install "psycopg[binary,pool]" pgvector` and DATABASE_URL (the
+project's direct connection string). Transaction-mode poolers (Supavisor
+port 6543, PgBouncer) don't keep prepared statements: use the direct or
+session-mode connection, or set DB_PREPARE=0.
+"""
+import os
+import logging
+import threading
+from typing import List, Dict, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+# "supabase" (default) or "postgres" for the direct path below
+DB_BACKEND = os.environ.get("DB_BACKEND", "supabase")
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))
+# Seconds to wait for a free pooled connection
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+# Server-side prepared statements (0 for transaction-mode poolers)
+DB_PREPARE = os.environ.get("DB_PREPARE", "1") == "1"
+
+# photos columns records may set, with the type each parameter is cast to
+PHOTO_COLUMNS = {
+    "path": "text",
+    "full_path": "text",
+    "embedding": "vector",
+    "photo_date": "date",
+    "metadata": "jsonb",
+    "org_id": "uuid",
+    "size_bytes": "bigint",
+    "face_index": "smallint",
+    "bbox": "real[]",
+    "det_score": "real",
+}
+
+CONFLICT_KEY = ("org_id", "path", "face_index")
+
+# Same match as the unique (org_id, path, face_index) index, NULL orgs included
+_SAME_FILE = "p.path = f.path AND (p.org_id = f.org_id OR (p.org_id IS NULL AND f.org_id IS NULL))"
+
+FILE_BYTES_SQL = f"""
+    SELECT coalesce(sum(p.size_bytes), 0)
+    FROM unnest(%(org_ids)s::uuid[], %(paths)s::text[]) AS f(org_id, path)
+    JOIN public.photos p ON {_SAME_FILE}
+"""
+
+DELETE_STALE_SQL = f"""
+    DELETE FROM public.photos p
+    USING unnest(%(org_ids)s::uuid[], %(paths)s::text[], %(faces)s::int[]) AS f(org_id, path, faces)
+    WHERE {_SAME_FILE} AND p.face_index >= f.faces
+"""
+
+SEARCH_SQL = """
+    SELECT id, path, photo_date, metadata, 1 - (embedding <=> %(q)b) AS similarity
+    FROM public.photos
+    WHERE embedding <=> %(q)b < 1 - %(threshold)s
+    ORDER BY embedding <=> %(q)b
+    LIMIT %(limit)s
+"""
+
+SEARCH_TENANT_SQL = """
+    SELECT id, path, photo_date, metadata, 1 - (embedding <=> %(q)b) AS similarity
+    FROM public.photos
+    WHERE org_id = %(org_id)s AND embedding <=> %(q)b < 1 - %(threshold)s
+    ORDER BY embedding <=> %(q)b
+    LIMIT %(limit)s
+"""
+
+MATCHES_SQL = """
+    INSERT INTO public.photo_matches (photo_id, user_id, similarity)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (photo_id, user_id) DO UPDATE SET similarity = EXCLUDED.similarity
+"""
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def use_postgres() -> bool:
+    """True when this deployment routes the hot paths to Postgres directly."""
+    return DB_BACKEND == "postgres"
+
+
+def _configure(conn) -> None:
+    from pgvector.psycopg import register_vector
+    register_vector(conn)
+
+
+def get_pool():
+    """Get or create the shared psycopg ConnectionPool (thread-safe)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                from psycopg_pool import ConnectionPool
+                import pgvector.psycopg  # noqa: F401
+            except ImportError as e:
+                raise RuntimeError(
+                    'DB_BACKEND=postgres needs psycopg and pgvector: pip install "psycopg[binary,pool]" pgvector'
+                ) from e
+            if not DATABASE_URL:
+                raise ValueError("DB_BACKEND=postgres needs DATABASE_URL. Please set it in apps/core/.env")
+
+            _pool = ConnectionPool(
+                DATABASE_URL,
+                min_size=DB_POOL_MIN,
+                max_size=DB_POOL_MAX,
+                timeout=DB_POOL_TIMEOUT,
+                configure=_configure,
+                # prepare_threshold=0 prepares every statement on first use
+                kwargs={"prepare_threshold": 0 if DB_PREPARE else None},
+                name="aura-postgres",
+                open=True
+            )
+            logger.info(f"Postgres pool opened ({DB_POOL_MIN}-{DB_POOL_MAX} connections)")
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def _vector(values):
+    import numpy as np
+    return np.asarray(values, dtype=np.float32)
+
+
+def insert_sql(columns: List[str]) -> str:
+    """
+    Upsert for one photos column set on the (org_id, path, face_index)
+    natural key (migration 008), returning ids. Columns are whitelisted.
+    """
+    unknown = [c for c in columns if c not in PHOTO_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown photos column(s): {', '.join(unknown)}")
+    placeholders = ", ".join(
+        ("%b" if c == "embedding" else "%s") + f"::{PHOTO_COLUMNS[c]}" for c in columns
+    )
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c not in CONFLICT_KEY) or "path = EXCLUDED.path"
+    return (
+        f"INSERT INTO public.photos ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({', '.join(CONFLICT_KEY)}) DO UPDATE SET {updates} RETURNING id"
+    )
+
+
+def _params(record: Dict[str, Any], columns: List[str]) -> List[Any]:
+    from psycopg.types.json import Jsonb
+    params = []
+    for c in columns:
+        value = record[c]
+        if c == "embedding":
+            value = _vector(value)
+        elif c == "metadata" and value is not None:
+            value = Jsonb(value)
+        params.append(value)
+    return params
+
+
+def file_faces(records: List[Dict[str, Any]]) -> Dict[tuple, int]:
+    """
+    (org_id, path) -> number of faces, for every file in records. A record
+    without "embedding" stands for a file with no faces.
+    """
+    files: Dict[tuple, int] = {}
+    for record in records:
+        key = (record.get("org_id"), record["path"])
+        faces = (record.get("face_index") or 0) + 1 if "embedding" in record else 0
+        files[key] = max(files.get(key, 0), faces)
+    return files
+
+
+def upsert_photo_faces(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Postgres form of the upsert_photo_faces RPC (migration 008), in one
+    transaction: records (every face of each file they cover) are upserted,
+    rows of those files with a higher face_index are deleted, and
+    bytes_added is the change in the files' summed size_bytes. Returns
+    {"ids" (aligned with records, None for faceless files), "bytes_added"};
+    raises on failure.
+    """
+    if not records:
+        return {"ids": [], "bytes_added": 0}
+    # Records sharing a column set go through one prepared, pipelined
+    # executemany
+    groups: Dict[tuple, List[int]] = {}
+    for i, record in enumerate(records):
+        if "embedding" in record:
+            groups.setdefault(tuple(record.keys()), []).append(i)
+    files = file_faces(records)
+    keys = {"org_ids": [k[0] for k in files], "paths": [k[1] for k in files]}
+
+    ids: List[Any] = [None] * len(records)
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(FILE_BYTES_SQL, keys)
+        old_bytes = cur.fetchone()[0]
+        for columns, indices in groups.items():
+            columns = list(columns)
+            cur.executemany(
+                insert_sql(columns),
+                [_params(records[i], columns) for i in indices],
+                returning=True
+            )
+            for i in indices:
+                ids[i] = str(cur.fetchone()[0])
+                cur.nextset()
+        cur.execute(DELETE_STALE_SQL, {**keys, "faces": list(files.values())})
+        cur.execute(FILE_BYTES_SQL, keys)
+        new_bytes = cur.fetchone()[0]
+    return {"ids": ids, "bytes_added": int(new_bytes - old_bytes)}
+
+
+def store_embeddings(records: List[Dict[str, Any]]) -> int:
+    """Upsert face records; returns the number stored (0 on failure)."""
+    if not records:
+        return 0
+    try:
+        count = sum(i is not None for i in upsert_photo_faces(records)["ids"])
+        logger.info(f"Stored {count} embeddings in Postgres")
+        return count
+    except Exception as e:
+        logger.error(f"Failed to store embeddings: {e}")
+        return 0
+
+
+def store_embeddings_batch(records: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """upsert_photo_faces ids aligned with records, all None on failure."""
+    if not records:
+        return []
+    try:
+        ids = upsert_photo_faces(records)["ids"]
+        logger.info(f"Stored {len(ids)} embeddings in Postgres (bulk)")
+        return ids
+    except Exception as e:
+        logger.error(f"Failed to bulk store embeddings: {e}")
+        return [None] * len(records)
+
+
+def search_similar(
+    query_embedding: List[float],
+    threshold: float = 0.6,
+    limit: int = 100,
+    org_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Same query and result format as database_supabase.search_similar, as a
+    prepared statement with the query vector sent in binary.
+    """
+    try:
+        params = {"q": _vector(query_embedding), "threshold": threshold, "limit": limit, "org_id": org_id}
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute(SEARCH_TENANT_SQL if org_id else SEARCH_SQL, params)
+            rows = cur.fetchall()
+
+        normalized = []
+        for photo_id, path, photo_date, metadata, sim in rows:
+            normalized.append({
+                "id": str(photo_id),
+                "source_path": path,
+                "photo_date": photo_date.isoformat() if photo_date else None,
+                "similarity": sim,
+                "distance": 1.0 - sim,
+                "metadata": metadata
+            })
+
+        logger.info(f"Found {len(normalized)} matches above similarity {threshold}")
+        return normalized
+
+    except Exception as e:
+        logger.error(f"Search failed: {e}")
+        return []
+
+
+def add_photo_matches(matches: List[Dict[str, Any]]) -> int:
+    """Upsert {photo_id, user_id, similarity} rows into photo_matches."""
+    if not matches:
+        return 0
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.executemany(
+                MATCHES_SQL,
+                [(m["photo_id"], m["user_id"], m.get("similarity")) for m in matches]
+            )
+        return len(matches)
+    except Exception as e:
+        logger.error(f"Error adding photo matches: {e}")
+        return 0
@@ -7,6 +7,8 @@ import logging
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 
+import database_postgres
+
 logger = logging.getLogger(__name__)
 
 # Lazy client initialization
@@ -42,23 +44,65 @@ def store_embeddings(records: List[Dict[str, Any]]) -> int:
         records: List of dicts with keys: path, embedding, photo_date, metadata
         
     Returns:
-        Number of records stored
+        Number of records stored (see upsert_embeddings for the details)
+    """
+    return upsert_embeddings(records)["stored"]
+
+
+def upsert_photo_faces(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Write the faces of whole files in one transaction (upsert_photo_faces
+    RPC, migration 008). records must hold every face of each file they
+    cover: rows are upserted on (org_id, path, face_index) and the files'
+    rows with a higher face_index are deleted. A record without "embedding"
+    ({"org_id", "path"}) stands for a file that has no faces now, and
+    clears its rows.
+
+    Returns {"ids" (aligned with records, None for faceless files),
+    "bytes_added"}, where bytes_added is the change in the files'
+    size_bytes (what to charge the org). Raises on failure.
     """
+    if database_postgres.use_postgres():
+        return database_postgres.upsert_photo_faces(records)
+    if not records:
+        return {"ids": [], "bytes_added": 0}
+    result = get_client().rpc("upsert_photo_faces", {"p_rows": records}).execute()
+    data = result.data or {}
+    ids = data.get("ids") or []
+    if len(ids) != len(records):
+        raise RuntimeError(f"upsert_photo_faces returned {len(ids)} ids for {len(records)} records")
+    return {"ids": [str(i) if i is not None else None for i in ids], "bytes_added": int(data.get("bytes_added") or 0)}
+
+
+def _upsert_chunk(chunk: List[Dict[str, Any]]) -> Dict[str, int]:
+    written = upsert_photo_faces(chunk)
+    return {"stored": sum(i is not None for i in written["ids"]), "bytes_added": written["bytes_added"]}
+
+
+def upsert_embeddings(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    upsert_photo_faces in size-bounded chunks (never splitting a file),
+    several at once, retrying failed chunks (see bulk_writer). Returns
+    {"stored", "failed", "bytes_added", "chunks"} with one report per chunk.
+    """
+    from bulk_writer import write_chunks
+    return write_chunks(records, _upsert_chunk)
+
+
+def store_embeddings_batch(records: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """
+    upsert_photo_faces in one request, returning only the IDs, aligned with
+    records. On failure every ID is None.
+    """
+    if not records:
+        return []
     try:
-        client = get_client()
-        
-        # Supabase insert supports list of dicts
-        result = client.table("photos").insert(records).execute()
-        
-        count = len(result.data) if result.data else 0
-        logger.info(f"Stored {count} embeddings in Supabase")
-        return count
-        
-        return count
-        
+        ids = upsert_photo_faces(records)["ids"]
+        logger.info(f"Stored {len(ids)} embeddings in Supabase (bulk)")
+        return ids
     except Exception as e:
-        logger.error(f"Failed to store embeddings: {e}")
-        return 0
+        logger.error(f"Failed to bulk store embeddings: {e}")
+        return [None] * len(records)
 
 
 def store_embedding(
@@ -84,27 +128,24 @@ def store_embedding(
         The ID of the created record, or None
     """
     try:
-        client = get_client()
         record = {
             "path": source_path,
             "embedding": embedding,
             "photo_date": photo_date,
-            "metadata": metadata
+            "metadata": metadata,
+            "face_index": 0
         }
         if org_id:
             record["org_id"] = org_id
         if size_bytes > 0:
             record["size_bytes"] = size_bytes
             
-        result = client.table("photos").insert(record).execute()
+        written = upsert_photo_faces([record])
         
-        if result.data and len(result.data) > 0:
-            new_id = result.data[0]["id"]
-            # Increment org storage counter if applicable
-            if org_id and size_bytes > 0:
-                update_storage_stats(org_id, size_bytes)
-            return new_id
-        return None
+        # Charge the org only for bytes the write actually added
+        if org_id and written["bytes_added"]:
+            update_storage_stats(org_id, written["bytes_added"])
+        return written["ids"][0]
         
     except Exception as e:
         logger.error(f"Failed to store embedding: {e}")
@@ -129,6 +170,8 @@ def search_similar(
     Returns:
         List of matches with keys: id, source_path, distance, photo_date, similarity
     """
+    if database_postgres.use_postgres():
+        return database_postgres.search_similar(query_embedding, threshold, limit, org_id)
     try:
         client = get_client()
         
@@ -234,6 +277,8 @@ def add_photo_matches(matches: List[Dict[str, Any]]) -> int:
     Batch insert photo matches into the junction table.
     matches: List of {photo_id, user_id, similarity}
     """
+    if database_postgres.use_postgres():
+        return database_postgres.add_photo_matches(matches)
     if not matches:
         return 0
     try:
@@ -256,48 +301,70 @@ def log_usage(
     """
     Log resource usage for a tenant.
     Used for Phase 5B SuperAdmin analytics.
+
+    Buffered and written in bulk by usage_buffer (unless disabled), so this
+    returns without a database round trip.
     """
+    from usage_buffer import buffer_usage
+    row = {
+        "org_id": org_id,
+        "user_id": user_id,
+        "action": action,
+        "bytes_processed": bytes_processed,
+        "metadata": metadata
+    }
+    accepted = buffer_usage(row)
+    if accepted is not None:
+        return accepted
+    return insert_usage_logs([row])
+
+
+def insert_usage_logs(rows: List[Dict[str, Any]]) -> bool:
+    """Insert usage_logs rows in one request (usage_buffer's flush)."""
+    if not rows:
+        return True
     try:
         client = get_client()
-        client.table("usage_logs").insert({
-            "org_id": org_id,
-            "user_id": user_id,
-            "action": action,
-            "bytes_processed": bytes_processed,
-            "metadata": metadata
-        }).execute()
+        client.table("usage_logs").insert(rows).execute()
         return True
     except Exception as e:
-        logger.error(f"Failed to log usage for org {org_id}: {e}")
+        logger.error(f"Failed to log {len(rows)} usage events: {e}")
         return False
 
 
 def update_storage_stats(org_id: str, bytes_added: int) -> bool:
-    """Update the storage_used_bytes counter for an organization atomically."""
+    """
+    Update the storage_used_bytes counter for an organization atomically.
+
+    Accumulated in storage_ledger and flushed as one increment per org
+    (unless disabled), so this returns without a database round trip.
+    """
+    from storage_ledger import record_storage
+    if record_storage(org_id, bytes_added):
+        return True
+    # Never read-modify-write: concurrent uploads would lose increments
+    return increment_org_storage(org_id, bytes_added)
+
+
+def increment_org_storage(org_id: str, delta: int) -> bool:
+    """One atomic increment_org_storage RPC (storage_ledger's flush)."""
     try:
-        client = get_client()
-        # Use the atomic increment RPC from Phase 5B migration
-        client.rpc("increment_org_storage", {
-            "p_org_id": org_id,
-            "p_bytes": bytes_added
-        }).execute()
+        get_client().rpc("increment_org_storage", {"p_org_id": org_id, "p_bytes": delta}).execute()
         return True
     except Exception as e:
-        logger.error(f"Failed to update storage stats for org {org_id}: {e}")
-        # Fallback to manual update if RPC fails (might happen before migration is run)
-        try:
-            res = client.table("organizations").select("storage_used_bytes").eq("id", org_id).single().execute()
-            if res.data:
-                current = res.data["storage_used_bytes"] or 0
-                client.table("organizations").update({
-                    "storage_used_bytes": current + bytes_added
-                }).eq("id", org_id).execute()
-                return True
-        except:
-            pass
+        logger.error(f"Failed to increment storage for org {org_id}: {e}")
         return False
 
 
+def get_org_storage(org_ids) -> Dict[str, Dict[str, Any]]:
+    """storage_limit_gb and storage_used_bytes per org id, in one query."""
+    client = get_client()
+    res = client.table("organizations").select(
+        "id, storage_limit_gb, storage_used_bytes"
+    ).in_("id", list(org_ids)).execute()
+    return {str(row["id"]): row for row in res.data or []}
+
+
 # ============================================================================
 # LEGACY LANCEDB IMPLEMENTATION (For Reference)
 # ============================================================================
@@ -0,0 +1,380 @@
+"""
+Async Supabase Data Layer for Aura Pro.
+
+database_supabase wraps the synchronous Supabase SDK: every helper holds
+the event loop for a full HTTP round trip when called from an `async def`
+route. This module offers the same helpers, with the same signatures and
+fallback return values, as coroutines that talk to PostgREST and Storage
+directly over one shared httpx.AsyncClient:
+
+- keep-alive connections are reused across requests,
+- at most SUPABASE_HTTP_MAX_CONNECTIONS requests are in flight per worker
+  (further calls wait up to the pool timeout for a connection),
+- every call has a timeout (SUPABASE_HTTP_TIMEOUT, SUPABASE_RPC_TIMEOUT for
+  vector search).
+
+Independent calls can run concurrently:
+
+    matches, urls = await asyncio.gather(
+        search_similar(embedding, org_id=org_id),
+        asyncio.gather(*(get_signed_url(p) for p in paths)),
+    )
+
+With DB_BACKEND=postgres the vector hot paths (search_similar,
+upsert_photo_faces, add_photo_matches) run on database_postgres'
+connection pool instead, off the event loop.
+
+close_client() is called from main.lifespan on shutdown.
+"""
+import os
+import asyncio
+import logging
+from typing import List, Dict, Optional, Any
+
+import database_postgres
+
+logger = logging.getLogger(__name__)
+
+# Concurrent connections to Supabase per worker (further calls queue)
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_HTTP_MAX_CONNECTIONS", 20))
+# Idle keep-alive connections kept open
+SUPABASE_HTTP_KEEPALIVE = int(os.environ.get("SUPABASE_HTTP_KEEPALIVE", 10))
+# Seconds per call (connect, read, write and waiting for a free connection)
+SUPABASE_HTTP_TIMEOUT = float(os.environ.get("SUPABASE_HTTP_TIMEOUT", 10))
+# Seconds for pgvector similarity RPCs, which scan more rows
+SUPABASE_RPC_TIMEOUT = float(os.environ.get("SUPABASE_RPC_TIMEOUT", 30))
+
+PHOTOS_BUCKET = "photos"
+
+# Lazy client initialization (one per event loop)
+_client = None
+_client_loop = None
+
+
+def get_client():
+    """
+    Get or create the shared httpx.AsyncClient for the running event loop.
+
+    Connections belong to the loop that opened them, so a client created on
+    another loop (tests, scripts calling asyncio.run twice) is replaced.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        import httpx
+
+        url = os.environ.get("SUPABASE_URL")
+        key = os.environ.get("SUPABASE_KEY")
+
+        if not url or not key:
+            raise ValueError(
+                "Missing SUPABASE_URL or SUPABASE_KEY environment variables. "
+                "Please set them in apps/core/.env"
+            )
+
+        _client = httpx.AsyncClient(
+            base_url=url.rstrip("/"),
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            limits=httpx.Limits(
+                max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_HTTP_KEEPALIVE
+            ),
+            timeout=SUPABASE_HTTP_TIMEOUT
+        )
+        _client_loop = loop
+        logger.info(f"Async Supabase client initialized ({SUPABASE_HTTP_MAX_CONNECTIONS} connections)")
+
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client and its pooled connections."""
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+
+async def _request(
+    method: str,
+    path: str,
+    timeout: Optional[float] = None,
+    prefer: Optional[str] = None,
+    **kwargs
+) -> Any:
+    """Send one request and return the decoded JSON body (None if empty)."""
+    headers = kwargs.pop("headers", {})
+    if prefer:
+        headers["Prefer"] = prefer
+    response = await get_client().request(
+        method, path, headers=headers, timeout=timeout or SUPABASE_HTTP_TIMEOUT, **kwargs
+    )
+    response.raise_for_status()
+    return response.json() if response.content else None
+
+
+async def _rpc(name: str, params: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+    return await _request("POST", f"/rest/v1/rpc/{name}", timeout=timeout, json=params)
+
+
+async def upsert_photo_faces(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Write the faces of whole files in one transaction (see
+    database_supabase.upsert_photo_faces). Returns {"ids", "bytes_added"};
+    raises on failure.
+    """
+    if database_postgres.use_postgres():
+        return await asyncio.to_thread(database_postgres.upsert_photo_faces, records)
+    if not records:
+        return {"ids": [], "bytes_added": 0}
+    data = await _rpc("upsert_photo_faces", {"p_rows": records}, timeout=SUPABASE_RPC_TIMEOUT) or {}
+    ids = data.get("ids") or []
+    if len(ids) != len(records):
+        raise RuntimeError(f"upsert_photo_faces returned {len(ids)} ids for {len(records)} records")
+    return {"ids": [str(i) if i is not None else None for i in ids], "bytes_added": int(data.get("bytes_added") or 0)}
+
+
+async def store_embeddings(records: List[Dict[str, Any]]) -> int:
+    """
+    Store multiple face embeddings in Supabase.
+
+    Args:
+        records: List of dicts with keys: path, embedding, photo_date, metadata
+
+    Returns:
+        Number of records stored (see upsert_embeddings for the details)
+    """
+    return (await upsert_embeddings(records))["stored"]
+
+
+async def _upsert_chunk(chunk: List[Dict[str, Any]]) -> Dict[str, int]:
+    written = await upsert_photo_faces(chunk)
+    return {"stored": sum(i is not None for i in written["ids"]), "bytes_added": written["bytes_added"]}
+
+
+async def upsert_embeddings(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    upsert_photo_faces in size-bounded chunks (never splitting a file),
+    several at once, retrying failed chunks (see bulk_writer). Returns
+    {"stored", "failed", "bytes_added", "chunks"} with one report per chunk.
+    """
+    from bulk_writer import write_chunks_async
+    return await write_chunks_async(records, _upsert_chunk)
+
+
+async def store_embeddings_batch(records: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """
+    upsert_photo_faces in one request, returning only the IDs, aligned with
+    records. On failure every ID is None.
+    """
+    if not records:
+        return []
+    try:
+        ids = (await upsert_photo_faces(records))["ids"]
+        logger.info(f"Stored {len(ids)} embeddings in Supabase (bulk)")
+        return ids
+    except Exception as e:
+        logger.error(f"Failed to bulk store embeddings: {e}")
+        return [None] * len(records)
+
+
+async def store_embedding(
+    source_path: str,
+    embedding: List[float],
+    photo_date: Optional[str] = None,
+    metadata: Dict[str, Any] = {},
+    org_id: Optional[str] = None,
+    size_bytes: int = 0
+) -> Optional[str]:
+    """
+    Store a single face embedding in Supabase.
+
+    Returns:
+        The ID of the created record, or None
+    """
+    try:
+        record = {
+            "path": source_path,
+            "embedding": embedding,
+            "photo_date": photo_date,
+            "metadata": metadata,
+            "face_index": 0
+        }
+        if org_id:
+            record["org_id"] = org_id
+        if size_bytes > 0:
+            record["size_bytes"] = size_bytes
+
+        written = await upsert_photo_faces([record])
+
+        # Charge the org only for bytes the write actually added
+        if org_id and written["bytes_added"]:
+            await update_storage_stats(org_id, written["bytes_added"])
+        return written["ids"][0]
+
+    except Exception as e:
+        logger.error(f"Failed to store embedding: {e}")
+        return None
+
+
+async def search_similar(
+    query_embedding: List[float],
+    threshold: float = 0.6,
+    limit: int = 100,
+    org_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Search for similar faces using cosine similarity (see
+    database_supabase.search_similar for the result format).
+    """
+    if database_postgres.use_postgres():
+        return await asyncio.to_thread(database_postgres.search_similar, query_embedding, threshold, limit, org_id)
+    try:
+        rpc_name = "match_faces_tenant" if org_id else "match_faces"
+        rpc_params = {
+            "query_embedding": query_embedding,
+            "match_threshold": threshold,
+            "match_count": limit
+        }
+        if org_id:
+            rpc_params["p_org_id"] = org_id
+
+        matches = await _rpc(rpc_name, rpc_params, timeout=SUPABASE_RPC_TIMEOUT) or []
+
+        normalized = []
+        for m in matches:
+            sim = m.get("similarity", 0)
+            normalized.append({
+                "id": m["id"],
+                "source_path": m["path"],
+                "photo_date": m.get("photo_date"),
+                "similarity": sim,
+                "distance": 1.0 - sim, # Approx conversion for backward compat
+                "metadata": m.get("metadata")
+            })
+
+        logger.info(f"Found {len(normalized)} matches above similarity {threshold}")
+        return normalized
+
+    except Exception as e:
+        logger.error(f"Search failed: {e}")
+        return []
+
+
+async def get_signed_url(path: str, expires_in: int = 3600) -> Optional[str]:
+    """
+    Generate a short-lived signed URL for an image in the photos bucket.
+
+    Returns:
+        Signed URL string, or None on failure
+    """
+    try:
+        file_path = path.lstrip("/")
+        result = await _request(
+            "POST", f"/storage/v1/object/sign/{PHOTOS_BUCKET}/{file_path}",
+            json={"expiresIn": expires_in}
+        )
+        signed = result.get("signedURL") or result.get("signedUrl")
+        # Storage returns a path relative to /storage/v1
+        base_url = str(get_client().base_url).rstrip("/")
+        return f"{base_url}/storage/v1{signed}" if signed else None
+
+    except Exception as e:
+        logger.error(f"Failed to generate signed URL for {path}: {e}")
+        return None
+
+
+async def get_stats() -> Dict[str, Any]:
+    """Get database statistics."""
+    try:
+        rows = await _rpc("get_db_stats", {})
+        if rows:
+            return {
+                "total_faces": rows[0]["total_faces"],
+                "table_exists": rows[0]["table_exists"]
+            }
+        return {"total_faces": 0, "table_exists": False}
+
+    except Exception as e:
+        logger.error(f"Failed to get stats: {e}")
+        return {"total_faces": 0, "table_exists": False}
+
+
+async def get_user_embedding(user_id: str) -> Optional[List[float]]:
+    """Fetch the reference face embedding for a specific user."""
+    try:
+        rows = await _request("GET", "/rest/v1/users", params={"select": "embedding", "id": f"eq.{user_id}"})
+        if rows:
+            return rows[0]["embedding"]
+        return None
+    except Exception as e:
+        logger.error(f"Error fetching user embedding for {user_id}: {e}")
+        return None
+
+
+async def add_photo_matches(matches: List[Dict[str, Any]]) -> int:
+    """
+    Batch upsert photo matches into the junction table.
+    matches: List of {photo_id, user_id, similarity}
+    """
+    if database_postgres.use_postgres():
+        return await asyncio.to_thread(database_postgres.add_photo_matches, matches)
+    if not matches:
+        return 0
+    try:
+        rows = await _request(
+            "POST", "/rest/v1/photo_matches",
+            prefer="resolution=merge-duplicates,return=representation", json=matches
+        )
+        return len(rows) if rows else 0
+    except Exception as e:
+        logger.error(f"Error adding photo matches: {e}")
+        return 0
+
+
+async def log_usage(
+    org_id: str,
+    action: str,
+    user_id: Optional[str] = None,
+    bytes_processed: int = 0,
+    metadata: Dict[str, Any] = {}
+) -> bool:
+    """
+    Log resource usage for a tenant (SuperAdmin analytics). Buffered by
+    usage_buffer unless disabled, in which case the row is written now.
+    """
+    from usage_buffer import buffer_usage
+    row = {
+        "org_id": org_id,
+        "user_id": user_id,
+        "action": action,
+        "bytes_processed": bytes_processed,
+        "metadata": metadata
+    }
+    accepted = buffer_usage(row)
+    if accepted is not None:
+        return accepted
+    try:
+        await _request("POST", "/rest/v1/usage_logs", prefer="return=minimal", json=row)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to log usage for org {org_id}: {e}")
+        return False
+
+
+async def update_storage_stats(org_id: str, bytes_added: int) -> bool:
+    """
+    Update the storage_used_bytes counter for an organization atomically.
+    Accumulated by storage_ledger unless disabled.
+    """
+    from storage_ledger import record_storage
+    if record_storage(org_id, bytes_added):
+        return True
+    # Never read-modify-write: concurrent uploads would lose increments
+    try:
+        await _rpc("increment_org_storage", {"p_org_id": org_id, "p_bytes": bytes_added})
+        return True
+    except Exception as e:
+        logger.error(f"Failed to update storage stats for org {org_id}: {e}")
+        return False
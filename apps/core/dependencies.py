@@ -1,7 +1,9 @@
 import os
+import time
 import logging
+import threading
 import jwt
-from fastapi import Header
+from fastapi import Header, HTTPException
 from typing import Optional, Dict, Any
 
 # Setup Logging
@@ -11,17 +13,143 @@ logger = logging.getLogger(__name__)
 JWT_SECRET = os.environ.get("JWT_SECRET", "aura_secret_key")
 ADMIN_PIN = os.environ.get("ADMIN_PIN", "1234")
 
+# Seconds a request waits for the model before getting 503
+MODEL_READY_TIMEOUT = float(os.environ.get("MODEL_READY_TIMEOUT", 30))
+# Seconds before a failed model load may be retried
+MODEL_RETRY_SECONDS = float(os.environ.get("MODEL_RETRY_SECONDS", 30))
+# Shared inference sidecar (inference_server.py); when set, this worker
+# connects to it instead of loading its own model
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET")
+
 # Global Processor State
+# The model is loaded (and warmed up) on a background thread started by
+# main.lifespan; requests wait on readiness instead of loading inline.
 processor = None
+_model_cond = threading.Condition()
+_model_state: Dict[str, Any] = {
+    "status": "idle",  # idle -> loading -> ready | failed
+    "error": None,
+    "started_at": None,
+    "finished_at": None,
+    "load_seconds": None,
+    "warmup_ms": None,
+    "startup": None,  # per-phase cold start timings (ms)
+}
+
 
-def get_processor():
-    """Lazy load the FaceProcessor instance."""
+def _load_model():
     global processor
-    if processor is None:
-        from processor import FaceProcessor
-        logger.info("Initializing FaceProcessor...")
-        processor = FaceProcessor()
-    return processor
+    start = time.time()
+    startup: Dict[str, Any] = {}
+    try:
+        if INFERENCE_SOCKET:
+            from inference_server import InferenceClient
+            logger.info(f"Connecting to inference sidecar at {INFERENCE_SOCKET}...")
+            fp = InferenceClient(INFERENCE_SOCKET)
+        else:
+            phase = time.perf_counter()
+            import processor as processor_module  # noqa: F401 (insightface/onnxruntime imports)
+            from processor_pool import create_processor
+            startup["imports_ms"] = round((time.perf_counter() - phase) * 1000, 1)
+            logger.info("Loading FaceProcessor in background...")
+            phase = time.perf_counter()
+            fp = create_processor()
+            startup["load_ms"] = round((time.perf_counter() - phase) * 1000, 1)
+        timings = getattr(fp, "load_timings", None)
+        if isinstance(timings, dict):
+            startup.update(timings)
+        warmup_ms = fp.warm_up()
+    except Exception as e:
+        logger.error(f"FaceProcessor failed to load: {e}")
+        with _model_cond:
+            _model_state.update(status="failed", error=str(e), finished_at=time.time())
+            _model_cond.notify_all()
+        return
+
+    with _model_cond:
+        processor = fp
+        _model_state.update(
+            status="ready",
+            error=None,
+            finished_at=time.time(),
+            load_seconds=round(time.time() - start, 2),
+            warmup_ms=round(warmup_ms, 1),
+            startup=startup
+        )
+        _model_cond.notify_all()
+    report = ", ".join(f"{k}={v}" for k, v in startup.items())
+    logger.info(f"FaceProcessor ready in {time.time() - start:.1f}s (warm-up {warmup_ms:.0f} ms) [{report}]")
+
+
+def start_model_loading() -> bool:
+    """
+    Start loading the model on a background thread, unless it is already
+    loading, loaded, or failed less than MODEL_RETRY_SECONDS ago.
+    Returns True if a load was started.
+    """
+    with _model_cond:
+        status = _model_state["status"]
+        if status in ("loading", "ready"):
+            return False
+        if status == "failed" and time.time() - _model_state["finished_at"] < MODEL_RETRY_SECONDS:
+            return False
+        _model_state.update(status="loading", error=None, started_at=time.time(), finished_at=None)
+
+    threading.Thread(target=_load_model, name="model-loader", daemon=True).start()
+    return True
+
+
+def model_status() -> Dict[str, Any]:
+    """Snapshot of the model loading state; never touches the model."""
+    with _model_cond:
+        return dict(_model_state)
+
+
+def processor_pool_stats() -> Optional[Dict[str, Any]]:
+    """Checkout/utilisation metrics when the model is a ProcessorPool, else None."""
+    from processor_pool import ProcessorPool
+    current = processor
+    return current.stats() if isinstance(current, ProcessorPool) else None
+
+
+def close_processor() -> None:
+    """Release the loaded model's threads or sidecar connection (called from main.lifespan)."""
+    current = processor
+    if current is not None:
+        current.close()
+
+
+def get_processor(timeout: Optional[float] = None):
+    """
+    Return the loaded FaceProcessor, waiting up to timeout seconds
+    (default MODEL_READY_TIMEOUT) for the background load to finish. With
+    INFERENCE_SOCKET set this is an InferenceClient for the shared sidecar.
+
+    Starts the load if nothing has yet (e.g. scripts and tests that skip
+    the lifespan). Raises HTTPException 503 if the model isn't ready in time
+    or failed to load. Blocks while waiting, so call it from a thread
+    (run_in_threadpool) in async code.
+    """
+    if processor is not None:
+        return processor
+
+    start_model_loading()
+    with _model_cond:
+        _model_cond.wait_for(
+            lambda: _model_state["status"] in ("ready", "failed"),
+            MODEL_READY_TIMEOUT if timeout is None else timeout
+        )
+        state = dict(_model_state)
+
+    if processor is not None:
+        return processor
+    if state["status"] == "failed":
+        raise HTTPException(status_code=503, detail=f"Face model failed to load: {state['error']}")
+    raise HTTPException(
+        status_code=503,
+        detail="Face model is still loading",
+        headers={"Retry-After": "5"}
+    )
 
 def get_auth_context(authorization: str = Header(None)) -> Dict[str, Any]:
     """Extract role and org_id from JWT."""
@@ -0,0 +1,202 @@
+"""
+Embedding Cache for Aura Core.
+
+Guests re-submit the same selfie constantly (retries, page reloads, QR
+re-scans at events), and every upload used to cost a full detection +
+recognition pass. Embeddings are cached by the SHA-256 of the uploaded
+bytes plus the model version, in an in-memory LRU with TTL and an optional
+SQLite tier that survives restarts and is shared between workers.
+
+"No face" results are cached too, so a bad selfie resubmitted in a loop
+doesn't keep the CPU busy either.
+"""
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple, Callable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# In-memory entries (0 disables the cache entirely)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", 1024))
+
+# Seconds an entry stays valid, in both tiers
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", 3600))
+
+# Optional SQLite file for the on-disk tier (unset = memory only)
+EMBED_CACHE_DISK_PATH = os.getenv("EMBED_CACHE_DISK_PATH")
+
+# Returned by EmbeddingCache.get() on a miss (None means "no face")
+MISS = object()
+
+
+def cache_key(data: bytes, model_version: str) -> str:
+    """Cache key for an upload: the model that embeds it plus its content hash."""
+    return f"{model_version}:{hashlib.sha256(data).hexdigest()}"
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of upload hash -> embedding (or None for "no face").
+
+    The memory tier is an LRU bounded by max_entries; both tiers expire
+    entries after ttl seconds. A disk hit is promoted back into memory.
+    max_entries=0 disables both tiers: the disk file isn't opened, get()
+    always misses and put() is a no-op.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = EMBED_CACHE_SIZE,
+        ttl: float = EMBED_CACHE_TTL,
+        disk_path: Optional[str] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[float, Optional[List[float]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0}
+
+        self._conn = None
+        if disk_path and self.enabled:
+            if disk_path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._conn = sqlite3.connect(disk_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,
+                    embedding BLOB,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def disk_tier(self) -> bool:
+        """True when lookups and stores may hit the SQLite file."""
+        return self._conn is not None
+
+    def get(self, key: str) -> Any:
+        """
+        Cached embedding for key, or MISS when absent or expired (None is a
+        valid cached value: "no face").
+        """
+        if not self.enabled:
+            return MISS
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT embedding, expires_at FROM embedding_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    value = None if row[0] is None else np.frombuffer(row[0], dtype=np.float32).tolist()
+                    self._put_memory(key, value, row[1])
+                    self._counters["hits"] += 1
+                    self._counters["disk_hits"] += 1
+                    return value
+
+            self._counters["misses"] += 1
+            return MISS
+
+    def put(self, key: str, embedding: Optional[List[float]]) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._put_memory(key, embedding, expires_at)
+            if self._conn is not None:
+                blob = None if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embedding_cache (key, embedding, expires_at) VALUES (?, ?, ?)",
+                    (key, blob, expires_at)
+                )
+                self._conn.commit()
+
+    def _put_memory(self, key: str, embedding: Optional[List[float]], expires_at: float) -> None:
+        # Caller holds the lock
+        self._memory[key] = (expires_at, embedding)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], Optional[List[float]]]) -> Optional[List[float]]:
+        """Return the cached embedding for key, or compute, store and return it."""
+        if not self.enabled:
+            return compute()
+        value = self.get(key)
+        if value is MISS:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def purge_expired(self) -> int:
+        """Drop expired entries from both tiers. Returns the number removed."""
+        now = time.time()
+        with self._lock:
+            stale = [k for k, (expires_at, _) in self._memory.items() if expires_at <= now]
+            for key in stale:
+                del self._memory[key]
+            removed = len(stale)
+            if self._conn is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM embedding_cache WHERE expires_at <= ?", (now,)
+                ).rowcount
+                self._conn.commit()
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embedding_cache")
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._memory),
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "disk_tier": self.disk_tier,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Global cache shared by all routes
+_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Lazily create the process-wide cache from EMBED_CACHE_* settings."""
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(EMBED_CACHE_SIZE, EMBED_CACHE_TTL, EMBED_CACHE_DISK_PATH)
+    return _cache
+
@@ -0,0 +1,361 @@
+"""
+Image decoding helpers for Aura Core.
+
+Camera originals are often 24-45 MP while inference only needs ~1-2k px on
+the long side. JPEG can be decoded directly at 1/2, 1/4 or 1/8 scale in the
+DCT domain (cv2.IMREAD_REDUCED_*), which is several times faster and uses a
+fraction of the memory of a full decode followed by a resize.
+
+Scans read each file exactly once: the same byte buffer feeds the EXIF
+parser (capture date, orientation) and the decoder.
+"""
+import os
+import struct
+import hashlib
+import logging
+from typing import Optional, Tuple, Dict, Any, List
+
+import numpy as np
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Long-side limit for interactive inference (selfies, uploaded thumbnails)
+MAX_DIM = 1280
+
+# Upload limits, checked before any decoding (see check_upload)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+MAX_UPLOAD_PIXELS = int(os.getenv("MAX_UPLOAD_PIXELS", 50_000_000))
+
+VALID_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# Bytes read from disk to locate the JPEG SOF marker. EXIF (APP1) segments
+# with embedded thumbnails can push SOF well past the first few KB.
+HEADER_PEEK_BYTES = 256 * 1024
+
+# JPEG SOF markers carrying frame dimensions (excludes DHT C4, JPG C8, DAC CC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class InvalidImage(ValueError):
+    """Raised when uploaded bytes can't be decoded as an image."""
+
+
+class ImageTooLarge(InvalidImage):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES or MAX_UPLOAD_PIXELS."""
+
+
+def is_jpeg(data: bytes) -> bool:
+    return data[:3] == b"\xff\xd8\xff"
+
+
+def sniff_image_type(data: bytes) -> Optional[str]:
+    """"jpeg", "png" or "webp" from the magic bytes, else None."""
+    if is_jpeg(data):
+        return "jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def read_image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Return (width, height) from the header bytes of a JPEG, PNG or WebP
+    without decoding pixels. Returns None if the header can't be parsed.
+    """
+    try:
+        if is_jpeg(data):
+            # Walk marker segments until a Start Of Frame segment
+            i = 2
+            while i + 9 < len(data):
+                if data[i] != 0xFF:
+                    i += 1
+                    continue
+                marker = data[i + 1]
+                if marker == 0xFF:  # fill byte
+                    i += 1
+                    continue
+                if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # standalone markers
+                    i += 2
+                    continue
+                seg_len = struct.unpack(">H", data[i + 2:i + 4])[0]
+                if marker in _SOF_MARKERS:
+                    height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                    return width, height
+                i += 2 + seg_len
+            return None
+
+        if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", data[16:24])
+            return width, height
+
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            chunk = data[12:16]
+            if chunk == b"VP8X":
+                width = 1 + int.from_bytes(data[24:27], "little")
+                height = 1 + int.from_bytes(data[27:30], "little")
+                return width, height
+            if chunk == b"VP8 ":
+                width, height = struct.unpack("<HH", data[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L":
+                bits = int.from_bytes(data[21:25], "little")
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    except struct.error:
+        pass
+    return None
+
+
+# TIFF field types we need: SHORT, LONG, ASCII (type -> byte size)
+_TIFF_TYPE_SIZES = {2: 1, 3: 2, 4: 4}
+
+# EXIF tags of interest
+_TAG_ORIENTATION = 0x0112
+_TAG_DATETIME = 0x0132
+_TAG_EXIF_IFD = 0x8769
+_TAG_DATETIME_ORIGINAL = 0x9003
+_TAG_PIXEL_X = 0xA002
+_TAG_PIXEL_Y = 0xA003
+
+
+def _read_ifd(tiff: bytes, offset: int, endian: str) -> Dict[int, Any]:
+    """Read the SHORT/LONG/ASCII entries of a single TIFF IFD."""
+    entries = {}
+    count = struct.unpack(endian + "H", tiff[offset:offset + 2])[0]
+    for n in range(count):
+        pos = offset + 2 + n * 12
+        tag, typ, num = struct.unpack(endian + "HHI", tiff[pos:pos + 8])
+        size = _TIFF_TYPE_SIZES.get(typ)
+        if size is None:
+            continue
+        # Values up to 4 bytes are stored inline, otherwise at an offset
+        if size * num <= 4:
+            raw = tiff[pos + 8:pos + 8 + size * num]
+        else:
+            value_offset = struct.unpack(endian + "I", tiff[pos + 8:pos + 12])[0]
+            raw = tiff[value_offset:value_offset + size * num]
+
+        if typ == 2:
+            entries[tag] = raw.split(b"\x00", 1)[0].decode("ascii", "ignore").strip()
+        elif typ == 3:
+            entries[tag] = struct.unpack(endian + "H", raw[:2])[0]
+        else:
+            entries[tag] = struct.unpack(endian + "I", raw[:4])[0]
+    return entries
+
+
+def parse_exif(data: bytes) -> Dict[str, Any]:
+    """
+    Parse only the EXIF entries we use from a JPEG's APP1 segment:
+    orientation, DateTime/DateTimeOriginal and pixel dimensions.
+    Never decodes pixels; returns {} for non-JPEGs or missing/corrupt EXIF.
+    """
+    info: Dict[str, Any] = {}
+    if not is_jpeg(data):
+        return info
+
+    try:
+        i = 2
+        while i + 4 < len(data) and data[i] == 0xFF:
+            marker = data[i + 1]
+            seg_len = struct.unpack(">H", data[i + 2:i + 4])[0]
+            if marker == 0xDA:  # Start of Scan: no metadata beyond this point
+                break
+            if marker == 0xE1 and data[i + 4:i + 10] == b"Exif\x00\x00":
+                tiff = data[i + 10:i + 2 + seg_len]
+                endian = "<" if tiff[:2] == b"II" else ">"
+                ifd0_offset = struct.unpack(endian + "I", tiff[4:8])[0]
+                ifd0 = _read_ifd(tiff, ifd0_offset, endian)
+
+                exif = {}
+                if _TAG_EXIF_IFD in ifd0:
+                    exif = _read_ifd(tiff, ifd0[_TAG_EXIF_IFD], endian)
+
+                if _TAG_ORIENTATION in ifd0:
+                    info["orientation"] = ifd0[_TAG_ORIENTATION]
+                if exif.get(_TAG_DATETIME_ORIGINAL):
+                    info["date_time_original"] = exif[_TAG_DATETIME_ORIGINAL]
+                if ifd0.get(_TAG_DATETIME):
+                    info["date_time"] = ifd0[_TAG_DATETIME]
+                if _TAG_PIXEL_X in exif and _TAG_PIXEL_Y in exif:
+                    info["exif_width"] = exif[_TAG_PIXEL_X]
+                    info["exif_height"] = exif[_TAG_PIXEL_Y]
+                break
+            i += 2 + seg_len
+    except (struct.error, IndexError) as e:
+        logger.debug(f"Ignoring malformed EXIF: {e}")
+
+    return info
+
+
+def read_image_info(data: bytes) -> Dict[str, Any]:
+    """
+    Header-only metadata for a buffer: frame size (width/height) plus any
+    EXIF fields from parse_exif().
+    """
+    info = parse_exif(data)
+    size = read_image_size(data)
+    if size:
+        info["width"], info["height"] = size
+    return info
+
+
+def apply_orientation(img: np.ndarray, orientation: Optional[int]) -> np.ndarray:
+    """Rotate/flip pixels so EXIF orientation 1 ("top-left") holds."""
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.rotate(cv2.transpose(img), cv2.ROTATE_180)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+
+def reduced_decode_flag(size: Optional[Tuple[int, int]], max_dim: int, jpeg: bool = True) -> int:
+    """
+    Pick the largest DCT reduction (1/8, 1/4, 1/2) whose output still has a
+    long side >= max_dim, so the final resize only ever shrinks.
+    Non-JPEG formats and unknown sizes decode at full resolution.
+    """
+    if not jpeg or size is None or not max_dim:
+        return cv2.IMREAD_COLOR
+
+    longest = max(size)
+    for factor, flag in (
+        (8, cv2.IMREAD_REDUCED_COLOR_8),
+        (4, cv2.IMREAD_REDUCED_COLOR_4),
+        (2, cv2.IMREAD_REDUCED_COLOR_2),
+    ):
+        if longest // factor >= max_dim:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def check_upload(
+    data: bytes,
+    max_bytes: Optional[int] = None,
+    max_pixels: Optional[int] = None
+) -> Tuple[int, int]:
+    """
+    Validate uploaded bytes from their header alone and return (width,
+    height). Raises ImageTooLarge for oversized payloads or pixel counts
+    (decompression bombs), InvalidImage for anything that isn't a JPEG, PNG
+    or WebP with a readable header. Limits default to MAX_UPLOAD_*.
+    """
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    max_pixels = max_pixels or MAX_UPLOAD_PIXELS
+    if len(data) > max_bytes:
+        raise ImageTooLarge(f"Image exceeds {max_bytes // (1024 * 1024)} MB")
+    if sniff_image_type(data) is None:
+        raise InvalidImage("Invalid image file")
+    size = read_image_size(data)
+    if size is None or min(size) <= 0:
+        raise InvalidImage("Invalid image file")
+    if size[0] * size[1] > max_pixels:
+        raise ImageTooLarge(f"Image of {size[0]}x{size[1]} exceeds {max_pixels:,} pixels")
+    return size
+
+
+def resize_to_max_dim(img: np.ndarray, max_dim: Optional[int]) -> np.ndarray:
+    """Downscale so the long side is at most max_dim (never upscales)."""
+    if not max_dim:
+        return img
+    h, w = img.shape[:2]
+    if max(h, w) > max_dim:
+        scale = max_dim / max(h, w)
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return img
+
+
+def decode_image(
+    data: bytes,
+    max_dim: Optional[int] = None,
+    info: Optional[Dict[str, Any]] = None
+) -> Optional[np.ndarray]:
+    """
+    Decode an in-memory image (BGR), using a reduced JPEG decode when
+    max_dim allows it. Returns None if the buffer isn't a decodable image.
+
+    If info from read_image_info() is passed, its size and orientation are
+    reused and OpenCV is told not to parse EXIF a second time.
+    """
+    if info is None:
+        size = read_image_size(data)
+        flag = reduced_decode_flag(size, max_dim, jpeg=is_jpeg(data))
+    else:
+        size = (info["width"], info["height"]) if "width" in info else None
+        flag = reduced_decode_flag(size, max_dim, jpeg=is_jpeg(data))
+        flag |= cv2.IMREAD_IGNORE_ORIENTATION
+
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if img is None:
+        return None
+    if info is not None:
+        img = apply_orientation(img, info.get("orientation"))
+    return resize_to_max_dim(img, max_dim)
+
+
+def read_image_file(path: str) -> Tuple[bytes, float]:
+    """Read a file's bytes and mtime with a single open()."""
+    with open(path, "rb") as f:
+        return f.read(), os.fstat(f.fileno()).st_mtime
+
+
+def ingest_image_file(path: str, max_dim: Optional[int] = None) -> Tuple[Optional[np.ndarray], Dict[str, Any]]:
+    """
+    Single-read ingestion: read the file once, parse header metadata from the
+    buffer, then decode that same buffer (reduced + oriented).
+
+    Returns (image or None, info). info carries width/height, orientation,
+    EXIF dates when present, the file mtime and content_hash (SHA-256 of the
+    bytes read, so the scan manifest need not read the file again).
+    """
+    data, mtime = read_image_file(path)
+    info = read_image_info(data)
+    info["mtime"] = mtime
+    info["content_hash"] = hashlib.sha256(data).hexdigest()
+    return decode_image(data, max_dim, info=info), info
+
+
+def load_image(path: str, max_dim: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Read an image file (BGR), peeking at its header first so JPEGs can be
+    decoded at reduced resolution. Returns None if unreadable.
+    """
+    flag = cv2.IMREAD_COLOR
+    if max_dim:
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER_PEEK_BYTES)
+            flag = reduced_decode_flag(read_image_size(header), max_dim, jpeg=is_jpeg(header))
+        except OSError:
+            pass
+
+    img = cv2.imread(path, flag)
+    if img is None:
+        return None
+    return resize_to_max_dim(img, max_dim)
+
+
+def list_image_files(directory_path: str, limit: Optional[int] = None) -> List[str]:
+    """
+    Walk a directory and return image paths in a stable (sorted) order,
+    so serial and parallel scans produce identical result ordering.
+    """
+    paths = []
+    for root, dirs, files in os.walk(directory_path):
+        dirs.sort()
+        for file in sorted(files):
+            if os.path.splitext(file)[1].lower() in VALID_EXTENSIONS:
+                paths.append(os.path.join(root, file))
+    return paths[:limit] if limit else paths
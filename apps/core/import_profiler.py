@@ -0,0 +1,190 @@
+"""
+Import Profiler for Aura Core.
+
+Boot time is dominated by imports (FastAPI/pydantic, numpy, cv2, jwt,
+qrcode, the Supabase SDK), yet most of them only serve rarely used
+endpoints. This module measures what each import costs, in-process and in
+production, much like `python -X importtime`:
+
+- enable() (first thing in main.py) hooks sys.meta_path and times every
+  module executed from then on, per thread, as self and cumulative ms.
+- boot_complete() marks the point where the app object exists.
+- start_preimport() loads PREIMPORT_MODULES on a background thread once
+  the server is accepting traffic, so heavy modules that routes import
+  lazily are usually warm before the first request needs them.
+- disable() runs once preimport is done: the hook comes off sys.meta_path
+  and patched loaders get their own exec_module back, so imports after
+  startup pay nothing. The report keeps what was recorded.
+
+import_report() feeds GET /api/superadmin/startup.
+"""
+import os
+import sys
+import time
+import logging
+import importlib
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Record per-module import cost (cheap: one timer per module executed)
+PROFILE_IMPORTS = os.getenv("PROFILE_IMPORTS", "1") == "1"
+
+# Modules loaded in the background after startup ("" disables)
+PREIMPORT_MODULES = [
+    name.strip() for name in
+    os.getenv("PREIMPORT_MODULES", "numpy,cv2,micro_batcher,supabase,qrcode").split(",")
+    if name.strip()
+]
+
+_lock = threading.Lock()
+_local = threading.local()
+_records: Dict[str, Dict[str, Any]] = {}
+_patched: List[Any] = []  # loaders whose exec_module we wrapped
+_state: Dict[str, Any] = {
+    "enabled_at": None,
+    "boot_ms": None,
+    "preimport": {"status": "idle", "modules": {}, "total_ms": None},
+}
+
+
+class _TimingFinder:
+    """
+    Meta path entry that defers to the real finders and wraps the found
+    loader's exec_module with a timer. The spec and loader are otherwise
+    untouched, so resources, __loader__ and reloads behave as before.
+    """
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        loader = spec.loader
+        # Class-level loaders (builtins, frozen) are shared; leave them alone
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module") \
+                and "exec_module" not in getattr(loader, "__dict__", {"exec_module": None}):
+            loader.exec_module = _timed(loader.exec_module, fullname)
+            with _lock:
+                _patched.append(loader)
+        return spec
+
+
+def _timed(exec_module, fullname: str):
+    def exec_module_timed(module):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        frame = {"children": 0.0}
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            return exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1]["children"] += elapsed
+            with _lock:
+                _records[fullname] = {
+                    "module": fullname,
+                    "self_ms": round((elapsed - frame["children"]) * 1000, 2),
+                    "cumulative_ms": round(elapsed * 1000, 2),
+                    "thread": threading.current_thread().name,
+                    "top_level": not stack,
+                }
+    return exec_module_timed
+
+
+_finder = _TimingFinder()
+
+
+def enable() -> None:
+    """Start recording imports (no-op unless PROFILE_IMPORTS)."""
+    if not PROFILE_IMPORTS or _finder in sys.meta_path:
+        return
+    _state["enabled_at"] = time.perf_counter()
+    sys.meta_path.insert(0, _finder)
+
+
+def disable() -> None:
+    """Stop recording: remove the hook and unwrap the loaders it patched."""
+    if _finder in sys.meta_path:
+        sys.meta_path.remove(_finder)
+    with _lock:
+        loaders = _patched[:]
+        _patched.clear()
+    for loader in loaders:
+        # Drop the instance attribute so the class's exec_module shows again
+        vars(loader).pop("exec_module", None)
+
+
+def boot_complete() -> Optional[float]:
+    """Record the time from enable() to now as the boot import time (ms)."""
+    if _state["enabled_at"] is None:
+        return None
+    _state["boot_ms"] = round((time.perf_counter() - _state["enabled_at"]) * 1000, 1)
+    logger.info(f"App imported in {_state['boot_ms']:.0f} ms")
+    return _state["boot_ms"]
+
+
+def preimport(modules: List[str]) -> Dict[str, Any]:
+    """Import modules in order, recording per-module wall time or errors."""
+    status = _state["preimport"]
+    status.update(status="running", modules={}, total_ms=None)
+    start = time.perf_counter()
+    for name in modules:
+        t = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            status["modules"][name] = round((time.perf_counter() - t) * 1000, 1)
+        except Exception as e:
+            # Optional dependencies may be absent in some deployments
+            status["modules"][name] = f"error: {e}"
+    status.update(status="done", total_ms=round((time.perf_counter() - start) * 1000, 1))
+    logger.info(f"Background preimport finished in {status['total_ms']:.0f} ms")
+    return status
+
+
+def start_preimport(modules: Optional[List[str]] = None) -> Optional[threading.Thread]:
+    """
+    Run preimport() on a daemon thread, then disable() the profiler; returns
+    the thread (None if nothing to do, in which case it disables right away).
+    """
+    modules = PREIMPORT_MODULES if modules is None else modules
+    if not modules:
+        disable()
+        return None
+
+    def run():
+        try:
+            preimport(modules)
+        finally:
+            disable()
+
+    thread = threading.Thread(target=run, name="preimport", daemon=True)
+    thread.start()
+    return thread
+
+
+def import_report(top: Optional[int] = 30) -> Dict[str, Any]:
+    """
+    Import costs sorted by cumulative time. Only top-level imports are
+    summed into total_ms, since nested ones are already included in them.
+    """
+    with _lock:
+        records = sorted(_records.values(), key=lambda r: r["cumulative_ms"], reverse=True)
+    return {
+        "enabled": _finder in sys.meta_path,
+        "boot_ms": _state["boot_ms"],
+        "modules_recorded": len(records),
+        "total_ms": round(sum(r["cumulative_ms"] for r in records if r["top_level"]), 1),
+        "modules": records[:top] if top else records,
+        "preimport": dict(_state["preimport"]),
+    }
@@ -0,0 +1,178 @@
+"""
+Inference Executor for Aura Core.
+
+Routes are `async def`, but FaceProcessor inference is synchronous and takes
+hundreds of ms. Calling it inline freezes the event loop, and every other
+request (health checks, logins, bundle views) queues behind it.
+
+All embedding call sites submit their work here instead and await the
+result. The executor:
+- runs jobs on a fixed pool of INFERENCE_WORKERS threads (ONNX Runtime
+  releases the GIL while it computes);
+- accepts at most INFERENCE_QUEUE_SIZE waiting jobs beyond those, and
+  rejects the rest with 429 so clients back off instead of piling up;
+- stops waiting after INFERENCE_TIMEOUT seconds and answers 503;
+- drains in-flight work on shutdown (see main.lifespan).
+"""
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 2))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", 32))
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", 30))
+INFERENCE_DRAIN_TIMEOUT = float(os.getenv("INFERENCE_DRAIN_TIMEOUT", 30))
+
+# Seconds clients are told to wait after a 429
+RETRY_AFTER_SECONDS = 1
+
+
+class InferenceQueueFull(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class InferenceTimeout(Exception):
+    """Raised when a job did not finish within its timeout."""
+
+
+class InferenceUnavailable(Exception):
+    """Raised when the executor is shutting down."""
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for blocking inference calls, awaited from async code.
+
+    Capacity is workers + queue_size jobs. A job counts against capacity
+    until its thread actually finishes, even if the caller timed out, so a
+    backlog of slow jobs can't grow without bound.
+    """
+
+    def __init__(
+        self,
+        workers: int = INFERENCE_WORKERS,
+        queue_size: int = INFERENCE_QUEUE_SIZE,
+        timeout: float = INFERENCE_TIMEOUT
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._closing = False
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0, "timeouts": 0}
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def _release(self, future) -> None:
+        with self._cond:
+            self._pending -= 1
+            if not future.cancelled():
+                self._counters["failed" if future.exception() is not None else "completed"] += 1
+            self._cond.notify_all()
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) on an inference thread and await its result.
+
+        Raises InferenceQueueFull, InferenceTimeout or InferenceUnavailable;
+        exceptions raised by fn propagate unchanged.
+        """
+        with self._cond:
+            if self._closing:
+                raise InferenceUnavailable("Inference executor is shutting down")
+            if self._pending >= self.capacity:
+                self._counters["rejected"] += 1
+                raise InferenceQueueFull(f"Inference queue full ({self._pending} jobs pending)")
+            self._pending += 1
+
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except RuntimeError:
+            with self._cond:
+                self._pending -= 1
+            raise InferenceUnavailable("Inference executor is shut down")
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # Still queued: drop it. Already running: it finishes in the
+            # background and keeps its capacity slot until then.
+            future.cancel()
+            with self._cond:
+                self._counters["timeouts"] += 1
+            raise InferenceTimeout(f"Inference did not finish within {timeout or self.timeout:.0f}s")
+
+    def shutdown(self, timeout: float = INFERENCE_DRAIN_TIMEOUT) -> bool:
+        """
+        Stop accepting work and wait up to timeout seconds for pending jobs.
+        Returns True if everything drained; leftovers are cancelled.
+        """
+        with self._cond:
+            self._closing = True
+            drained = self._cond.wait_for(lambda: self._pending == 0, timeout)
+        if not drained:
+            logger.warning(f"Inference executor shutdown: {self._pending} jobs still pending, cancelling")
+        self._pool.shutdown(wait=drained, cancel_futures=True)
+        return drained
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self._counters,
+                "pending": self._pending,
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "closing": self._closing,
+            }
+
+
+# Global executor shared by all routes
+_executor: Optional[InferenceExecutor] = None
+
+
+def get_inference_executor() -> InferenceExecutor:
+    """Lazily create the process-wide executor from INFERENCE_* settings."""
+    global _executor
+    if _executor is None:
+        _executor = InferenceExecutor()
+    return _executor
+
+
+def shutdown_inference_executor(timeout: float = INFERENCE_DRAIN_TIMEOUT) -> None:
+    """Drain and discard the global executor (called from main.lifespan)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(timeout)
+        _executor = None
+
+
+async def run_inference(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Await fn(*args, **kwargs) on the inference executor, translating
+    backpressure into HTTP errors: 429 (queue full, with Retry-After) and
+    503 (timeout or shutting down).
+    """
+    try:
+        return await get_inference_executor().run(fn, *args, **kwargs)
+    except InferenceQueueFull as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=429,
+            detail="Server busy, please retry",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+    except (InferenceTimeout, InferenceUnavailable) as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail=str(e))
@@ -0,0 +1,168 @@
+"""
+Inference Profiles for Aura Core.
+
+A profile bundles everything that decides how FaceProcessor runs: model
+pack, which InsightFace modules are loaded, detector input size and the
+ONNX Runtime session options. Thread settings can be auto-tuned per host
+(see processor.autotune_profile) and are cached in a small JSON file.
+"""
+import os
+import json
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# "fp32" runs the stock ONNX models; "int8" runs the quantized copies
+# produced by quantization.py (model pack "<pack>_int8").
+DEFAULT_PRECISION = os.getenv("INFERENCE_PRECISION", "fp32")
+PRECISIONS = ("fp32", "int8")
+
+# All profiles share the buffalo_l recognition model: embeddings stored in
+# Supabase must stay comparable with query embeddings.
+INFERENCE_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Bulk indexing: full detector resolution for small/background faces
+    "scan-accurate": {
+        "model_pack": "buffalo_l",
+        "allowed_modules": ["detection", "recognition"],
+        "det_size": (640, 640),
+        "intra_op_threads": 0,  # 0 = ONNX Runtime default (one per core)
+        "inter_op_threads": 0,
+        "graph_optimization": "all",
+        "execution_mode": "sequential",
+        "precision": DEFAULT_PRECISION,
+    },
+    # Selfie search / face login: one large face, so a 320px detector suffices
+    "search-fast": {
+        "model_pack": "buffalo_l",
+        "allowed_modules": ["detection", "recognition"],
+        "det_size": (320, 320),
+        "intra_op_threads": 0,
+        "inter_op_threads": 0,
+        "graph_optimization": "all",
+        "execution_mode": "sequential",
+        "precision": DEFAULT_PRECISION,
+    },
+}
+
+DEFAULT_PROFILE = os.getenv("INFERENCE_PROFILE", "scan-accurate")
+
+# Run the thread auto-tuner when a profile is first loaded on this host
+AUTOTUNE_ENABLED = os.getenv("INFERENCE_AUTOTUNE", "0") == "1"
+
+TUNING_CACHE_PATH = os.getenv(
+    "ORT_TUNING_CACHE",
+    os.path.join(os.path.dirname(__file__), "data", "ort_tuning.json")
+)
+
+_GRAPH_OPT_LEVELS = {
+    "disabled": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+_EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+
+
+def get_profile(name: Optional[str] = None, **overrides) -> Dict[str, Any]:
+    """
+    Return a copy of a named profile (default: INFERENCE_PROFILE), with any
+    non-None keyword overrides applied. Raises ValueError for unknown names.
+    """
+    name = name or DEFAULT_PROFILE
+    if name not in INFERENCE_PROFILES:
+        raise ValueError(
+            f"Unknown inference profile '{name}'. Available: {', '.join(INFERENCE_PROFILES)}"
+        )
+    profile = dict(INFERENCE_PROFILES[name])
+    profile["name"] = name
+    for key, value in overrides.items():
+        if value is not None:
+            profile[key] = value
+    if profile["precision"] not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{profile['precision']}'. Available: {', '.join(PRECISIONS)}")
+    return profile
+
+
+def model_pack_name(profile: Dict[str, Any]) -> str:
+    """InsightFace model directory for a profile's pack and precision."""
+    if profile.get("precision") == "int8":
+        return f"{profile['model_pack']}_int8"
+    return profile["model_pack"]
+
+
+def model_version(profile: Dict[str, Any]) -> str:
+    """
+    Identifies the embeddings a profile produces, for scan manifests and
+    cache keys: the pack plus the detector input size, which decides which
+    faces are found and how they are cropped.
+    """
+    width, height = profile["det_size"]
+    return f"{model_pack_name(profile)}@{width}x{height}"
+
+
+def build_session_options(profile: Dict[str, Any]):
+    """Translate a profile's ORT settings into onnxruntime.SessionOptions."""
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    if profile.get("intra_op_threads"):
+        options.intra_op_num_threads = profile["intra_op_threads"]
+    if profile.get("inter_op_threads"):
+        options.inter_op_num_threads = profile["inter_op_threads"]
+
+    level = _GRAPH_OPT_LEVELS[profile.get("graph_optimization", "all")]
+    options.graph_optimization_level = getattr(onnxruntime.GraphOptimizationLevel, level)
+
+    mode = _EXECUTION_MODES[profile.get("execution_mode", "sequential")]
+    options.execution_mode = getattr(onnxruntime.ExecutionMode, mode)
+    return options
+
+
+def tuning_key(profile: Dict[str, Any]) -> str:
+    """Tuning results are only valid for the same profile, pack and core count."""
+    return f"{profile['name']}:{model_pack_name(profile)}:{os.cpu_count()}"
+
+
+def load_tuning(profile: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    """Cached {"intra_op_threads", "inter_op_threads"} for this host, if any."""
+    try:
+        with open(TUNING_CACHE_PATH) as f:
+            return json.load(f).get(tuning_key(profile))
+    except (OSError, ValueError):
+        return None
+
+
+def save_tuning(profile: Dict[str, Any], result: Dict[str, Any]) -> None:
+    try:
+        with open(TUNING_CACHE_PATH) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    cache[tuning_key(profile)] = result
+    try:
+        os.makedirs(os.path.dirname(TUNING_CACHE_PATH), exist_ok=True)
+        with open(TUNING_CACHE_PATH, "w") as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        logger.warning(f"Could not write ORT tuning cache: {e}")
+
+
+def thread_candidates(cpu_count: Optional[int] = None):
+    """
+    (intra, inter) thread settings to benchmark: powers of two up to the
+    core count plus the core count itself, with sequential execution
+    (inter_op only matters in parallel mode, which we leave at 1).
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    intra = {cpu_count}
+    n = 1
+    while n < cpu_count:
+        intra.add(n)
+        n *= 2
+    return [(threads, 1) for threads in sorted(intra)]
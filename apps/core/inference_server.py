@@ -0,0 +1,465 @@
+"""
+Shared Inference Sidecar for Aura Core.
+
+Every uvicorn worker used to load its own FaceProcessor, so N workers held
+N copies of the ONNX sessions. With INFERENCE_SOCKET set, the model lives in
+one sidecar process per host instead:
+
+    python inference_server.py --socket /run/aura/inference.sock
+
+and dependencies.get_processor returns an InferenceClient that speaks to it.
+The client mirrors the FaceProcessor methods the routes use, so API workers
+stay lightweight and nothing else changes.
+
+Wire protocol (one request frame, one response frame, per connection in a
+loop): a header struct.pack("!4sBBI", b"AURA", version, code, length)
+followed by length payload bytes. In requests code is the opcode, in
+responses a frame status (STATUS_ERROR carries a UTF-8 message).
+
+- OP_INFO:  empty -> JSON {"model_version", "profile", "pid"}
+- OP_EMBED: !I count, count x !I sizes, image bytes
+            -> per image !BI (item status, dim) + dim little-endian float32
+- OP_SCAN:  !B tiled (0/1, 2 = server default) + UTF-8 path
+            -> !H date length + date + !H hash length + content hash
+               + !II (faces, dim) + faces*dim float32
+- OP_FACES: same request as OP_EMBED, every face per image
+            -> per image !BII (item status, faces, dim) + faces x 5 float32
+               (bbox, det score) + faces*dim float32
+
+Images go over the socket as raw encoded bytes and are decoded by the
+sidecar. Scans send the path instead: the sidecar runs on the same host and
+reads the file itself.
+"""
+import os
+import json
+import time
+import socket
+import struct
+import logging
+import argparse
+import threading
+import socketserver
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from imaging import InvalidImage, list_image_files
+
+logger = logging.getLogger(__name__)
+
+# Unix socket of the sidecar; when set, API workers don't load the model
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET")
+# Seconds a client waits for one response
+INFERENCE_SOCKET_TIMEOUT = float(os.getenv("INFERENCE_SOCKET_TIMEOUT", 60))
+# Requests the sidecar runs at once (more only oversubscribes ORT threads)
+INFERENCE_SERVER_THREADS = int(os.getenv("INFERENCE_SERVER_THREADS", 2))
+# Largest accepted frame payload
+INFERENCE_MAX_FRAME_BYTES = int(os.getenv("INFERENCE_MAX_FRAME_BYTES", 64 * 1024 * 1024))
+
+MAGIC = b"AURA"
+PROTOCOL_VERSION = 2
+HEADER = struct.Struct("!4sBBI")
+
+OP_INFO = 1
+OP_EMBED = 2
+OP_SCAN = 3
+OP_FACES = 4
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+ITEM_OK = 0
+ITEM_NO_FACE = 1
+ITEM_INVALID = 2
+
+_TILED_CODES = {False: 0, True: 1, None: 2}
+_VECTOR = np.dtype("<f4")
+
+
+class InferenceServerError(Exception):
+    """Raised by the client when the sidecar reports an error or breaks protocol."""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(min(size - len(buf), 1 << 20))
+        if not chunk:
+            raise EOFError("Connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def read_frame(sock: socket.socket) -> Tuple[int, bytes]:
+    """Read one frame, returning (code, payload). Raises EOFError on a closed socket."""
+    magic, version, code, length = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if magic != MAGIC or version != PROTOCOL_VERSION:
+        raise InferenceServerError(f"Bad frame header (magic={magic!r}, version={version})")
+    if length > INFERENCE_MAX_FRAME_BYTES:
+        raise InferenceServerError(f"Frame of {length} bytes exceeds {INFERENCE_MAX_FRAME_BYTES}")
+    return code, _recv_exact(sock, length) if length else b""
+
+
+def write_frame(sock: socket.socket, code: int, payload: bytes = b"") -> None:
+    sock.sendall(HEADER.pack(MAGIC, PROTOCOL_VERSION, code, len(payload)) + payload)
+
+
+def pack_images(blobs: List[bytes]) -> bytes:
+    return struct.pack(f"!I{len(blobs)}I", len(blobs), *(len(b) for b in blobs)) + b"".join(blobs)
+
+
+def unpack_images(payload: bytes) -> List[bytes]:
+    (count,) = struct.unpack_from("!I", payload)
+    sizes = struct.unpack_from(f"!{count}I", payload, 4)
+    offset = 4 + 4 * count
+    if offset + sum(sizes) != len(payload):
+        raise InferenceServerError("Image sizes do not match payload length")
+    blobs = []
+    for size in sizes:
+        blobs.append(payload[offset:offset + size])
+        offset += size
+    return blobs
+
+
+def pack_embed_results(results: List[Any]) -> bytes:
+    parts = []
+    for result in results:
+        if isinstance(result, InvalidImage):
+            parts.append(struct.pack("!BI", ITEM_INVALID, 0))
+        elif result is None:
+            parts.append(struct.pack("!BI", ITEM_NO_FACE, 0))
+        else:
+            vector = np.asarray(result, dtype=_VECTOR)
+            parts.append(struct.pack("!BI", ITEM_OK, vector.size) + vector.tobytes())
+    return b"".join(parts)
+
+
+def unpack_embed_results(payload: bytes, count: int) -> List[Any]:
+    results: List[Any] = []
+    offset = 0
+    for _ in range(count):
+        status, dim = struct.unpack_from("!BI", payload, offset)
+        offset += 5
+        if status == ITEM_INVALID:
+            results.append(InvalidImage("Invalid image file"))
+        elif status == ITEM_NO_FACE:
+            results.append(None)
+        else:
+            results.append(np.frombuffer(payload, _VECTOR, dim, offset).tolist())
+            offset += dim * _VECTOR.itemsize
+    return results
+
+
+def _matrix(rows: List[List[float]]) -> np.ndarray:
+    # (n, dim) float32; an empty list gives a (0, 0) matrix
+    return np.asarray(rows, dtype=_VECTOR).reshape(len(rows), -1) if rows else np.zeros((0, 0), _VECTOR)
+
+
+def pack_face_results(results: List[Any]) -> bytes:
+    parts = []
+    for result in results:
+        if isinstance(result, InvalidImage):
+            parts.append(struct.pack("!BII", ITEM_INVALID, 0, 0))
+            continue
+        boxes = _matrix([list(face["bbox"]) + [face["score"]] for face in result])
+        vectors = _matrix([face["embedding"] for face in result])
+        parts.append(struct.pack("!BII", ITEM_OK, *vectors.shape) + boxes.tobytes() + vectors.tobytes())
+    return b"".join(parts)
+
+
+def unpack_face_results(payload: bytes, count: int) -> List[Any]:
+    results: List[Any] = []
+    offset = 0
+    for _ in range(count):
+        status, faces, dim = struct.unpack_from("!BII", payload, offset)
+        offset += 9
+        if status == ITEM_INVALID:
+            results.append(InvalidImage("Invalid image file"))
+            continue
+        boxes = np.frombuffer(payload, _VECTOR, faces * 5, offset).reshape(faces, 5)
+        offset += faces * 5 * _VECTOR.itemsize
+        vectors = np.frombuffer(payload, _VECTOR, faces * dim, offset).reshape(faces, dim)
+        offset += faces * dim * _VECTOR.itemsize
+        results.append([
+            {"bbox": box[:4].tolist(), "score": float(box[4]), "embedding": vector.tolist()}
+            for box, vector in zip(boxes, vectors)
+        ])
+    return results
+
+
+def pack_scan_result(faces: List[Dict[str, Any]], content_hash: Optional[str] = None) -> bytes:
+    date = (faces[0]["photo_date"] if faces else "").encode()
+    digest = (content_hash or "").encode()
+    vectors = _matrix([face["embedding"] for face in faces])
+    return (
+        struct.pack("!H", len(date)) + date
+        + struct.pack("!H", len(digest)) + digest
+        + struct.pack("!II", *vectors.shape) + vectors.tobytes()
+    )
+
+
+def unpack_scan_result(payload: bytes, path: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    (date_len,) = struct.unpack_from("!H", payload)
+    photo_date = payload[2:2 + date_len].decode()
+    offset = 2 + date_len
+    (hash_len,) = struct.unpack_from("!H", payload, offset)
+    content_hash = payload[offset + 2:offset + 2 + hash_len].decode() or None
+    offset += 2 + hash_len
+    count, dim = struct.unpack_from("!II", payload, offset)
+    vectors = np.frombuffer(payload, _VECTOR, count * dim, offset + 8).reshape(count, dim)
+    return [
+        {"path": path, "embedding": vector.tolist(), "photo_date": photo_date}
+        for vector in vectors
+    ], content_hash
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                code, payload = read_frame(self.request)
+            except (EOFError, ConnectionError):
+                return
+            except InferenceServerError as e:
+                # Stream is out of sync; answer once and drop the connection
+                write_frame(self.request, STATUS_ERROR, str(e).encode())
+                return
+
+            try:
+                response = self.server.dispatch(code, payload)
+                status = STATUS_OK
+            except Exception as e:
+                logger.error(f"Inference request (op={code}) failed: {e}")
+                response, status = str(e).encode(), STATUS_ERROR
+            try:
+                write_frame(self.request, status, response)
+            except (BrokenPipeError, ConnectionError):
+                return
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Serves one FaceProcessor to many API workers over a Unix socket.
+
+    Each connection gets a thread; at most `threads` requests run inference
+    at a time, the rest wait on the semaphore.
+    """
+
+    daemon_threads = True
+    # Every API worker thread holds a connection; the default backlog of 5
+    # makes connects fail under a burst
+    request_queue_size = 128
+
+    def __init__(self, processor, socket_path: str, threads: int = INFERENCE_SERVER_THREADS):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # stale socket from a previous run
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o660)
+        self.processor = processor
+        self.socket_path = socket_path
+        self._slots = threading.BoundedSemaphore(max(1, threads))
+
+    def dispatch(self, code: int, payload: bytes) -> bytes:
+        if code == OP_INFO:
+            return json.dumps({
+                "model_version": self.processor.model_version,
+                "profile": self.processor.profile["name"],
+                "pid": os.getpid(),
+            }).encode()
+
+        if code == OP_EMBED:
+            from micro_batcher import embed_images_batch
+            blobs = unpack_images(payload)
+            with self._slots:
+                results = embed_images_batch(self.processor, blobs)
+            return pack_embed_results(results)
+
+        if code == OP_FACES:
+            from micro_batcher import embed_faces_batch
+            blobs = unpack_images(payload)
+            with self._slots:
+                results = embed_faces_batch(self.processor, blobs)
+            return pack_face_results(results)
+
+        if code == OP_SCAN:
+            tiled = {0: False, 1: True}.get(payload[0])
+            path = payload[1:].decode()
+            with self._slots:
+                faces, content_hash = self.processor.scan_file_hashed(path, tiled=tiled)
+            return pack_scan_result(faces, content_hash)
+
+        raise InferenceServerError(f"Unknown opcode {code}")
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class InferenceClient:
+    """
+    Drop-in stand-in for FaceProcessor backed by the sidecar.
+
+    Connections are per thread and reopened once if the sidecar restarted.
+    Construction fails (OSError) if the sidecar isn't listening, which
+    dependencies treats like a failed model load and retries.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = INFERENCE_SOCKET_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        info = self.info()
+        self.model_version = info["model_version"]
+        self.profile = {"name": info["profile"]}
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # Blocking connect: with a timeout set, a full backlog fails
+            # immediately with EAGAIN instead of waiting
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(self.timeout)
+        return sock
+
+    def _reset(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def _call(self, code: int, payload: bytes = b"") -> bytes:
+        for attempt in (1, 2):
+            sock = getattr(self._local, "sock", None)
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                write_frame(sock, code, payload)
+                status, response = read_frame(sock)
+                break
+            except socket.timeout:
+                # A late response would desync the stream
+                self._reset()
+                raise
+            except (EOFError, ConnectionError):
+                self._reset()
+                if attempt == 2:
+                    raise
+        if status != STATUS_OK:
+            raise InferenceServerError(response.decode(errors="replace"))
+        return response
+
+    def close(self) -> None:
+        self._reset()
+
+    def info(self) -> Dict[str, Any]:
+        return json.loads(self._call(OP_INFO))
+
+    def warm_up(self) -> float:
+        """Round-trip to the sidecar (which warmed up on start). Returns ms."""
+        start = time.perf_counter()
+        self.info()
+        return (time.perf_counter() - start) * 1000
+
+    def embed_images(self, blobs: List[bytes]) -> List[Any]:
+        """Same contract as micro_batcher.embed_images_batch, run in the sidecar."""
+        return unpack_embed_results(self._call(OP_EMBED, pack_images(blobs)), len(blobs))
+
+    def embed_faces(self, blobs: List[bytes]) -> List[Any]:
+        """Same contract as micro_batcher.embed_faces_batch, run in the sidecar."""
+        return unpack_face_results(self._call(OP_FACES, pack_images(blobs)), len(blobs))
+
+    def get_embedding_from_image(self, img: np.ndarray) -> Optional[List[float]]:
+        import cv2
+        ok, buf = cv2.imencode(".png", img)
+        if not ok:
+            return None
+        result = self.embed_images([buf.tobytes()])[0]
+        return None if isinstance(result, InvalidImage) else result
+
+    def get_embedding(self, img_path: str) -> Optional[List[float]]:
+        try:
+            with open(img_path, "rb") as f:
+                result = self.embed_images([f.read()])[0]
+        except OSError as e:
+            logger.warning(f"Could not read image: {img_path} ({e})")
+            return None
+        return None if isinstance(result, InvalidImage) else result
+
+    def list_images(self, directory_path: str) -> List[str]:
+        return list_image_files(directory_path)
+
+    def scan_file(self, full_path: str, tiled: Optional[bool] = None) -> List[Dict[str, Any]]:
+        return self.scan_file_hashed(full_path, tiled=tiled)[0]
+
+    def scan_file_hashed(
+        self,
+        full_path: str,
+        tiled: Optional[bool] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        payload = bytes([_TILED_CODES[tiled]]) + os.path.abspath(full_path).encode()
+        try:
+            return unpack_scan_result(self._call(OP_SCAN, payload), full_path)
+        except InferenceServerError as e:
+            logger.error(f"Error scanning {full_path}: {e}")
+            return [], None
+
+    def iter_scan(
+        self,
+        directory_path: str,
+        workers: Optional[int] = None,
+        manifest=None,
+        tiled: Optional[bool] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        FaceProcessor.iter_scan over the sidecar. Files go one at a time;
+        workers is ignored since the sidecar owns the inference threads.
+        """
+        paths = self.list_images(directory_path)
+        if manifest is not None:
+            paths = [p for p in paths if manifest.needs_scan(p)]
+
+        total = len(paths)
+        for index, path in enumerate(paths, start=1):
+            faces, content_hash = self.scan_file_hashed(path, tiled=tiled)
+            yield {"path": path, "index": index, "total": total, "faces": faces, "content_hash": content_hash}
+
+    def scan_directory(
+        self,
+        directory_path: str,
+        workers: Optional[int] = None,
+        tiled: Optional[bool] = None
+    ) -> List[Dict[str, Any]]:
+        results = []
+        for event in self.iter_scan(directory_path, workers=workers, tiled=tiled):
+            results.extend(event["faces"])
+        return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Aura shared inference sidecar")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET or "/tmp/aura-inference.sock")
+    parser.add_argument("--profile", help="inference profile (default: INFERENCE_PROFILE)")
+    parser.add_argument("--threads", type=int, default=INFERENCE_SERVER_THREADS)
+    args = parser.parse_args()
+
+    from processor_pool import create_processor
+    processor = create_processor(profile=args.profile)
+    warmup_ms = processor.warm_up()
+
+    with InferenceServer(processor, args.socket, threads=args.threads) as server:
+        logger.info(f"Inference sidecar on {args.socket} ({processor.model_version}, warm-up {warmup_ms:.0f} ms)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            processor.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
+# Time every import from here on (see /api/superadmin/startup)
+import import_profiler
+import_profiler.enable()
+
+import sys
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import routers
 from routers import auth, profile, photos, admin, superadmin, owner
 # Import dependencies to trigger lazy loading if needed, and for lifespan
-from dependencies import get_processor
+from dependencies import start_model_loading, model_status, processor_pool_stats, close_processor
+from inference_executor import get_inference_executor, shutdown_inference_executor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,13 +22,28 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup/shutdown event handler."""
-    # Initialize processor on startup
-    logger.info("Initializing FaceProcessor on startup... (Lazy Loading Enabled - skipping eager load)")
-    # get_processor()  <-- Commented out to prevent timeout
-    logger.info("FaceProcessor ready (lazy)!")
+    # Load + warm up the model in the background: startup (and the
+    # platform's startup probe) never waits on it; see /ready.
+    start_model_loading()
+    # Heavy modules that routes import lazily load while we already serve
+    import_profiler.start_preimport()
     yield
-    # Cleanup on shutdown
+    # Cleanup on shutdown: let in-flight inference finish before exiting
     logger.info("Shutting down...")
+    if "micro_batcher" in sys.modules:
+        await sys.modules["micro_batcher"].close_micro_batcher()
+    # Write buffered usage events before the clients go away
+    from usage_buffer import close_usage_buffer
+    await asyncio.to_thread(close_usage_buffer)
+    from storage_ledger import close_storage_ledger
+    await asyncio.to_thread(close_storage_ledger)
+    from database_supabase_async import close_client
+    await close_client()
+    import database_postgres
+    await asyncio.to_thread(database_postgres.close_pool)
+    await asyncio.to_thread(shutdown_inference_executor)
+    # Only once inference has drained: tiled detection runs on the model's threads
+    await asyncio.to_thread(close_processor)
 
 app = FastAPI(
     title="Aura Core",
@@ -49,8 +72,35 @@ app.include_router(owner.router)
 async def root():
     return {"message": "Welcome to Aura Core API (Supabase Edition)", "status": "running"}
 
+def _singleton_stats(module_name: str, attr: str):
+    # Stats of a lazily created singleton, or None if no request has created
+    # it yet; never imports the module (micro_batcher pulls in cv2/numpy)
+    instance = getattr(sys.modules.get(module_name), attr, None)
+    return instance.stats() if instance is not None else None
+
 @app.get("/health")
 async def health():
-    # Check if processor is loaded
-    processor = get_processor()
-    return {"status": "ok", "processor_loaded": processor is not None}
+    # Liveness only: reports model state without loading or waiting on it
+    from usage_buffer import usage_buffer_stats
+    from storage_ledger import storage_ledger_stats
+    model = model_status()
+    return {
+        "status": "ok",
+        "processor_loaded": model["status"] == "ready",
+        "model": model,
+        "embedding_cache": _singleton_stats("embedding_cache", "_cache"),
+        "inference": get_inference_executor().stats(),
+        "micro_batch": _singleton_stats("micro_batcher", "_batcher"),
+        "processor_pool": processor_pool_stats(),
+        "usage_buffer": usage_buffer_stats(),
+        "storage_ledger": storage_ledger_stats()
+    }
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the model is loaded and warmed up, else 503."""
+    model = model_status()
+    code = 200 if model["status"] == "ready" else 503
+    return JSONResponse(status_code=code, content={"status": model["status"], "error": model["error"]})
+
+import_profiler.boot_complete()
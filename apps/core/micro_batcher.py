@@ -0,0 +1,305 @@
+"""
+Micro-batching for Aura Core.
+
+During live events dozens of selfie searches and /api/index-photo uploads
+arrive at once, each paying for its own detection + recognition pass.
+MicroBatcher gathers requests that arrive close together into one job, so
+the recognition model sees one stacked batch (FaceProcessor
+.get_embeddings_batch) instead of N single-image calls.
+
+Batching is adaptive, so idle latency is unchanged:
+- When no batch is in flight, a request is dispatched immediately,
+  together with whatever else is already queued.
+- While a batch is running, newcomers wait up to MICRO_BATCH_MAX_WAIT_MS
+  (or until MICRO_BATCH_MAX_SIZE items) and go out as the next batch.
+"""
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from embedding_cache import MISS, cache_key, get_embedding_cache
+from imaging import MAX_DIM, MAX_UPLOAD_BYTES, ImageTooLarge, InvalidImage, check_upload, decode_image
+from inference_executor import run_inference
+from inference_server import InferenceClient
+
+logger = logging.getLogger(__name__)
+
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", 8))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", 10))
+
+# Uploads up to this size are hashed on the event loop (well under a
+# millisecond); larger ones, and any lookup that may hit the disk tier,
+# run in a thread
+_INLINE_CACHE_BYTES = 256 * 1024
+
+
+class MicroBatcher:
+    """
+    Collects submitted items into batches for process_batch, an async
+    callable mapping a list of items to a same-length list of results. A
+    result that is an Exception instance is raised to that item's caller
+    only; if process_batch itself raises, every caller in the batch gets it.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int = MICRO_BATCH_MAX_SIZE,
+        max_wait_ms: float = MICRO_BATCH_MAX_WAIT_MS
+    ):
+        self.process_batch = process_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._in_flight = 0
+        self._counters = {"batches": 0, "items": 0, "largest_batch": 0}
+
+    def _ensure_started(self) -> None:
+        # Queue and collector belong to the loop that first uses them; a new
+        # loop (e.g. per-request loops under TestClient) gets fresh ones.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._collector is None or self._collector.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._in_flight = 0
+            self._collector = loop.create_task(self._collect())
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and await its result."""
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                # Nothing running: waiting would only add latency
+                if self._in_flight == 0:
+                    break
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self._in_flight += 1
+            self._loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: List[tuple]) -> None:
+        items = [item for item, _ in batch]
+        self._counters["batches"] += 1
+        self._counters["items"] += len(items)
+        self._counters["largest_batch"] = max(self._counters["largest_batch"], len(items))
+        try:
+            results = await self.process_batch(items)
+        except BaseException as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        finally:
+            self._in_flight -= 1
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self) -> None:
+        """Stop the collector (queued items are dispatched first)."""
+        if self._collector is None or self._loop is not asyncio.get_running_loop():
+            return
+        while not self._queue.empty():
+            await asyncio.sleep(0)
+        self._collector.cancel()
+        try:
+            await self._collector
+        except asyncio.CancelledError:
+            pass
+        self._collector = None
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._counters["batches"]
+        return {
+            **self._counters,
+            "mean_batch": round(self._counters["items"] / batches, 2) if batches else 0.0,
+            "in_flight": self._in_flight,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+def embed_images_batch(fp, blobs: List[bytes]) -> List[Any]:
+    """
+    Decode uploaded images and embed the largest face in each.
+
+    A single image takes FaceProcessor.get_embedding_from_image (the
+    unbatched path), so idle requests behave exactly as before. Larger
+    batches share one stacked recognition call. Per item the result is an
+    embedding, None (no face) or InvalidImage. With the inference sidecar
+    (fp is an inference_server.InferenceClient) the batch runs there.
+    """
+    if isinstance(fp, InferenceClient):
+        return fp.embed_images(blobs)
+
+    images = [decode_image(data, MAX_DIM) for data in blobs]
+
+    if len(images) == 1:
+        if images[0] is None:
+            return [InvalidImage("Invalid image file")]
+        return [fp.get_embedding_from_image(images[0])]
+
+    results: List[Any] = []
+    for img, faces in zip(images, fp.get_embeddings_batch(images)):
+        if img is None:
+            results.append(InvalidImage("Invalid image file"))
+        elif not faces:
+            results.append(None)
+        else:
+            results.append(max(faces, key=_face_area)["embedding"])
+    return results
+
+
+def _face_area(face: Dict[str, Any]) -> float:
+    return (face["bbox"][2] - face["bbox"][0]) * (face["bbox"][3] - face["bbox"][1])
+
+
+def embed_faces_batch(fp, blobs: List[bytes]) -> List[Any]:
+    """
+    Decode uploaded images and embed every face in each, for indexing.
+
+    Per item the result is InvalidImage or a (possibly empty) list of
+    {"bbox", "score", "embedding"} ordered largest face first, so index 0
+    is the face embed_images_batch would have picked.
+    """
+    if isinstance(fp, InferenceClient):
+        return fp.embed_faces(blobs)
+
+    images = [decode_image(data, MAX_DIM) for data in blobs]
+    results: List[Any] = []
+    for img, faces in zip(images, fp.get_embeddings_batch(images)):
+        if img is None:
+            results.append(InvalidImage("Invalid image file"))
+        else:
+            results.append(sorted(faces, key=_face_area, reverse=True))
+    return results
+
+
+async def _process_uploads(items: List[tuple]) -> List[Any]:
+    # Items are (processor, image bytes, all faces?); in practice one
+    # processor per batch
+    results: List[Any] = [None] * len(items)
+    groups: Dict[tuple, List[int]] = {}
+    for i, (fp, _, all_faces) in enumerate(items):
+        groups.setdefault((id(fp), all_faces), []).append(i)
+
+    for (_, all_faces), indices in groups.items():
+        fp = items[indices[0]][0]
+        blobs = [items[i][1] for i in indices]
+        batch_fn = embed_faces_batch if all_faces else embed_images_batch
+        for i, result in zip(indices, await run_inference(batch_fn, fp, blobs)):
+            results[i] = result
+    return results
+
+
+# Global batcher shared by all routes
+_batcher: Optional[MicroBatcher] = None
+
+
+def get_micro_batcher() -> MicroBatcher:
+    """Lazily create the process-wide upload batcher from MICRO_BATCH_* settings."""
+    global _batcher
+    if _batcher is None:
+        _batcher = MicroBatcher(_process_uploads)
+    return _batcher
+
+
+async def close_micro_batcher() -> None:
+    """Stop the global batcher's collector (called from main.lifespan)."""
+    if _batcher is not None:
+        await _batcher.close()
+
+
+async def read_upload(file, max_bytes: Optional[int] = None) -> bytes:
+    """
+    Read an UploadFile into memory (nothing touches disk), refusing bodies
+    over max_bytes (default MAX_UPLOAD_BYTES) without reading them in full.
+    Raises ImageTooLarge.
+    """
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    size = getattr(file, "size", None)
+    if size is not None and size > max_bytes:
+        raise ImageTooLarge(f"Image exceeds {max_bytes // (1024 * 1024)} MB")
+    data = await file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageTooLarge(f"Image exceeds {max_bytes // (1024 * 1024)} MB")
+    return data
+
+
+async def embed_upload(fp, data: bytes, use_cache: bool = True) -> Optional[List[float]]:
+    """
+    Embedding of the largest face in uploaded image bytes, or None.
+
+    Bytes are validated from the header first (imaging.check_upload), so
+    non-images and oversized images are rejected before hashing or
+    decoding. Then served from the embedding cache when the same bytes were
+    seen before (use_cache, and the cache is enabled; a disabled cache
+    doesn't even hash the upload), otherwise micro-batched with concurrent
+    uploads. Raises InvalidImage (ImageTooLarge for limit violations) and
+    HTTPException on backpressure.
+    """
+    check_upload(data)
+
+    key = None
+    cache = get_embedding_cache() if use_cache else None
+    if cache is not None and cache.enabled:
+        if cache.disk_tier or len(data) > _INLINE_CACHE_BYTES:
+            key, cached = await asyncio.to_thread(_cache_lookup, cache, data, fp)
+        else:
+            key, cached = _cache_lookup(cache, data, fp)
+        if cached is not MISS:
+            return cached
+
+    embedding = await get_micro_batcher().submit((fp, data, False))
+
+    if key is not None:
+        if cache.disk_tier:
+            await asyncio.to_thread(cache.put, key, embedding)
+        else:
+            cache.put(key, embedding)
+    return embedding
+
+
+def _cache_lookup(cache, data: bytes, fp):
+    # (key, cached embedding or MISS) for an upload
+    key = cache_key(data, getattr(fp, "model_version", ""))
+    return key, cache.get(key)
+
+
+async def embed_upload_faces(fp, data: bytes) -> List[Dict[str, Any]]:
+    """
+    Every face in uploaded image bytes (see embed_faces_batch), largest
+    first; [] if none. Validated and micro-batched like embed_upload, but
+    never cached: indexed uploads are unique.
+    """
+    check_upload(data)
+    return await get_micro_batcher().submit((fp, data, True))
@@ -0,0 +1,20 @@
+-- Per-Face Indexing Migration for Aura Pro
+-- Stores every detected face in a photo, not just the largest one
+-- Run this in Supabase SQL Editor AFTER 006_multi_org_admin.sql
+
+-- ============================================
+-- 1. FACE COLUMNS ON photos
+-- ============================================
+-- One row per face: rows of the same photo share `path` and are told apart
+-- by face_index (0 = largest face). Existing rows become face 0.
+-- size_bytes is only set on face 0 so storage sums count each file once.
+
+ALTER TABLE public.photos ADD COLUMN IF NOT EXISTS face_index SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE public.photos ADD COLUMN IF NOT EXISTS bbox REAL[]; -- [x1, y1, x2, y2] in thumbnail pixels
+ALTER TABLE public.photos ADD COLUMN IF NOT EXISTS det_score REAL; -- detector confidence
+
+-- ============================================
+-- 2. INDEXES
+-- ============================================
+-- Lookups of all faces in one photo (re-index, delete by path)
+CREATE INDEX IF NOT EXISTS photos_org_path_idx ON public.photos(org_id, path);
@@ -0,0 +1,133 @@
+-- Photos Natural Key Migration for Aura Pro
+-- Makes (org_id, path, face_index) unique and adds upsert_photo_faces()
+-- Run this in Supabase SQL Editor AFTER 007_photo_faces.sql
+
+-- ============================================
+-- 1. CLEAN UP DUPLICATES
+-- ============================================
+-- Scans used to plain-insert every face with face_index 0, so re-scans and
+-- retried inserts left copies of the same face. Keep the oldest copy of each
+-- (org_id, path, embedding); matches of removed copies go with them
+-- (photo_matches cascades) and are found again on the next match run.
+
+DELETE FROM public.photos p
+USING public.photos keep
+WHERE p.path = keep.path
+  AND p.org_id IS NOT DISTINCT FROM keep.org_id
+  AND p.embedding = keep.embedding
+  AND (keep.created_at, keep.id) < (p.created_at, p.id);
+
+-- Distinct faces of one photo that still share a face_index get numbered
+-- 0..n-1 in their current order (rows from 007 keep their numbers)
+WITH numbered AS (
+    SELECT id,
+           row_number() OVER (
+               PARTITION BY org_id, path ORDER BY face_index, created_at, id
+           ) - 1 AS new_index
+    FROM public.photos
+)
+UPDATE public.photos p
+SET face_index = numbered.new_index
+FROM numbered
+WHERE p.id = numbered.id AND p.face_index <> numbered.new_index;
+
+-- ============================================
+-- 2. NATURAL KEY
+-- ============================================
+-- Target of ON CONFLICT (org_id, path, face_index) in upsert_photo_faces()
+-- below and in database_postgres (DB_BACKEND=postgres). NULLS NOT DISTINCT
+-- (Postgres 15+) makes rows without an org conflict too.
+-- Its (org_id, path) prefix serves the lookups photos_org_path_idx did.
+
+CREATE UNIQUE INDEX IF NOT EXISTS photos_natural_key
+    ON public.photos(org_id, path, face_index) NULLS NOT DISTINCT;
+
+DROP INDEX IF EXISTS public.photos_org_path_idx;
+
+-- ============================================
+-- 3. UPSERT_PHOTO_FACES (Backend Only)
+-- ============================================
+-- Writes the faces of whole files in one transaction. p_rows holds every
+-- face of each file it covers (photos columns as JSON); a row without
+-- "embedding" stands for a file with no faces:
+-- - face rows are upserted on (org_id, path, face_index),
+-- - rows of those files with a higher face_index (faces the file no
+--   longer has, e.g. after it was edited) are deleted,
+-- - bytes_added is the change in the files' summed size_bytes, so
+--   re-indexing a file doesn't charge its org's storage again.
+-- Returns {"ids": [...aligned with p_rows, null for faceless files],
+-- "bytes_added": n}.
+
+CREATE OR REPLACE FUNCTION public.upsert_photo_faces(p_rows JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_old_bytes BIGINT;
+    v_new_bytes BIGINT;
+    v_ids JSONB;
+BEGIN
+    SELECT coalesce(sum(p.size_bytes), 0) INTO v_old_bytes
+    FROM (SELECT DISTINCT (r->>'org_id')::uuid AS org_id, r->>'path' AS path
+          FROM jsonb_array_elements(p_rows) r) f
+    JOIN public.photos p
+      ON p.path = f.path AND (p.org_id = f.org_id OR (p.org_id IS NULL AND f.org_id IS NULL));
+
+    WITH incoming AS (
+        SELECT t.ord,
+               (t.r->>'org_id')::uuid AS org_id,
+               t.r->>'path' AS path,
+               coalesce((t.r->>'face_index')::smallint, 0) AS face_index,
+               t.r
+        FROM jsonb_array_elements(p_rows) WITH ORDINALITY AS t(r, ord)
+    ),
+    upserted AS (
+        INSERT INTO public.photos AS p
+            (org_id, path, face_index, full_path, embedding, photo_date, metadata, size_bytes, bbox, det_score)
+        SELECT DISTINCT ON (org_id, path, face_index)
+               org_id, path, face_index,
+               r->>'full_path',
+               (r->>'embedding')::vector,
+               (r->>'photo_date')::date,
+               r->'metadata',
+               coalesce((r->>'size_bytes')::bigint, 0),
+               CASE WHEN jsonb_typeof(r->'bbox') = 'array'
+                    THEN ARRAY(SELECT jsonb_array_elements_text(r->'bbox')::real) END,
+               (r->>'det_score')::real
+        FROM incoming
+        WHERE r ? 'embedding'
+        ORDER BY org_id, path, face_index, ord DESC
+        ON CONFLICT (org_id, path, face_index) DO UPDATE SET
+            full_path = coalesce(EXCLUDED.full_path, p.full_path),
+            embedding = EXCLUDED.embedding,
+            photo_date = EXCLUDED.photo_date,
+            metadata = EXCLUDED.metadata,
+            size_bytes = EXCLUDED.size_bytes,
+            bbox = EXCLUDED.bbox,
+            det_score = EXCLUDED.det_score
+        RETURNING p.id, p.org_id, p.path, p.face_index
+    )
+    SELECT jsonb_agg(u.id ORDER BY i.ord) INTO v_ids
+    FROM incoming i
+    LEFT JOIN upserted u
+      ON i.r ? 'embedding' AND u.path = i.path AND u.face_index = i.face_index
+     AND (u.org_id = i.org_id OR (u.org_id IS NULL AND i.org_id IS NULL));
+
+    DELETE FROM public.photos p
+    USING (SELECT (r->>'org_id')::uuid AS org_id, r->>'path' AS path,
+                  coalesce(max(coalesce((r->>'face_index')::int, 0)) FILTER (WHERE r ? 'embedding'), -1) + 1 AS faces
+           FROM jsonb_array_elements(p_rows) r
+           GROUP BY 1, 2) f
+    WHERE p.path = f.path AND (p.org_id = f.org_id OR (p.org_id IS NULL AND f.org_id IS NULL))
+      AND p.face_index >= f.faces;
+
+    SELECT coalesce(sum(p.size_bytes), 0) INTO v_new_bytes
+    FROM (SELECT DISTINCT (r->>'org_id')::uuid AS org_id, r->>'path' AS path
+          FROM jsonb_array_elements(p_rows) r) f
+    JOIN public.photos p
+      ON p.path = f.path AND (p.org_id = f.org_id OR (p.org_id IS NULL AND f.org_id IS NULL));
+
+    RETURN jsonb_build_object('ids', coalesce(v_ids, '[]'::jsonb), 'bytes_added', v_new_bytes - v_old_bytes);
+END;
+$$;
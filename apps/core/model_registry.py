@@ -0,0 +1,296 @@
+"""
+Model Registry for Aura Core.
+
+Cold start used to download buffalo_l into ~/.insightface on first use,
+create ONNX sessions for every model in the pack (landmarks and gender/age
+included, only to discard them), and let ONNX Runtime re-optimize each
+graph. At the start of an event that is our worst tail latency.
+
+At image build time `python model_registry.py bake` writes a registry entry
+per model pack to MODEL_REGISTRY_DIR/<pack>/:
+- only the models FaceProcessor loads (detection + recognition),
+- each graph already optimized by ONNX Runtime (MODEL_BAKE_OPT_LEVEL),
+- aura_registry.json with SHA-256 checksums of the source and baked files
+  and the onnxruntime version that produced them.
+
+Source files must match MODEL_CHECKSUMS_FILE ({pack: {file name: sha256}},
+committed next to this module), so a tampered or re-published download
+never gets baked; `python model_registry.py pin` writes a pack's entry.
+
+At runtime resolve_model_dir() hands FaceProcessor the baked directory
+after verifying it (MODEL_VERIFY), and sessions are created with graph
+optimization disabled. Without a usable registry entry the stock pack is
+loaded as before.
+
+Offline-optimized graphs are tied to the onnxruntime version, and at the
+"all" level to the build machine's CPU as well, so the default bake level
+is "extended", and a version mismatch falls back to the stock pack.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INSIGHTFACE_ROOT = os.path.expanduser(os.getenv("INSIGHTFACE_ROOT", "~/.insightface"))
+
+# Baked packs live in <MODEL_REGISTRY_DIR>/<pack>/ (unset = stock loading)
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR")
+
+# Runtime check of baked files: "full" (SHA-256), "size" or "off"
+MODEL_VERIFY = os.getenv("MODEL_VERIFY", "size")
+
+# ORT optimization applied when baking (see inference_profiles._GRAPH_OPT_LEVELS)
+MODEL_BAKE_OPT_LEVEL = os.getenv("MODEL_BAKE_OPT_LEVEL", "extended")
+
+# Pinned SHA-256s of the downloaded source files, per pack
+MODEL_CHECKSUMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_checksums.json")
+
+REGISTRY_FILE = "aura_registry.json"
+BAKED_TASKS = ("detection", "recognition")
+_HASH_CHUNK = 1 << 20
+
+
+class ModelIntegrityError(Exception):
+    """Raised when baked model files don't match their registry checksums."""
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _ort_version() -> str:
+    import onnxruntime
+    return onnxruntime.__version__
+
+
+def read_registry(pack_dir: str) -> Optional[Dict[str, Any]]:
+    """The registry entry of a baked pack directory, or None."""
+    try:
+        with open(os.path.join(pack_dir, REGISTRY_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def verify_pack(pack_dir: str, mode: str = "full") -> Dict[str, Any]:
+    """
+    Check baked files against the registry entry and return it.
+
+    mode "full" hashes every file, "size" only compares byte counts (cheap
+    enough for every cold start), "off" just reads the entry. Raises
+    ModelIntegrityError on any mismatch or a missing entry.
+    """
+    entry = read_registry(pack_dir)
+    if entry is None:
+        raise ModelIntegrityError(f"No {REGISTRY_FILE} in {pack_dir}")
+    if mode == "off":
+        return entry
+
+    for name, meta in entry["files"].items():
+        path = os.path.join(pack_dir, name)
+        if not os.path.isfile(path):
+            raise ModelIntegrityError(f"Missing baked model {path}")
+        if os.path.getsize(path) != meta["bytes"]:
+            raise ModelIntegrityError(f"Size mismatch for {path}")
+        if mode == "full" and sha256_file(path) != meta["sha256"]:
+            raise ModelIntegrityError(f"Checksum mismatch for {path}")
+    return entry
+
+
+def resolve_model_dir(pack: str, registry_dir: Optional[str] = None, verify: Optional[str] = None) -> Optional[str]:
+    """
+    Baked directory to load `pack` from, or None to load the stock pack.
+
+    Falls back (with a warning) when the entry fails verification or was
+    optimized by a different onnxruntime version.
+    """
+    registry_dir = registry_dir or MODEL_REGISTRY_DIR
+    if not registry_dir:
+        return None
+    pack_dir = os.path.join(registry_dir, pack)
+    if not os.path.isdir(pack_dir):
+        logger.warning(f"Model registry has no baked '{pack}' in {registry_dir}; loading stock pack")
+        return None
+
+    try:
+        entry = verify_pack(pack_dir, verify or MODEL_VERIFY)
+    except ModelIntegrityError as e:
+        logger.error(f"Baked model pack rejected: {e}; loading stock pack")
+        return None
+    if entry.get("onnxruntime") != _ort_version():
+        logger.warning(
+            f"Baked '{pack}' was optimized by onnxruntime {entry.get('onnxruntime')}, "
+            f"running {_ort_version()}; loading stock pack"
+        )
+        return None
+    return pack_dir
+
+
+def _optimize(src: str, dst: str, opt_level: str) -> None:
+    import onnxruntime
+    from inference_profiles import _GRAPH_OPT_LEVELS
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = getattr(
+        onnxruntime.GraphOptimizationLevel, _GRAPH_OPT_LEVELS[opt_level]
+    )
+    options.optimized_model_filepath = dst
+    # Creating the session writes the optimized graph to dst
+    onnxruntime.InferenceSession(src, options, providers=["CPUExecutionProvider"])
+
+
+def _source_models(src_dir: str) -> List[tuple]:
+    # (file name, path, task) of the pack models FaceProcessor loads
+    from insightface.model_zoo import model_zoo
+
+    models = []
+    for name in sorted(os.listdir(src_dir)):
+        if not name.endswith(".onnx"):
+            continue
+        src = os.path.join(src_dir, name)
+        model = model_zoo.get_model(src, providers=["CPUExecutionProvider"])
+        if model is None or model.taskname not in BAKED_TASKS or \
+                any(task == model.taskname for _, _, task in models):
+            continue
+        models.append((name, src, model.taskname))
+    return models
+
+
+def pin_pack(pack: str, root: str = INSIGHTFACE_ROOT) -> Dict[str, str]:
+    """SHA-256s of the source files bake_pack would bake from `pack`."""
+    from insightface.utils import ensure_available
+
+    src_dir = ensure_available("models", pack, root=root)
+    return {name: sha256_file(src) for name, src, _ in _source_models(src_dir)}
+
+
+def bake_pack(
+    pack: str,
+    output_dir: str,
+    root: str = INSIGHTFACE_ROOT,
+    opt_level: str = MODEL_BAKE_OPT_LEVEL,
+    expected: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Bake `pack` into output_dir/<pack>/ and return its registry entry.
+
+    The pack is downloaded into root if needed. expected maps source file
+    names to pinned SHA-256s; when given, a file without a pinned entry or
+    with a mismatching one raises ModelIntegrityError before anything is
+    written.
+    """
+    from insightface.utils import ensure_available
+
+    src_dir = ensure_available("models", pack, root=root)
+    models = _source_models(src_dir)
+    hashes = {name: sha256_file(src) for name, src, _ in models}
+    if expected is not None:
+        for name, src, _ in models:
+            if name not in expected:
+                raise ModelIntegrityError(f"{src} has no pinned checksum (run `model_registry.py pin --pack {pack}`)")
+            if expected[name] != hashes[name]:
+                raise ModelIntegrityError(f"{src} does not match its pinned checksum")
+
+    pack_dir = os.path.join(output_dir, pack)
+    os.makedirs(pack_dir, exist_ok=True)
+
+    files: Dict[str, Dict[str, Any]] = {}
+    for name, src, task in models:
+        source_sha = hashes[name]
+
+        dst = os.path.join(pack_dir, name)
+        start = time.perf_counter()
+        _optimize(src, dst, opt_level)
+        files[name] = {
+            "task": task,
+            "source_sha256": source_sha,
+            "sha256": sha256_file(dst),
+            "bytes": os.path.getsize(dst),
+        }
+        logger.info(f"Baked {pack}/{name} ({task}) in {time.perf_counter() - start:.1f}s")
+
+    missing = set(BAKED_TASKS) - {meta["task"] for meta in files.values()}
+    if missing:
+        raise ModelIntegrityError(f"Pack '{pack}' has no {', '.join(sorted(missing))} model")
+
+    entry = {
+        "pack": pack,
+        "opt_level": opt_level,
+        "onnxruntime": _ort_version(),
+        "baked_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "files": files,
+    }
+    with open(os.path.join(pack_dir, REGISTRY_FILE), "w") as f:
+        json.dump(entry, f, indent=2)
+    return entry
+
+
+def main(argv: Optional[List[str]] = None):
+    from inference_profiles import INFERENCE_PROFILES, PRECISIONS, get_profile, model_pack_name
+
+    parser = argparse.ArgumentParser(description="Bake and verify pre-optimized model packs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    b = sub.add_parser("bake", help="Download, optimize and checksum model packs")
+    b.add_argument("--output", default=MODEL_REGISTRY_DIR, required=MODEL_REGISTRY_DIR is None)
+    b.add_argument("--pack", action="append", help="pack name (default: every profile's pack)")
+    b.add_argument("--precision", choices=PRECISIONS, default=None)
+    b.add_argument("--opt-level", default=MODEL_BAKE_OPT_LEVEL)
+    b.add_argument("--root", default=INSIGHTFACE_ROOT)
+    b.add_argument("--checksums", default=MODEL_CHECKSUMS_FILE,
+                   help="JSON {pack: {file name: sha256}} the source files must match")
+    b.add_argument("--unpinned", action="store_true", help="bake without checking pinned checksums")
+
+    p = sub.add_parser("pin", help="Download packs and pin their source checksums")
+    p.add_argument("--pack", action="append", required=True)
+    p.add_argument("--root", default=INSIGHTFACE_ROOT)
+    p.add_argument("--checksums", default=MODEL_CHECKSUMS_FILE)
+
+    v = sub.add_parser("verify", help="Hash baked files against their registry entries")
+    v.add_argument("--registry", default=MODEL_REGISTRY_DIR, required=MODEL_REGISTRY_DIR is None)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "bake":
+        packs = args.pack or sorted({
+            model_pack_name(get_profile(name, precision=args.precision)) for name in INFERENCE_PROFILES
+        })
+        pinned = None
+        if not args.unpinned:
+            with open(args.checksums) as f:
+                pinned = json.load(f)
+        for pack in packs:
+            expected = None if pinned is None else pinned.get(pack, {})
+            entry = bake_pack(pack, args.output, args.root, args.opt_level, expected)
+            print(json.dumps(entry, indent=2))
+    elif args.command == "pin":
+        pinned = {}
+        if os.path.exists(args.checksums):
+            with open(args.checksums) as f:
+                pinned = json.load(f)
+        for pack in args.pack:
+            pinned[pack] = pin_pack(pack, args.root)
+            print(f"{pack}: {json.dumps(pinned[pack])}")
+        with open(args.checksums, "w") as f:
+            json.dump(pinned, f, indent=2, sort_keys=True)
+            f.write("\n")
+    else:
+        for pack in sorted(os.listdir(args.registry)):
+            pack_dir = os.path.join(args.registry, pack)
+            if os.path.isdir(pack_dir):
+                verify_pack(pack_dir, "full")
+                print(f"{pack}: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,161 @@
 import os
 import time
 import numpy as np
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from typing import List, Dict, Any, Callable, Optional, Iterator, Tuple
 import logging
 import cv2
 from insightface.app import FaceAnalysis
+from insightface.utils import face_align
+
+from imaging import (
+    MAX_DIM, VALID_EXTENSIONS, load_image, ingest_image_file, resize_to_max_dim, list_image_files
+)
+from tiling import tile_grid, nms
+from model_registry import resolve_model_dir
+from inference_profiles import (
+    AUTOTUNE_ENABLED, get_profile, build_session_options, model_pack_name, model_version,
+    load_tuning, save_tuning, thread_candidates
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Max number of aligned face crops pushed through the recognition model in a
+# single ONNX call. Bounds the size of the stacked (N, 3, 112, 112) tensor.
+REC_BATCH_SIZE = int(os.getenv("REC_BATCH_SIZE", 32))
+
+# Long-side limit for scans (selfies/uploads use imaging.MAX_DIM). The
+# detector runs at det_size (640) regardless, so larger inputs only improve
+# the alignment crops; scans keep more pixels than interactive selfies.
+SCAN_MAX_DIM = int(os.getenv("SCAN_MAX_DIM", 2048))
+
+# Parallel scan engine: default worker count (1 = serial, in-process) and how
+# many files each worker may have queued ahead before we stop submitting.
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", 1))
+SCAN_QUEUE_PER_WORKER = int(os.getenv("SCAN_QUEUE_PER_WORKER", 2))
+SCAN_PROFILE = os.getenv("SCAN_INFERENCE_PROFILE", "scan-accurate")
+
+# Tiled detection (see tiling.py) for large group shots. Off by default;
+# tiled scans decode at TILED_MAX_DIM instead of SCAN_MAX_DIM so small faces
+# keep their pixels, and run up to TILE_THREADS tiles concurrently.
+SCAN_TILED = os.getenv("SCAN_TILED_DETECTION", "0") == "1"
+TILED_MAX_DIM = int(os.getenv("TILED_MAX_DIM", 4096))
+TILE_THREADS = int(os.getenv("TILE_THREADS", min(4, os.cpu_count() or 1)))
+
+# Timed iterations per thread setting when auto-tuning a profile
+AUTOTUNE_RUNS = int(os.getenv("INFERENCE_AUTOTUNE_RUNS", 5))
+
 class FaceProcessor:
-    def __init__(self):
+    def __init__(
+        self,
+        intra_op_threads: Optional[int] = None,
+        profile: Optional[str] = None,
+        inter_op_threads: Optional[int] = None,
+        autotune: Optional[bool] = None,
+        precision: Optional[str] = None
+    ):
         """
         Initialize the FaceProcessor with InsightFace (ONNX Runtime).
-        Uses the default 'buffalo_l' model pack which includes detection and recognition.
+
+        profile names an entry in inference_profiles.INFERENCE_PROFILES
+        (default: INFERENCE_PROFILE env) selecting model pack, loaded modules,
+        detector size and ORT session options. Only detection + recognition
+        are loaded; landmark and gender/age models are never used.
+
+        intra_op_threads / inter_op_threads override the profile (scan workers
+        set them so N processes don't each spawn one thread per core). With
+        autotune (default: INFERENCE_AUTOTUNE env) and no explicit threads,
+        the fastest thread setting for this host is loaded from cache or
+        benchmarked once.
+
+        precision ("fp32" or "int8", default: INFERENCE_PRECISION env) picks
+        the stock models or the quantized pack built by quantization.py.
+
+        With MODEL_REGISTRY_DIR set, the pre-optimized pack baked by
+        model_registry.py is loaded with graph optimization disabled.
+        Per-phase load times end up in self.load_timings.
         """
-        self.app = FaceAnalysis(name='buffalo_l', providers=['CPUExecutionProvider'])
-        logger.info("Initializing FaceProcessor (InsightFace/ONNX)...")
+        start = time.perf_counter()
+        self.profile = get_profile(
+            profile,
+            intra_op_threads=intra_op_threads,
+            inter_op_threads=inter_op_threads,
+            precision=precision
+        )
+
+        if autotune is None:
+            autotune = AUTOTUNE_ENABLED
+        if autotune and not intra_op_threads:
+            tuned = load_tuning(self.profile)
+            if tuned is None:
+                tuned = autotune_profile(self.profile)
+            self.profile["intra_op_threads"] = tuned["intra_op_threads"]
+            self.profile["inter_op_threads"] = tuned["inter_op_threads"]
+
+        # Recorded in scan manifests and embedding cache keys, so a model or
+        # detector size change triggers re-indexing
+        self.model_pack = model_pack_name(self.profile)
+        self.model_version = model_version(self.profile)
+        self._tile_pool = None  # created on first tiled detection
+
+        # Baked graphs are already optimized; don't pay for it again
+        model_dir = resolve_model_dir(self.model_pack)
+        if model_dir:
+            self.profile["graph_optimization"] = "disabled"
+        self.load_timings = {
+            "resolve_ms": round((time.perf_counter() - start) * 1000, 1),
+            "baked": model_dir is not None,
+        }
+
+        start = time.perf_counter()
+        self.app = FaceAnalysis(
+            name=model_dir or self.model_pack,
+            allowed_modules=self.profile["allowed_modules"],
+            providers=['CPUExecutionProvider'],
+            sess_options=build_session_options(self.profile)
+        )
+        self.load_timings["sessions_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f"Initializing FaceProcessor (InsightFace/ONNX, profile={self.profile['name']})...")
         
         # Prepare the model (warmup/download)
         # ctx_id=0 for GPU, -1 for CPU. default is usually CPU if no GPU.
         try:
-            self.app.prepare(ctx_id=0, det_size=(640, 640))
+            start = time.perf_counter()
+            self.app.prepare(ctx_id=0, det_size=tuple(self.profile["det_size"]))
+            self.load_timings["prepare_ms"] = round((time.perf_counter() - start) * 1000, 1)
             logger.info("InsightFace model loaded successfully.")
         except Exception as e:
             logger.error(f"Failed to load InsightFace model: {e}")
             raise e
 
+    def warm_up(self) -> float:
+        """
+        Run detection and recognition once on a synthetic frame so ONNX
+        Runtime allocates its buffers before the first real request.
+        Returns the warm-up time in ms.
+        """
+        rng = np.random.default_rng(0)
+        det_w, det_h = self.profile["det_size"]
+        frame = rng.integers(0, 255, size=(det_h, det_w, 3), dtype=np.uint8)
+        rec_model = self.app.models["recognition"]
+        crop_size = rec_model.input_size[0]
+        crops = [rng.integers(0, 255, size=(crop_size, crop_size, 3), dtype=np.uint8)]
+
+        start = time.perf_counter()
+        self.app.det_model.detect(frame, max_num=0, metric="default")
+        rec_model.get_feat(crops)
+        return (time.perf_counter() - start) * 1000
+
+    def close(self) -> None:
+        """Shut down the tiled-detection threads, letting running tiles finish."""
+        pool, self._tile_pool = self._tile_pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
     def get_embedding_from_image(self, img: np.ndarray) -> List[float]:
         """
         Get embedding from a loaded numpy array (BGR).
@@ -35,14 +163,9 @@ class FaceProcessor:
         try:
             start = time.time()
             
-            # Additional safety check for dimensions (if not checked before)
-            # Resize loop logic could be here, but usually caller handles optimization if passing raw buffer
-            # Or we can reuse resize strict here
-            MAX_DIM = 1280
-            h, w = img.shape[:2]
-            if max(h, w) > MAX_DIM:
-                scale = MAX_DIM / max(h, w)
-                img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            # Additional safety check for dimensions (callers decoding via
+            # imaging.decode_image/load_image are already within MAX_DIM)
+            img = resize_to_max_dim(img, MAX_DIM)
 
             faces = self.app.get(img)
             
@@ -69,8 +192,8 @@ class FaceProcessor:
         try:
             start = time.time()
             
-            # InsightFace reads via cv2/numpy
-            img = cv2.imread(img_path)
+            # InsightFace reads via cv2/numpy; JPEGs decode at reduced scale
+            img = load_image(img_path, MAX_DIM)
             if img is None:
                 logger.warning(f"Could not read image: {img_path}")
                 return None
@@ -86,12 +209,134 @@ class FaceProcessor:
             logger.error(f"Error processing {img_path}: {e}")
             return None
 
-    def get_photo_date(self, img_path: str) -> str:
+    def detect_faces(self, img: np.ndarray, tiled: bool = False):
+        """
+        Run the detector on a BGR frame. Returns (bboxes (N, 5), kpss (N, 5, 2)),
+        or (None, None) when nothing is found.
+        """
+        if tiled:
+            return self.detect_tiled(img)
+        return self.app.det_model.detect(img, max_num=0, metric="default")
+
+    def detect_tiled(self, img: np.ndarray):
+        """
+        Detect faces on overlapping tiles at near-native resolution plus one
+        whole-frame pass (for faces larger than a tile), then merge with NMS.
+
+        Tiles run concurrently on a small thread pool; ONNX Runtime sessions
+        are safe to call from several threads. Frames that fit in a single
+        tile fall back to a plain detection pass.
+        """
+        h, w = img.shape[:2]
+        tiles = tile_grid(w, h)
+        if len(tiles) == 1:
+            return self.app.det_model.detect(img, max_num=0, metric="default")
+
+        if self._tile_pool is None:
+            self._tile_pool = ThreadPoolExecutor(max_workers=TILE_THREADS, thread_name_prefix="tile")
+
+        det_model = self.app.det_model
+
+        def run(region):
+            x0, y0, x1, y1 = region
+            bboxes, kpss = det_model.detect(img[y0:y1, x0:x1], max_num=0, metric="default")
+            if bboxes is None or bboxes.shape[0] == 0 or kpss is None:
+                return None
+            bboxes = bboxes.copy()
+            bboxes[:, [0, 2]] += x0
+            bboxes[:, [1, 3]] += y0
+            return bboxes, kpss + np.array([x0, y0], dtype=kpss.dtype)
+
+        regions = [(0, 0, w, h)] + tiles
+        found = [r for r in self._tile_pool.map(run, regions) if r is not None]
+        if not found:
+            return None, None
+
+        bboxes = np.concatenate([b for b, _ in found])
+        kpss = np.concatenate([k for _, k in found])
+        keep = nms(bboxes)
+        logger.debug(f"Tiled detection: {len(tiles)} tiles, {len(bboxes)} raw -> {len(keep)} faces")
+        return bboxes[keep], kpss[keep]
+
+    def get_embeddings_batch(self, images: List[np.ndarray], tiled: bool = False) -> List[List[Dict[str, Any]]]:
+        """
+        Detect and embed ALL faces across a list of BGR frames.
+
+        Detection runs per frame (tiled when tiled=True, see detect_tiled),
+        then every aligned face crop from the whole batch is stacked and
+        pushed through the recognition model in as few ONNX calls as possible
+        (chunks of REC_BATCH_SIZE). Only faces surviving NMS are recognized.
+
+        Returns one list per input image, each containing dicts with keys:
+        bbox, score, embedding. Images that fail to process yield [].
+        """
+        rec_model = self.app.models["recognition"]
+        crop_size = rec_model.input_size[0]
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in images]
+        crops = []
+        owners = []  # (image index, bbox, score) for each crop
+
+        # 1. Detection + alignment, one frame at a time
+        for idx, img in enumerate(images):
+            if img is None:
+                continue
+            try:
+                bboxes, kpss = self.detect_faces(img, tiled=tiled)
+                if bboxes is None or bboxes.shape[0] == 0 or kpss is None:
+                    continue
+                for i in range(bboxes.shape[0]):
+                    crops.append(face_align.norm_crop(img, landmark=kpss[i], image_size=crop_size))
+                    owners.append((idx, bboxes[i, 0:4], float(bboxes[i, 4])))
+            except Exception as e:
+                logger.error(f"Detection failed for batch item {idx}: {e}")
+
+        if not crops:
+            return results
+
+        # 2. Recognition over the stacked crops
+        start = time.time()
+        for offset in range(0, len(crops), REC_BATCH_SIZE):
+            chunk = crops[offset:offset + REC_BATCH_SIZE]
+            try:
+                feats = np.asarray(rec_model.get_feat(chunk), dtype=np.float32)
+            except Exception as e:
+                logger.error(f"Recognition failed for batch chunk at {offset}: {e}")
+                continue
+
+            norms = np.linalg.norm(feats, axis=1, keepdims=True)
+            feats = feats / np.maximum(norms, 1e-12)
+
+            for (idx, bbox, score), feat in zip(owners[offset:offset + REC_BATCH_SIZE], feats):
+                results[idx].append({
+                    "bbox": [float(v) for v in bbox],
+                    "score": score,
+                    "embedding": feat.tolist()
+                })
+
+        logger.info(
+            f"Batch embedded {len(crops)} faces from {len(images)} images in {time.time() - start:.4f}s"
+        )
+        return results
+
+    def get_photo_date(self, img_path: str, image_info: Optional[Dict[str, Any]] = None) -> str:
         """
         Extract photo date from EXIF metadata or fallback to file mtime.
         Returns date in YYYY-MM-DD format.
+
+        If image_info from imaging.ingest_image_file() is given, the already
+        parsed EXIF dates and mtime are used and the file is not reopened.
         """
         from datetime import datetime
+
+        if image_info is not None:
+            # Format: "2025:07:16 18:54:03"
+            value = image_info.get("date_time_original") or image_info.get("date_time")
+            if value:
+                return value.split(" ")[0].replace(":", "-")
+            if image_info.get("mtime") is not None:
+                return datetime.fromtimestamp(image_info["mtime"]).strftime("%Y-%m-%d")
+            return datetime.now().strftime("%Y-%m-%d")
         
         # Try to extract EXIF date
         try:
@@ -117,42 +362,233 @@ class FaceProcessor:
         except Exception:
             return datetime.now().strftime("%Y-%m-%d")
 
-    def scan_directory(self, directory_path: str) -> List[Dict[str, Any]]:
+    def list_images(self, directory_path: str) -> List[str]:
+        """
+        Walk a directory and return image paths in a stable (sorted) order,
+        so serial and parallel scans produce identical result ordering.
+        """
+        return list_image_files(directory_path)
+
+    def scan_file(self, full_path: str, tiled: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """
+        Index ALL faces in a single image. Returns [] if unreadable or faceless.
+
+        tiled (default: SCAN_TILED_DETECTION env) decodes at TILED_MAX_DIM and
+        uses tiled detection, for group shots with many small faces.
+        """
+        return self.scan_file_hashed(full_path, tiled=tiled)[0]
+
+    def scan_file_hashed(
+        self,
+        full_path: str,
+        tiled: Optional[bool] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        scan_file, plus the SHA-256 of the bytes the faces were found in
+        (None if the file couldn't be read) for the scan manifest.
+        """
+        if tiled is None:
+            tiled = SCAN_TILED
+        content_hash = None
+        try:
+            # Single read: EXIF, pixels and hash come from the same buffer
+            img, info = ingest_image_file(full_path, TILED_MAX_DIM if tiled else SCAN_MAX_DIM)
+            content_hash = info.get("content_hash")
+            if img is None:
+                return [], content_hash
+
+            if tiled:
+                embeddings = [face["embedding"] for face in self.get_embeddings_batch([img], tiled=True)[0]]
+            else:
+                embeddings = [face.normed_embedding.tolist() for face in self.app.get(img)]
+            if not embeddings:
+                return [], content_hash
+
+            # Store every face found
+            photo_date = self.get_photo_date(full_path, image_info=info)
+            return [
+                {
+                    "path": full_path,
+                    "embedding": embedding,
+                    "photo_date": photo_date
+                }
+                for embedding in embeddings
+            ], content_hash
+
+        except Exception as e:
+            logger.error(f"Error scanning {full_path}: {e}")
+            return [], content_hash
+
+    def iter_scan(
+        self,
+        directory_path: str,
+        workers: Optional[int] = None,
+        manifest=None,
+        tiled: Optional[bool] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Generator form of scan_directory: yields one event per image file as
+        soon as it is processed, so callers can stream/persist incrementally.
+
+        Each event: {"path", "index", "total", "faces", "content_hash"} where
+        faces is the (possibly empty) list of face records for that file and
+        content_hash the SHA-256 of the bytes they came from (see
+        scan_file_hashed), for recording the file in the manifest.
+
+        If a ScanManifest is given, files it reports as unchanged are skipped
+        up front and excluded from "total". tiled is passed to scan_file.
+        """
+        yield from iter_scan_paths(
+            self.list_images(directory_path), self.scan_file_hashed,
+            workers=workers, manifest=manifest, tiled=tiled
+        )
+
+    def scan_directory(
+        self,
+        directory_path: str,
+        workers: Optional[int] = None,
+        tiled: Optional[bool] = None
+    ) -> List[Dict[str, Any]]:
         """
         Scans a directory for images and indexes ALL faces found in each image.
+
+        workers > 1 fans decode, EXIF and inference out to a process pool, each
+        worker holding its own InsightFace session. Results keep file order.
+        tiled enables tiled detection for large group photos.
         """
         results = []
-        valid_extensions = {".jpg", ".jpeg", ".png", ".webp"}
-        
-        for root, _, files in os.walk(directory_path):
-            for file in files:
-                if os.path.splitext(file)[1].lower() in valid_extensions:
-                    full_path = os.path.join(root, file)
-                    try:
-                        # Direct read to get ALL faces
-                        img = cv2.imread(full_path)
-                        if img is None:
-                            continue
-                            
-                        faces = self.app.get(img)
-                        if not faces:
-                            continue
-                            
-                        # Store every face found
-                        photo_date = self.get_photo_date(full_path)
-                        for face in faces:
-                            results.append({
-                                "path": full_path,
-                                "embedding": face.normed_embedding.tolist(),
-                                "photo_date": photo_date
-                            })
-                            
-                    except Exception as e:
-                        logger.error(f"Error scanning {full_path}: {e}")
-                        continue
-                        
+        for event in self.iter_scan(directory_path, workers=workers, tiled=tiled):
+            results.extend(event["faces"])
         return results
 
+
+
+def iter_scan_paths(
+    paths: List[str],
+    scan_file_hashed: Callable[..., Tuple[List[Dict[str, Any]], Optional[str]]],
+    workers: Optional[int] = None,
+    manifest=None,
+    tiled: Optional[bool] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    The events of FaceProcessor.iter_scan for paths. Serial scans call
+    scan_file_hashed per file; with workers > 1 files go to scan worker
+    processes holding their own sessions, and scan_file_hashed is unused.
+    """
+    workers = workers or SCAN_WORKERS
+
+    if manifest is not None:
+        all_count = len(paths)
+        paths = [p for p in paths if manifest.needs_scan(p)]
+        logger.info(f"Incremental scan: {len(paths)} new/changed, {all_count - len(paths)} unchanged")
+
+    if workers <= 1 or len(paths) <= 1:
+        per_file = (scan_file_hashed(path, tiled=tiled) for path in paths)
+    else:
+        per_file = _scan_parallel(paths, workers, tiled=tiled)
+
+    total = len(paths)
+    for index, (path, (faces, content_hash)) in enumerate(zip(paths, per_file), start=1):
+        yield {"path": path, "index": index, "total": total, "faces": faces, "content_hash": content_hash}
+
+
+def _scan_parallel(
+    paths: List[str],
+    workers: int,
+    tiled: Optional[bool] = None
+) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """
+    Process-pool scan with a bounded in-flight window.
+
+    Futures are consumed strictly in submission order, which gives
+    deterministic output and caps memory at workers * SCAN_QUEUE_PER_WORKER
+    pending results no matter how large the directory is.
+    """
+    workers = min(workers, os.cpu_count() or 1, len(paths))
+    # Split the host's cores between worker sessions to avoid oversubscription
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    max_pending = workers * SCAN_QUEUE_PER_WORKER
+
+    logger.info(f"Parallel scan: {len(paths)} files, {workers} workers x {threads} threads")
+
+    # spawn (not fork): forking a parent that already owns ONNX Runtime
+    # thread pools can deadlock the children.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_scan_worker,
+        initargs=(threads,)
+    ) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append(pool.submit(_scan_worker_file, path, tiled))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def autotune_profile(profile: Dict[str, Any], runs: int = AUTOTUNE_RUNS) -> Dict[str, Any]:
+    """
+    Benchmark ORT thread settings for a profile on this host and cache the
+    fastest. Each candidate loads its own sessions and times detection on a
+    synthetic det_size frame plus recognition on a small batch of crops, so
+    both models are exercised even though no real face is present.
+    """
+    rng = np.random.default_rng(0)
+    det_w, det_h = profile["det_size"]
+    frame = rng.integers(0, 255, size=(det_h, det_w, 3), dtype=np.uint8)
+    crops = [rng.integers(0, 255, size=(112, 112, 3), dtype=np.uint8) for _ in range(8)]
+
+    timings = {}
+    best = None
+    for intra, inter in thread_candidates():
+        fp = FaceProcessor(
+            profile=profile["name"],
+            intra_op_threads=intra,
+            inter_op_threads=inter,
+            autotune=False,
+            precision=profile["precision"]
+        )
+        det_model = fp.app.det_model
+        rec_model = fp.app.models["recognition"]
+
+        # Warm-up (first run allocates buffers)
+        det_model.detect(frame, max_num=0, metric="default")
+        rec_model.get_feat(crops)
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            det_model.detect(frame, max_num=0, metric="default")
+            rec_model.get_feat(crops)
+        elapsed = (time.perf_counter() - start) / runs
+        del fp
+
+        timings[f"{intra}x{inter}"] = round(elapsed * 1000, 2)
+        logger.info(f"Autotune {profile['name']}: intra={intra} inter={inter} -> {elapsed * 1000:.1f} ms")
+        if best is None or elapsed < best[0]:
+            best = (elapsed, intra, inter)
+
+    result = {
+        "intra_op_threads": best[1],
+        "inter_op_threads": best[2],
+        "timings_ms": timings
+    }
+    save_tuning(profile, result)
+    logger.info(f"Autotune {profile['name']}: selected intra={best[1]} inter={best[2]}")
+    return result
+
+
+# Per-process FaceProcessor used by the scan pool workers
+_worker_processor: Optional[FaceProcessor] = None
+
+def _init_scan_worker(intra_op_threads: int):
+    global _worker_processor
+    _worker_processor = FaceProcessor(profile=SCAN_PROFILE, intra_op_threads=intra_op_threads)
+
+def _scan_worker_file(path: str, tiled: Optional[bool] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    return _worker_processor.scan_file_hashed(path, tiled=tiled)
+
 # =============================================================================
 # LEGACY DEEPFACE IMPLEMENTATION (For Reference)
 # =============================================================================
@@ -0,0 +1,196 @@
+"""
+Processor Pool for Aura Core.
+
+A single FaceProcessor serializes every request on one set of ONNX
+sessions: the inference executor can run jobs on several threads, but they
+all queue on the same FaceAnalysis. Many small selfie requests scale better
+on several replicas with a few intra-op threads each (e.g. 4 x 2 threads)
+than on one replica using all 8 cores.
+
+ProcessorPool holds PROCESSOR_POOL_SIZE FaceProcessor replicas, each with
+PROCESSOR_POOL_THREADS intra-op threads (default: cores / size). Requests
+check a replica out, use it and check it back in; the pool exposes the
+FaceProcessor methods the routes call, so get_processor can return it in
+place of a single processor. Wait time and utilisation are tracked for
+/health.
+
+Replicas cost one model's memory each. INFERENCE_WORKERS should be at least
+PROCESSOR_POOL_SIZE or some replicas will sit idle.
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Replicas (1 = a plain FaceProcessor, no pool)
+PROCESSOR_POOL_SIZE = int(os.getenv("PROCESSOR_POOL_SIZE", 1))
+# Intra-op threads per replica (0 = split the host's cores evenly)
+PROCESSOR_POOL_THREADS = int(os.getenv("PROCESSOR_POOL_THREADS", 0))
+
+
+class PoolTimeout(TimeoutError):
+    """Raised when no replica became free within the checkout timeout."""
+
+
+class ProcessorPool:
+    """
+    Fixed set of FaceProcessor replicas handed out one request at a time.
+
+    checkout() is a context manager yielding an idle replica, blocking until
+    one is free. Replicas are interchangeable: same profile, model and
+    precision, differing only in their ORT sessions.
+    """
+
+    def __init__(self, replicas: List[Any]):
+        if not replicas:
+            raise ValueError("ProcessorPool needs at least one replica")
+        self.replicas = list(replicas)
+        self.model_version = self.replicas[0].model_version
+        self.profile = self.replicas[0].profile
+        self._idle = list(self.replicas)
+        self._cond = threading.Condition()
+        self._created_at = time.monotonic()
+        self._busy_seconds = 0.0
+        self._counters = {"checkouts": 0, "waited": 0, "timeouts": 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @classmethod
+    def create(
+        cls,
+        size: int,
+        threads: int = 0,
+        factory: Optional[Callable[..., Any]] = None,
+        **kwargs
+    ) -> "ProcessorPool":
+        """
+        Build size replicas with threads intra-op threads each (0 = cores /
+        size). factory defaults to FaceProcessor; kwargs go to each call.
+        """
+        if factory is None:
+            from processor import FaceProcessor
+            factory = FaceProcessor
+        threads = threads or max(1, (os.cpu_count() or 1) // size)
+        logger.info(f"Creating processor pool: {size} replicas x {threads} threads")
+        return cls([factory(intra_op_threads=threads, **kwargs) for _ in range(size)])
+
+    @property
+    def size(self) -> int:
+        return len(self.replicas)
+
+    @property
+    def load_timings(self) -> Dict[str, Any]:
+        """Per-phase load times summed over replicas (see FaceProcessor.load_timings)."""
+        totals: Dict[str, Any] = {}
+        for replica in self.replicas:
+            timings = getattr(replica, "load_timings", None)
+            if not isinstance(timings, dict):
+                continue
+            for key, value in timings.items():
+                if isinstance(value, bool):
+                    totals[key] = value
+                else:
+                    totals[key] = round(totals.get(key, 0) + value, 1)
+        return totals
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Borrow an idle replica for the duration of the with-block."""
+        start = time.monotonic()
+        with self._cond:
+            if not self._idle:
+                self._counters["waited"] += 1
+                if not self._cond.wait_for(lambda: self._idle, timeout):
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeout(f"No free processor replica within {timeout:.1f}s")
+            replica = self._idle.pop()
+            waited = time.monotonic() - start
+            self._counters["checkouts"] += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        acquired = time.monotonic()
+        try:
+            yield replica
+        finally:
+            with self._cond:
+                self._busy_seconds += time.monotonic() - acquired
+                self._idle.append(replica)
+                self._cond.notify()
+
+    # FaceProcessor interface, one replica per call
+
+    def warm_up(self) -> float:
+        """Warm up every replica; returns the slowest warm-up in ms."""
+        return max(replica.warm_up() for replica in self.replicas)
+
+    def close(self) -> None:
+        """Close every replica (see FaceProcessor.close)."""
+        for replica in self.replicas:
+            replica.close()
+
+    def get_embedding(self, img_path: str):
+        with self.checkout() as fp:
+            return fp.get_embedding(img_path)
+
+    def get_embedding_from_image(self, img):
+        with self.checkout() as fp:
+            return fp.get_embedding_from_image(img)
+
+    def get_embeddings_batch(self, images, tiled: bool = False):
+        with self.checkout() as fp:
+            return fp.get_embeddings_batch(images, tiled=tiled)
+
+    def list_images(self, directory_path: str) -> List[str]:
+        return self.replicas[0].list_images(directory_path)
+
+    def scan_file(self, full_path: str, tiled: Optional[bool] = None):
+        with self.checkout() as fp:
+            return fp.scan_file(full_path, tiled=tiled)
+
+    def scan_file_hashed(self, full_path: str, tiled: Optional[bool] = None):
+        with self.checkout() as fp:
+            return fp.scan_file_hashed(full_path, tiled=tiled)
+
+    def iter_scan(self, directory_path: str, workers: Optional[int] = None, manifest=None, tiled: Optional[bool] = None):
+        # Serial scans borrow a replica per file, so a long or abandoned scan
+        # never keeps one from searches; parallel scans (workers > 1) run in
+        # their own process pool and take none
+        from processor import iter_scan_paths
+        yield from iter_scan_paths(
+            self.list_images(directory_path), self.scan_file_hashed,
+            workers=workers, manifest=manifest, tiled=tiled
+        )
+
+    def scan_directory(self, directory_path: str, workers: Optional[int] = None, tiled: Optional[bool] = None):
+        with self.checkout() as fp:
+            return fp.scan_directory(directory_path, workers=workers, tiled=tiled)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            checkouts = self._counters["checkouts"]
+            busy = self.size - len(self._idle)
+            elapsed = max(time.monotonic() - self._created_at, 1e-9)
+            return {
+                **self._counters,
+                "size": self.size,
+                "busy": busy,
+                "mean_wait_ms": round(self._wait_total / checkouts * 1000, 2) if checkouts else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 2),
+                "utilisation": round(min(1.0, self._busy_seconds / (elapsed * self.size)), 4),
+            }
+
+
+def create_processor(**kwargs):
+    """
+    The model object get_processor serves: a ProcessorPool when
+    PROCESSOR_POOL_SIZE > 1, otherwise a single FaceProcessor.
+    """
+    if PROCESSOR_POOL_SIZE > 1:
+        return ProcessorPool.create(PROCESSOR_POOL_SIZE, PROCESSOR_POOL_THREADS, **kwargs)
+    from processor import FaceProcessor
+    return FaceProcessor(**kwargs)
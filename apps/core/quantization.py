@@ -0,0 +1,391 @@
+"""
+INT8 Quantization for Aura Core.
+
+Builds an INT8 copy of a model pack's detection and recognition models
+(e.g. buffalo_l -> buffalo_l_int8 under ~/.insightface/models) and compares
+it against FP32 on a local image set before it is switched on with
+INFERENCE_PRECISION=int8.
+
+Two modes:
+- dynamic: weights only, no calibration data. Quick to build, but conv
+  layers gain little on CPU.
+- static:  weights and activations (QDQ format), calibrated on real photos.
+  This is the mode that actually speeds up the conv-heavy face models.
+
+Usage:
+    python quantization.py quantize --mode static --calibration-dir ./photos
+    python quantization.py compare ./photos --threshold 0.6
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+import cv2
+
+from imaging import load_image, list_image_files
+from inference_profiles import get_profile, model_pack_name
+
+logger = logging.getLogger(__name__)
+
+INSIGHTFACE_ROOT = os.path.expanduser(os.getenv("INSIGHTFACE_ROOT", "~/.insightface"))
+
+# Same default as /api/match-mine
+MATCH_THRESHOLD = float(os.getenv("MATCH_THRESHOLD", 0.6))
+
+# Calibration images used for static quantization (more is slower, not better)
+CALIBRATION_LIMIT = int(os.getenv("QUANT_CALIBRATION_LIMIT", 100))
+
+# Images are decoded at the scan resolution for calibration and comparison
+QUANT_MAX_DIM = int(os.getenv("SCAN_MAX_DIM", 2048))
+
+# Detections with IoU above this are treated as the same face
+DET_MATCH_IOU = 0.5
+
+
+def detector_blob(img: np.ndarray, det_model, input_size) -> np.ndarray:
+    """
+    Letterbox a frame into the detector input the way SCRFD.detect() does,
+    and return the normalised NCHW blob.
+    """
+    width, height = input_size
+    im_ratio = img.shape[0] / img.shape[1]
+    if im_ratio > height / width:
+        new_height, new_width = height, int(height / im_ratio)
+    else:
+        new_width, new_height = width, int(width * im_ratio)
+    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    canvas[:new_height, :new_width, :] = cv2.resize(img, (new_width, new_height))
+    return cv2.dnn.blobFromImage(
+        canvas, 1.0 / det_model.input_std, (width, height),
+        (det_model.input_mean,) * 3, swapRB=True
+    )
+
+
+def recognition_blob(crops: List[np.ndarray], rec_model) -> np.ndarray:
+    """Normalised NCHW blob for aligned face crops, as ArcFaceONNX.get_feat() builds it."""
+    return cv2.dnn.blobFromImages(
+        crops, 1.0 / rec_model.input_std, rec_model.input_size,
+        (rec_model.input_mean,) * 3, swapRB=True
+    )
+
+
+def _aligned_crops(img: np.ndarray, det_model, crop_size: int):
+    """Detect faces and return (bboxes, aligned crops)."""
+    from insightface.utils import face_align
+
+    bboxes, kpss = det_model.detect(img, max_num=0, metric="default")
+    if bboxes is None or bboxes.shape[0] == 0 or kpss is None:
+        return np.zeros((0, 5), dtype=np.float32), []
+    crops = [face_align.norm_crop(img, landmark=k, image_size=crop_size) for k in kpss]
+    return bboxes, crops
+
+
+class _BlobReader:
+    """onnxruntime CalibrationDataReader over precomputed input blobs."""
+
+    def __init__(self, input_name: str, blobs: List[np.ndarray]):
+        self.input_name = input_name
+        self._blobs = iter(blobs)
+
+    def get_next(self):
+        blob = next(self._blobs, None)
+        return None if blob is None else {self.input_name: blob}
+
+
+def build_calibration_sets(processor, image_paths: List[str]) -> Dict[str, List[np.ndarray]]:
+    """
+    Detector and recognition calibration inputs from real photos: letterboxed
+    frames for detection, and the FP32 detector's aligned crops for
+    recognition (one blob per crop, since the graph's batch axis may be fixed).
+    """
+    det_model = processor.app.det_model
+    rec_model = processor.app.models["recognition"]
+    det_size = tuple(processor.profile["det_size"])
+
+    det_blobs, rec_blobs = [], []
+    for path in image_paths:
+        img = load_image(path, QUANT_MAX_DIM)
+        if img is None:
+            continue
+        det_blobs.append(detector_blob(img, det_model, det_size))
+        _, crops = _aligned_crops(img, det_model, rec_model.input_size[0])
+        rec_blobs.extend(recognition_blob([crop], rec_model) for crop in crops)
+
+    return {"detection": det_blobs, "recognition": rec_blobs}
+
+
+def quantize_model_pack(
+    profile: Optional[str] = None,
+    mode: str = "dynamic",
+    calibration_dir: Optional[str] = None,
+    output_root: Optional[str] = None
+) -> str:
+    """
+    Write INT8 copies of the profile's detection and recognition models to
+    <root>/models/<pack>_int8 and return that directory.
+
+    mode="static" requires calibration_dir (a folder of representative
+    photos); mode="dynamic" needs no data.
+    """
+    from onnxruntime.quantization import (
+        QuantType, QuantFormat, CalibrationMethod, quantize_dynamic, quantize_static
+    )
+    from processor import FaceProcessor
+
+    if mode not in ("dynamic", "static"):
+        raise ValueError(f"Unknown quantization mode '{mode}'")
+    if mode == "static" and not calibration_dir:
+        raise ValueError("Static quantization needs a calibration_dir")
+
+    fp32 = FaceProcessor(profile=profile, precision="fp32", autotune=False)
+    models = {
+        "detection": fp32.app.det_model,
+        "recognition": fp32.app.models["recognition"],
+    }
+
+    int8_profile = dict(fp32.profile, precision="int8")
+    out_dir = os.path.join(output_root or INSIGHTFACE_ROOT, "models", model_pack_name(int8_profile))
+    os.makedirs(out_dir, exist_ok=True)
+
+    calibration = None
+    if mode == "static":
+        paths = list_image_files(calibration_dir, CALIBRATION_LIMIT)
+        calibration = build_calibration_sets(fp32, paths)
+        logger.info(
+            f"Calibrating on {len(calibration['detection'])} frames / "
+            f"{len(calibration['recognition'])} faces from {calibration_dir}"
+        )
+
+    for task, model in models.items():
+        src = model.model_file
+        dst = os.path.join(out_dir, os.path.basename(src))
+        start = time.time()
+
+        if mode == "dynamic":
+            quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+        else:
+            blobs = calibration[task]
+            if not blobs:
+                raise ValueError(f"No {task} calibration samples found in {calibration_dir}")
+            quantize_static(
+                src, dst, _BlobReader(model.input_name, blobs),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+                calibrate_method=CalibrationMethod.MinMax
+            )
+
+        logger.info(
+            f"Quantized {task} model {os.path.basename(src)} ({mode}) in {time.time() - start:.1f}s: "
+            f"{os.path.getsize(src) / 1e6:.1f} MB -> {os.path.getsize(dst) / 1e6:.1f} MB"
+        )
+
+    # Keep the pack self-contained; other modules are loaded as-is.
+    src_dir = os.path.dirname(models["recognition"].model_file)
+    for name in os.listdir(src_dir):
+        dst = os.path.join(out_dir, name)
+        if name.endswith(".onnx") and not os.path.exists(dst):
+            shutil.copy2(os.path.join(src_dir, name), dst)
+
+    return out_dir
+
+
+def _iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-12)
+
+
+def detection_recall(reference: np.ndarray, candidate: np.ndarray, iou: float = DET_MATCH_IOU) -> int:
+    """Number of reference boxes that have a candidate box with IoU >= iou."""
+    if len(reference) == 0 or len(candidate) == 0:
+        return 0
+    return int(sum(_iou(box, candidate).max() >= iou for box in reference))
+
+
+def match_set_overlap(reference: np.ndarray, candidate: np.ndarray, threshold: float) -> Dict[str, float]:
+    """
+    Compare who-matches-whom under two embedding sets of the same faces.
+
+    For every face, the set of other faces with cosine similarity >=
+    threshold is computed under both; returns the mean Jaccard overlap of
+    those sets and the fraction of face pairs whose match decision flipped.
+    """
+    n = len(reference)
+    if n < 2:
+        return {"mean_jaccard": 1.0, "flipped_pairs": 0.0}
+
+    off_diag = ~np.eye(n, dtype=bool)
+    ref_match = (reference @ reference.T >= threshold) & off_diag
+    cand_match = (candidate @ candidate.T >= threshold) & off_diag
+
+    union = (ref_match | cand_match).sum(axis=1)
+    inter = (ref_match & cand_match).sum(axis=1)
+    jaccard = np.where(union > 0, inter / np.maximum(union, 1), 1.0)
+
+    flipped = (ref_match != cand_match).sum() / 2
+    return {
+        "mean_jaccard": float(jaccard.mean()),
+        "flipped_pairs": float(flipped / (n * (n - 1) / 2))
+    }
+
+
+def _normalize(feats: np.ndarray) -> np.ndarray:
+    feats = np.asarray(feats, dtype=np.float32)
+    return feats / np.maximum(np.linalg.norm(feats, axis=1, keepdims=True), 1e-12)
+
+
+def _timed(timings: Dict[str, List[float]], stage: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    timings[stage].append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def compare_precisions(
+    image_paths: List[str],
+    reference,
+    candidate,
+    threshold: float = MATCH_THRESHOLD
+) -> Dict[str, Any]:
+    """
+    Run two FaceProcessors (normally FP32 and INT8) over the same images.
+
+    Recognition is compared on identical aligned crops from the reference
+    detector, so embedding drift isn't confused with detection differences;
+    detector agreement is reported separately as recall at IoU 0.5.
+    """
+    from insightface.utils import face_align
+
+    stages = ("decode", "detect", "align", "recognize")
+    timings = {
+        name: {stage: [] for stage in stages} for name in ("reference", "candidate")
+    }
+    ref_feats, cand_feats = [], []
+    ref_faces = det_matched = cand_faces = 0
+
+    ref_rec = reference.app.models["recognition"]
+    cand_rec = candidate.app.models["recognition"]
+    crop_size = ref_rec.input_size[0]
+
+    for path in image_paths:
+        start = time.perf_counter()
+        img = load_image(path, QUANT_MAX_DIM)
+        decode_ms = (time.perf_counter() - start) * 1000
+        if img is None:
+            logger.warning(f"Skipping unreadable image {path}")
+            continue
+        for name in timings:
+            timings[name]["decode"].append(decode_ms)
+
+        ref_boxes, ref_kpss = _timed(
+            timings["reference"], "detect",
+            lambda: reference.app.det_model.detect(img, max_num=0, metric="default")
+        )
+        cand_boxes, cand_kpss = _timed(
+            timings["candidate"], "detect",
+            lambda: candidate.app.det_model.detect(img, max_num=0, metric="default")
+        )
+        if cand_boxes is not None:
+            cand_faces += len(cand_boxes)
+        if ref_boxes is None or len(ref_boxes) == 0 or ref_kpss is None:
+            continue
+
+        ref_faces += len(ref_boxes)
+        if cand_boxes is not None:
+            det_matched += detection_recall(ref_boxes[:, :4], cand_boxes[:, :4])
+
+        crops = _timed(
+            timings["reference"], "align",
+            lambda: [face_align.norm_crop(img, landmark=k, image_size=crop_size) for k in ref_kpss]
+        )
+        if cand_kpss is not None and len(cand_kpss):
+            _timed(
+                timings["candidate"], "align",
+                lambda: [face_align.norm_crop(img, landmark=k, image_size=crop_size) for k in cand_kpss]
+            )
+
+        ref_feats.extend(_timed(timings["reference"], "recognize", lambda: ref_rec.get_feat(crops)))
+        cand_feats.extend(_timed(timings["candidate"], "recognize", lambda: cand_rec.get_feat(crops)))
+
+    report: Dict[str, Any] = {
+        "images": len(image_paths),
+        "faces": ref_faces,
+        "candidate_faces": cand_faces,
+        "detection_recall": det_matched / ref_faces if ref_faces else None,
+        "threshold": threshold,
+        "latency_ms": {
+            name: {
+                stage: {
+                    "mean": float(np.mean(values)) if values else None,
+                    "p95": float(np.percentile(values, 95)) if values else None,
+                }
+                for stage, values in stage_timings.items()
+            }
+            for name, stage_timings in timings.items()
+        },
+    }
+
+    if ref_feats:
+        ref_emb = _normalize(ref_feats)
+        cand_emb = _normalize(cand_feats)
+        cosine = np.sum(ref_emb * cand_emb, axis=1)
+        report["cosine"] = {
+            "mean": float(cosine.mean()),
+            "min": float(cosine.min()),
+            "p05": float(np.percentile(cosine, 5)),
+        }
+        report["match_overlap"] = match_set_overlap(ref_emb, cand_emb, threshold)
+
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build and validate INT8 face models")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    q = sub.add_parser("quantize", help="Write an INT8 copy of a model pack")
+    q.add_argument("--profile", default=None, help="Inference profile (default: INFERENCE_PROFILE)")
+    q.add_argument("--mode", choices=("dynamic", "static"), default="static")
+    q.add_argument("--calibration-dir", help="Representative photos for static mode")
+    q.add_argument("--output-root", default=None, help=f"InsightFace root (default: {INSIGHTFACE_ROOT})")
+
+    c = sub.add_parser("compare", help="Compare INT8 against FP32 on a folder of photos")
+    c.add_argument("image_dir")
+    c.add_argument("--profile", default=None)
+    c.add_argument("--threshold", type=float, default=MATCH_THRESHOLD)
+    c.add_argument("--limit", type=int, default=None)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "quantize":
+        out_dir = quantize_model_pack(args.profile, args.mode, args.calibration_dir, args.output_root)
+        print(f"INT8 models written to {out_dir}")
+        return 0
+
+    from processor import FaceProcessor
+
+    profile = get_profile(args.profile)["name"]
+    reference = FaceProcessor(profile=profile, precision="fp32", autotune=False)
+    candidate = FaceProcessor(profile=profile, precision="int8", autotune=False)
+    paths = list_image_files(args.image_dir, args.limit)
+    report = compare_precisions(paths, reference, candidate, args.threshold)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Optional
 import os
+import asyncio
 import logging
 import tempfile
 import shutil
-import qrcode
 from io import BytesIO
 
 from dependencies import get_auth_context
@@ -12,7 +12,7 @@ from schemas import (
     DBStatsResponse, FolderResponse, FolderItem,
     BundleRequest, BundleResponse, InviteRequest
 )
-from database_supabase import get_client, log_usage, get_signed_url, get_stats
+from database_supabase import get_client, log_usage
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -20,7 +20,8 @@ logger = logging.getLogger(__name__)
 @router.get("/api/db/stats", response_model=DBStatsResponse)
 async def db_stats():
     """Get database statistics."""
-    stats = get_stats()
+    from database_supabase_async import get_stats
+    stats = await get_stats()
     return DBStatsResponse(**stats)
 
 @router.get("/api/admin/folders", response_model=FolderResponse)
@@ -117,9 +118,11 @@ async def get_bundle(bundle_id: str):
             photos_result = client.table("photos").select("id, path, photo_date, metadata").in_("id", photo_ids).execute()
             photos = photos_result.data or []
             
-            # 3. Generate signed URLs
-            for p in photos:
-                p["url"] = get_signed_url(p["path"])
+            # 3. Generate signed URLs, all requests in flight at once
+            from database_supabase_async import get_signed_url
+            urls = await asyncio.gather(*(get_signed_url(p["path"]) for p in photos))
+            for p, url in zip(photos, urls):
+                p["url"] = url
         else:
             photos = []
             
@@ -139,6 +142,8 @@ async def get_bundle(bundle_id: str):
 
 @router.get("/api/qr")
 async def generate_qr(url: str):
+    # qrcode (and PIL) load on first use or via background preimport
+    import qrcode
     img = qrcode.make(url)
     buf = BytesIO()
     img.save(buf, format="PNG")
@@ -1,11 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import jwt
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-import shutil
 import os
-import tempfile
 import logging
 
 from dependencies import get_auth_context, JWT_SECRET, ADMIN_PIN, get_processor
@@ -211,34 +210,33 @@ async def face_login(file: UploadFile = File(...)):
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Invalid file type")
 
-    # Save to temp
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
-
+    from imaging import ImageTooLarge, InvalidImage
+    from micro_batcher import embed_upload, read_upload
+    # Kiosk retries re-send the same frame; served from the embedding cache
     try:
-        fp = get_processor()
-        embedding = fp.get_embedding(tmp_path)
-        
-        if not embedding:
-             return {"success": False, "error": "No face detected"}
-
-        from database_supabase import search_similar
-        # Strict threshold for login
-        matches = search_similar(embedding, threshold=0.75, limit=1)
-        
-        if matches:
-            # Match found! Issue token.
-            token = jwt.encode({
-                "role": "user",
-                "face_id": matches[0]["id"],
-                "exp": datetime.now(timezone.utc) + timedelta(hours=24)
-            }, JWT_SECRET, algorithm="HS256")
-            
-            return {"success": True, "token": token, "match": matches[0]}
-        
-        return {"success": False, "error": "Face not recognized"}
+        contents = await read_upload(file)
+        fp = await run_in_threadpool(get_processor)
+        embedding = await embed_upload(fp, contents)
+    except ImageTooLarge as e:
+        return {"success": False, "error": str(e)}
+    except InvalidImage:
+        return {"success": False, "error": "Invalid image file"}
+    
+    if not embedding:
+         return {"success": False, "error": "No face detected"}
 
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+    from database_supabase_async import search_similar
+    # Strict threshold for login
+    matches = await search_similar(embedding, threshold=0.75, limit=1)
+    
+    if matches:
+        # Match found! Issue token.
+        token = jwt.encode({
+            "role": "user",
+            "face_id": matches[0]["id"],
+            "exp": datetime.now(timezone.utc) + timedelta(hours=24)
+        }, JWT_SECRET, algorithm="HS256")
+        
+        return {"success": True, "token": token, "match": matches[0]}
+    
+    return {"success": False, "error": "Face not recognized"}
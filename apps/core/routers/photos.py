@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Form, Response
-from fastapi.responses import FileResponse
-from typing import Optional, List
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import AsyncIterator, Dict, Iterator, Optional, List
+from contextlib import closing
 import os
-import tempfile
-import shutil
+import anyio
+import asyncio
 import logging
 import json
 import time
@@ -15,6 +17,7 @@ from datetime import datetime
 # We will use top-level for standard libs and get_processor for the heavy model.
 
 from dependencies import get_auth_context, get_processor
+from scan_manifest import ScanManifest
 from schemas import (
     MatchResponse, EmbeddingResponse, ScanDirectoryResponse, ScanResult,
     SearchResponse, SearchMatch
@@ -23,6 +26,127 @@ from schemas import (
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Face records buffered by /api/scan/stream before each Supabase insert
+SCAN_PERSIST_CHUNK = int(os.getenv("SCAN_PERSIST_CHUNK", 200))
+
+# Max thumbnails per /api/index-photos request
+INDEX_BATCH_MAX = int(os.getenv("INDEX_BATCH_MAX", 64))
+
+def _face_records(path: str, faces: List[dict], meta: dict, org_id: Optional[str], size_bytes: int) -> List[dict]:
+    """
+    One photos row per detected face (largest first). The file's bytes are
+    counted on face 0 only, so summing size_bytes doesn't multiply storage.
+    Without faces, a single {"path", "org_id"} record clears the path's
+    rows (see database_supabase.upsert_photo_faces).
+    """
+    if not faces:
+        return [{"path": path, "org_id": org_id} if org_id else {"path": path}]
+    photo_date = meta.get("created_at") or datetime.now().isoformat()
+    records = []
+    for face_index, face in enumerate(faces):
+        record = {
+            "path": path,
+            "embedding": face["embedding"],
+            "photo_date": photo_date,
+            "metadata": meta,
+            "face_index": face_index,
+            "bbox": [round(v, 1) for v in face["bbox"]],
+            "det_score": round(face["score"], 4),
+            "size_bytes": size_bytes if face_index == 0 else 0,
+        }
+        if org_id:
+            record["org_id"] = org_id
+        records.append(record)
+    return records
+
+
+def _scan_records(path: str, faces: List[dict], org_id: Optional[str]) -> List[dict]:
+    """
+    photos rows for one scanned file, keyed by face_index (detection order)
+    so re-scans upsert the same rows. Bytes are counted on face 0 only; a
+    faceless file gets one record without embedding, clearing its rows.
+    """
+    if not faces:
+        return [{"path": path, "org_id": org_id}]
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    return [
+        {
+            "path": face["path"],
+            "embedding": face["embedding"],
+            "photo_date": face.get("photo_date"),
+            "metadata": {"source": "scan"},
+            "org_id": org_id,
+            "face_index": face_index,
+            "size_bytes": size if face_index == 0 else 0
+        }
+        for face_index, face in enumerate(faces)
+    ]
+
+
+def _persisted(report: dict, records: List[dict], hashes: Dict[str, Optional[str]]):
+    """
+    From an upsert_embeddings report over _scan_records output: bytes of the
+    files that were stored, and those files as manifest entries
+    (path, face_count, content_hash from hashes) in record order. Chunks
+    never split a file, so a file is either stored or not.
+    """
+    failed = set()
+    for c in report["chunks"]:
+        if c["error"]:
+            failed.update(range(c["start"], c["start"] + c["rows"]))
+    stored_bytes, done = 0, []
+    for i, record in enumerate(records):
+        if i in failed:
+            continue
+        path = record["path"]
+        if not done or done[-1][0] != path:
+            done.append((path, 0, hashes.get(path)))
+        if "embedding" in record:
+            done[-1] = (path, done[-1][1] + 1, done[-1][2])
+        stored_bytes += record.get("size_bytes") or 0
+    return stored_bytes, done
+
+
+def _within_quota(org_id: Optional[str], records: List[dict]):
+    """
+    How many of records (whole write chunks, in order) fit org_id's storage
+    quota, and the quota error that stopped the rest (None if all fit).
+    Chunks are checked as if each earlier one had landed, without waiting
+    for the writes.
+    """
+    from bulk_writer import chunk_records
+    from storage_ledger import StorageQuotaExceeded, check_quota
+
+    allowed, incoming = 0, 0
+    for chunk in chunk_records(records):
+        incoming += sum(r.get("size_bytes") or 0 for r in chunk)
+        try:
+            check_quota(org_id, incoming)
+        except StorageQuotaExceeded as e:
+            return allowed, str(e)
+        allowed += len(chunk)
+    return allowed, None
+
+
+async def _closing_stream(events: Iterator[str]) -> AsyncIterator[str]:
+    """
+    Stream a sync generator from the threadpool and close it once the
+    response ends, including when the client disconnects mid-scan (Starlette
+    would otherwise leave it open until garbage collection).
+    """
+    try:
+        async for line in iterate_in_threadpool(events):
+            yield line
+    finally:
+        # Closing runs the generator's cleanup, which can wait on scan
+        # workers: keep it off the event loop and finish it even if cancelled
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(events.close)
+
+
 @router.post("/api/match/mine", response_model=MatchResponse)
 async def match_mine(
     user_id: str = Query(..., description="The Supabase Auth User ID"),
@@ -32,18 +156,18 @@ async def match_mine(
     Triggers face matching for the current user against all indexed photos.
     This is usually called post-registration or post-face-login.
     """
-    from database_supabase import get_user_embedding, search_similar, add_photo_matches
+    from database_supabase_async import get_user_embedding, search_similar, add_photo_matches
     
     try:
         # 1. Get user embedding
-        embedding = get_user_embedding(user_id)
+        embedding = await get_user_embedding(user_id)
         if not embedding:
             return MatchResponse(success=False, error="User embedding not found. Please scan face first.")
 
         # 2. Search for similar faces (Scoped to Org)
         # Threshold can be overridden by env var
         threshold = float(os.getenv("MATCH_THRESHOLD", 0.6))
-        matches = search_similar(embedding, threshold=threshold, limit=500, org_id=auth.get("org_id"))
+        matches = await search_similar(embedding, threshold=threshold, limit=500, org_id=auth.get("org_id"))
         
         if not matches:
             return MatchResponse(success=True, count=0)
@@ -59,7 +183,7 @@ async def match_mine(
         ]
         
         # 4. Batch insert/upsert matches
-        stored_count = add_photo_matches(match_records)
+        stored_count = await add_photo_matches(match_records)
         
         return MatchResponse(success=True, count=stored_count)
 
@@ -76,14 +200,14 @@ async def embed_face(file: UploadFile = File(...)):
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    # Save to temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename or ".png")[1]) as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
-    
     try:
-        fp = get_processor()
-        embedding = fp.get_embedding(tmp_path)
+        # Inference modules (numpy/cv2) load on first use or via preimport
+        from imaging import ImageTooLarge
+        from micro_batcher import embed_upload, read_upload
+        contents = await read_upload(file)
+        fp = await run_in_threadpool(get_processor)
+        # Cached by content hash, micro-batched with concurrent uploads
+        embedding = await embed_upload(fp, contents)
         
         if embedding is None:
             return EmbeddingResponse(
@@ -97,16 +221,16 @@ async def embed_face(file: UploadFile = File(...)):
             dimensions=len(embedding)
         )
     
+    except HTTPException:
+        raise
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing image: {e}")
         return EmbeddingResponse(
             success=False,
             error=str(e)
         )
-    finally:
-        # Cleanup temp file
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
 
 
 @router.post("/api/index-photo")
@@ -119,10 +243,10 @@ async def index_photo(
     """
     Index a photo that was uploaded to Supabase Storage by the client.
     The client sends a Thumbnail (small file) + the Storage Path of the Full Res.
+
+    Every face in the photo is stored (one row each, with face_index, bbox
+    and det_score) in a single multi-row insert.
     """
-    import numpy as np
-    import cv2
-    
     try:
         meta_dict = json.loads(metadata)
     except:
@@ -130,77 +254,224 @@ async def index_photo(
 
     start = time.time()
     
-    # 1. Read the thumbnail directly from memory
-    contents = await file.read()
-    
     try:
-        # 2. Decode image for embedding (OpenCV)
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            raise HTTPException(status_code=400, detail="Invalid image file")
+        from imaging import ImageTooLarge, InvalidImage
+        from micro_batcher import embed_upload_faces, read_upload
+
+        from storage_ledger import StorageQuotaExceeded, check_quota_async
 
-        # 3. Get Embedding (FaceProcessor)
-        fp = get_processor()
-        embedding = fp.get_embedding_from_image(img)
+        # 1. Read the thumbnail directly from memory
+        try:
+            contents = await read_upload(file)
+        except ImageTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+        # Quota check against the cached per-org view (no DB round trip)
+        try:
+            await check_quota_async(auth.get("org_id"), len(contents))
+        except StorageQuotaExceeded as e:
+            raise HTTPException(status_code=403, detail=str(e))
+
+        # 2-3. Decode (reduced-resolution JPEG) + embed every face,
+        # micro-batched with concurrent uploads
+        fp = await run_in_threadpool(get_processor)
+        try:
+            faces = await embed_upload_faces(fp, contents)
+        except ImageTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except InvalidImage:
+            raise HTTPException(status_code=400, detail="Invalid image file")
         
-        if embedding:
-            # 4. Store in DB
-            # We store the 'path' provided by client (which points to Full Res in Supabase)
-            # Use 'created_at' from metadata or default to now
-            photo_date = meta_dict.get("created_at") or datetime.now().isoformat()
-            
-            # We need to use store_embedding from database_supabase
-            from database_supabase import store_embedding, log_usage
-            
-            # Get file size if possible (streaming file to temp might be needed for real size)
-            # For now use content length or actual read bytes
-            file_size = len(contents)
-            
-            record_id = store_embedding(
-                source_path=path, # Points to Full Res location
-                embedding=embedding,
-                photo_date=photo_date,
-                metadata=meta_dict,
-                org_id=auth.get("org_id"),
-                size_bytes=file_size
-            )
+        # 4. Store in DB: one row per face, one transaction that also drops
+        # faces the path no longer has (all of them if none were found).
+        # We store the 'path' provided by client (which points to Full Res in Supabase)
+        from database_supabase_async import upsert_photo_faces, update_storage_stats, log_usage
+
+        org_id = auth.get("org_id")
+        file_size = len(contents)
+        records = _face_records(path, faces, meta_dict, org_id, file_size)
+        try:
+            written = await upsert_photo_faces(records)
+        except Exception as e:
+            logger.error(f"Failed to store embeddings for {path}: {e}")
+            raise HTTPException(status_code=500, detail="Failed to store embeddings")
+
+        # Re-indexing a path only charges the difference in its size
+        if org_id and written["bytes_added"]:
+            await update_storage_stats(org_id, written["bytes_added"])
+
+        if faces:
+            ids = written["ids"]
             
-            # Log usage for SuperAdmin dashboard
-            if auth.get("org_id"):
-                log_usage(
-                    org_id=auth["org_id"],
+            # Usage log for SuperAdmin dashboard
+            if org_id:
+                await log_usage(
+                    org_id=org_id,
                     user_id=auth.get("user_id"),
                     action="upload",
                     bytes_processed=file_size,
-                    metadata={"path": path}
+                    metadata={"path": path, "faces": len(faces)}
                 )
             
             duration = time.time() - start
             return {
                 "status": "indexed",
-                "id": record_id,
+                "id": ids[0],
+                "ids": ids,
                 "duration": duration,
-                "faces_found": 1
+                "faces_found": len(faces)
             }
         else:
             # No face detected
             return {"status": "skipped", "reason": "no_face_detected"}
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error indexing photo: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/api/index-photos")
+async def index_photos(
+    files: List[UploadFile] = File(...),
+    paths: List[str] = Form(...),
+    metadata: str = Form("[]"),  # JSON: list aligned with files, or one object for all
+    auth: dict = Depends(get_auth_context)
+):
+    """
+    Bulk form of /api/index-photo for the sync agent: many thumbnails (with
+    the storage paths of their full-res originals) per request.
+
+    All thumbnails go through one batched inference call, every face found
+    is written with one bulk upsert (see /api/index-photo), and storage and
+    usage are recorded once per batch. Returns a result per item, in upload
+    order.
+    """
+    if len(files) != len(paths):
+        raise HTTPException(status_code=400, detail="files and paths must have the same length")
+    if len(files) > INDEX_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {INDEX_BATCH_MAX} photos per request")
+    try:
+        meta = json.loads(metadata)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="metadata must be JSON")
+    if meta == []:
+        meta = {}  # default: no metadata for any file
+    metas = meta if isinstance(meta, list) else [meta] * len(files)
+    if len(metas) != len(files) or not all(isinstance(m, dict) for m in metas):
+        raise HTTPException(status_code=400, detail="metadata must be an object or a list of objects, one per file")
+
+    start = time.time()
+    try:
+        from imaging import InvalidImage, check_upload
+        from inference_executor import run_inference
+        from micro_batcher import embed_faces_batch, read_upload
+
+        results: List[dict] = [{"path": p} for p in paths]
+        blobs, pending = [], []  # valid thumbnails and their indices
+        for i, file in enumerate(files):
+            try:
+                data = await read_upload(file)
+                check_upload(data)
+            except InvalidImage as e:
+                results[i].update(status="error", error=str(e))
+                continue
+            blobs.append(data)
+            pending.append(i)
+
+        org_id = auth.get("org_id")
+        from storage_ledger import StorageQuotaExceeded, check_quota_async
+        try:
+            await check_quota_async(org_id, sum(len(data) for data in blobs))
+        except StorageQuotaExceeded as e:
+            raise HTTPException(status_code=403, detail=str(e))
+
+        if blobs:
+            fp = await run_in_threadpool(get_processor)
+            per_image = await run_inference(embed_faces_batch, fp, blobs)
+        else:
+            per_image = []
+
+        records, record_items = [], []  # photos rows and the item each belongs to
+        for i, data, faces in zip(pending, blobs, per_image):
+            if isinstance(faces, InvalidImage):
+                results[i].update(status="error", error=str(faces))
+                continue
+            if not faces:
+                results[i].update(status="skipped", reason="no_face_detected")
+            # Faceless items still send one record, clearing stale faces
+            for record in _face_records(paths[i], faces, metas[i], org_id, len(data)):
+                records.append(record)
+                record_items.append(i)
+
+        if records:
+            from database_supabase_async import upsert_photo_faces, update_storage_stats, log_usage
+
+            try:
+                written = await upsert_photo_faces(records)
+            except Exception as e:
+                logger.error(f"Failed to store {len(records)} embeddings: {e}")
+                written = None
+                for i in set(record_items):
+                    results[i].update(status="error", error="Failed to store embeddings")
+
+            indexed_bytes = 0
+            if written is not None:
+                for i, record, record_id in zip(record_items, records, written["ids"]):
+                    if record_id is None:
+                        continue  # faceless item
+                    results[i]["status"] = "indexed"
+                    results[i].setdefault("ids", []).append(record_id)
+                    results[i]["id"] = results[i]["ids"][0]
+                    results[i]["faces_found"] = len(results[i]["ids"])
+                    indexed_bytes += record["size_bytes"]
+
+            if org_id and written is not None:
+                # Re-indexed paths only charge the difference in their size
+                if written["bytes_added"]:
+                    await update_storage_stats(org_id, written["bytes_added"])
+                if indexed_bytes > 0:
+                    await log_usage(
+                        org_id=org_id,
+                        user_id=auth.get("user_id"),
+                        action="upload",
+                        bytes_processed=indexed_bytes,
+                        metadata={"count": sum(r.get("status") == "indexed" for r in results), "batch": True}
+                    )
+
+        return {
+            "indexed": sum(r.get("status") == "indexed" for r in results),
+            "skipped": sum(r.get("status") == "skipped" for r in results),
+            "failed": sum(r.get("status") == "error" for r in results),
+            "duration": time.time() - start,
+            "results": results
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk indexing photos: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/api/scan", response_model=ScanDirectoryResponse)
 async def scan_directory(
     directory_path: str,
     persist: bool = Query(default=True, description="Store results in Supabase"),
+    workers: Optional[int] = Query(default=None, ge=1, le=64, description="Scan worker processes (default: SCAN_WORKERS)"),
+    incremental: bool = Query(default=True, description="Skip files already indexed (scan manifest)"),
+    tiled: Optional[bool] = Query(default=None, description="Tiled detection for large group photos (default: SCAN_TILED_DETECTION)"),
     auth: dict = Depends(get_auth_context)
 ):
     """
     Scan a directory for faces and return/store embeddings.
+    With workers > 1 the scan runs on a multi-core process pool.
+    With incremental (and persist), unchanged files from earlier scans are skipped.
+    With tiled, small faces in large group shots are detected on overlapping tiles.
+    With persist, faces are upserted in retried chunks, reported in chunks.
+    Chunks past the org's storage quota aren't written: they count as
+    failed and the response carries the quota error.
     """
     if not os.path.exists(directory_path):
         raise HTTPException(status_code=404, detail=f"Directory not found: {directory_path}")
@@ -208,64 +479,239 @@ async def scan_directory(
     if not os.path.isdir(directory_path):
         raise HTTPException(status_code=400, detail="Path is not a directory")
     
+    manifest = None
     try:
-        fp = get_processor()
-        results = fp.scan_directory(directory_path)
+        fp = await run_in_threadpool(get_processor)
+        if persist and incremental:
+            manifest = ScanManifest(auth.get("org_id"), fp.model_version)
+
+        def collect():
+            results, db_records, hashes = [], [], {}
+            with closing(fp.iter_scan(directory_path, workers=workers, manifest=manifest, tiled=tiled)) as scan:
+                for event in scan:
+                    results.extend(event["faces"])
+                    if persist:
+                        db_records.extend(_scan_records(event["path"], event["faces"], auth.get("org_id")))
+                        hashes[event["path"]] = event.get("content_hash")
+            return results, db_records, hashes
+
+        # Scans can run for minutes: keep them off the event loop, but not on
+        # the inference executor, where they would starve selfie requests.
+        results, db_records, hashes = await run_in_threadpool(collect)
         
         stored_count = 0
-        total_size = 0
-        if persist and results:
-            from database_supabase import store_embeddings, log_usage, update_storage_stats
-            
-            # Prepare records for Supabase
-            db_records = []
-            for r in results:
-                # Approximate size or check file size
-                try:
-                    size = os.path.getsize(r["path"])
-                except:
-                    size = 0
-                
-                total_size += size
-                
-                db_records.append({
-                    "path": r["path"],
-                    "embedding": r["embedding"],
-                    "photo_date": r.get("photo_date"),
-                    "metadata": {"source": "scan"},
-                    "org_id": auth.get("org_id"),
-                    "size_bytes": size
-                })
-            
-            stored_count = store_embeddings(db_records)
-            
-            # Update organization storage stats if org_id is present
-            if auth.get("org_id") and total_size > 0:
-                update_storage_stats(auth["org_id"], total_size)
-                
-                log_usage(
-                    org_id=auth["org_id"],
-                    user_id=auth.get("user_id"),
-                    action="scan_ingest",
-                    bytes_processed=total_size,
-                    metadata={"directory": directory_path, "count": len(results)}
-                )
+        failed_count = 0
+        chunks = []
+        persisted = []  # (path, face_count) of files whose rows landed
+        quota_error = None
+        if db_records:
+            from database_supabase import upsert_embeddings
+            from database_supabase_async import update_storage_stats, log_usage
+
+            # Only the chunks that fit the org's quota are written; the rest
+            # count as failed and their files are scanned again next time
+            allowed, quota_error = await run_in_threadpool(_within_quota, auth.get("org_id"), db_records)
+            db_records, rejected = db_records[:allowed], len(db_records) - allowed
+
+            # Chunked, retried upsert: a failed chunk only loses its own files
+            report = await run_in_threadpool(upsert_embeddings, db_records)
+            stored_count, failed_count, chunks = report["stored"], report["failed"] + rejected, report["chunks"]
+            total_size, persisted = _persisted(report, db_records, hashes)
+
+            # Update organization storage stats if org_id is present;
+            # rescanned files only charge the difference in their size
+            if auth.get("org_id"):
+                if report["bytes_added"]:
+                    await update_storage_stats(auth["org_id"], report["bytes_added"])
+                if total_size > 0:
+                    await log_usage(
+                        org_id=auth["org_id"],
+                        user_id=auth.get("user_id"),
+                        action="scan_ingest",
+                        bytes_processed=total_size,
+                        metadata={"directory": directory_path, "count": stored_count}
+                    )
             
-            logger.info(f"Stored {stored_count} face records in Supabase")
+            logger.info(f"Stored {stored_count} face records in Supabase ({failed_count} failed)")
+
+        if manifest is not None:
+            # Only mark files done once their rows are persisted; files in
+            # a failed chunk are scanned again next time.
+            await run_in_threadpool(manifest.record_many, persisted)
         
         return ScanDirectoryResponse(
-            success=True,
+            success=quota_error is None,
             results=[ScanResult(path=r["path"], embedding=r["embedding"]) for r in results],
             total_processed=len(results),
-            total_stored=stored_count
+            total_stored=stored_count,
+            total_failed=failed_count,
+            total_skipped=manifest.skipped if manifest else 0,
+            chunks=chunks,
+            error=quota_error
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error scanning directory: {e}")
         return ScanDirectoryResponse(
             success=False,
             error=str(e)
         )
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+
+@router.post("/api/scan/stream")
+async def scan_directory_stream(
+    directory_path: str,
+    persist: bool = Query(default=True, description="Store results in Supabase"),
+    workers: Optional[int] = Query(default=None, ge=1, le=64, description="Scan worker processes (default: SCAN_WORKERS)"),
+    include_embeddings: bool = Query(default=False, description="Include embeddings in file events"),
+    incremental: bool = Query(default=True, description="Skip files already indexed (scan manifest)"),
+    tiled: Optional[bool] = Query(default=None, description="Tiled detection for large group photos (default: SCAN_TILED_DETECTION)"),
+    auth: dict = Depends(get_auth_context)
+):
+    """
+    Streaming variant of /api/scan (NDJSON).
+
+    Emits one {"type": "file"} line per image as it is processed, a
+    {"type": "progress"} line after each persisted chunk and a final
+    {"type": "done"} line. Face records are written to Supabase in rolling
+    chunks of SCAN_PERSIST_CHUNK, so memory stays flat for any folder size.
+
+    With incremental (and persist), files are marked in the scan manifest as
+    each chunk lands, so an interrupted scan resumes where it stopped. Writes
+    replace each file's rows (see database_supabase.upsert_photo_faces), so
+    re-scanning a file neither duplicates its faces nor keeps stale ones.
+
+    Each chunk is checked against the org's storage quota first; once a
+    chunk doesn't fit, the scan stops with a {"type": "error"} line.
+    """
+    if not os.path.exists(directory_path):
+        raise HTTPException(status_code=404, detail=f"Directory not found: {directory_path}")
+
+    if not os.path.isdir(directory_path):
+        raise HTTPException(status_code=400, detail="Path is not a directory")
+
+    fp = await run_in_threadpool(get_processor)
+
+    # Sync generator: Starlette iterates it in a worker thread, keeping the
+    # event loop free while the scan runs.
+    def events():
+        from database_supabase import upsert_embeddings, log_usage, update_storage_stats
+
+        org_id = auth.get("org_id")
+        manifest = ScanManifest(org_id, fp.model_version) if persist and incremental else None
+        chunk: List[dict] = []
+        hashes: Dict[str, Optional[str]] = {}
+        processed = 0
+        faces_found = 0
+        stored_count = 0
+        failed_count = 0
+        total_size = 0
+        quota_error = None
+
+        def flush():
+            nonlocal chunk, hashes, stored_count, failed_count, total_size, quota_error
+            if chunk:
+                allowed, quota_error = _within_quota(org_id, chunk)
+                failed_count += len(chunk) - allowed
+                chunk = chunk[:allowed]
+            if chunk:
+                report = upsert_embeddings(chunk)
+                stored_count += report["stored"]
+                failed_count += report["failed"]
+                chunk_bytes, persisted = _persisted(report, chunk, hashes)
+                if org_id and report["bytes_added"]:
+                    update_storage_stats(org_id, report["bytes_added"])
+                total_size += chunk_bytes
+                if manifest is not None:
+                    manifest.record_many(persisted)
+            chunk, hashes = [], {}
+
+        scan = fp.iter_scan(directory_path, workers=workers, manifest=manifest, tiled=tiled)
+        try:
+            for event in scan:
+                processed = event["index"]
+                faces = event["faces"]
+                faces_found += len(faces)
+
+                line = {
+                    "type": "file",
+                    "path": event["path"],
+                    "index": event["index"],
+                    "total": event["total"],
+                    "faces": len(faces),
+                    "photo_date": faces[0].get("photo_date") if faces else None
+                }
+                if include_embeddings:
+                    line["embeddings"] = [f["embedding"] for f in faces]
+                yield json.dumps(line) + "\n"
+
+                if persist:
+                    chunk.extend(_scan_records(event["path"], faces, org_id))
+                    hashes[event["path"]] = event.get("content_hash")
+
+                    if len(chunk) >= SCAN_PERSIST_CHUNK:
+                        flush()
+                        if quota_error:
+                            break
+                        yield json.dumps({
+                            "type": "progress",
+                            "processed": processed,
+                            "total": event["total"],
+                            "faces_found": faces_found,
+                            "stored": stored_count,
+                            "failed": failed_count
+                        }) + "\n"
+
+            if persist:
+                if quota_error is None:
+                    flush()
+                if org_id and total_size > 0:
+                    log_usage(
+                        org_id=org_id,
+                        user_id=auth.get("user_id"),
+                        action="scan_ingest",
+                        bytes_processed=total_size,
+                        metadata={"directory": directory_path, "count": stored_count}
+                    )
+
+            if quota_error:
+                # Files not yet written stay out of the manifest for a later scan
+                yield json.dumps({
+                    "type": "error",
+                    "success": False,
+                    "error": quota_error,
+                    "total_files": processed,
+                    "total_stored": stored_count,
+                    "total_failed": failed_count
+                }) + "\n"
+                return
+
+            yield json.dumps({
+                "type": "done",
+                "success": True,
+                "total_processed": faces_found,
+                "total_files": processed,
+                "total_stored": stored_count,
+                "total_failed": failed_count,
+                "total_skipped": manifest.skipped if manifest else 0
+            }) + "\n"
+
+        except Exception as e:
+            logger.error(f"Error streaming scan of {directory_path}: {e}")
+            yield json.dumps({"type": "error", "success": False, "error": str(e)}) + "\n"
+        finally:
+            # Stop the scan (and any scan worker processes) as soon as the
+            # stream ends, not whenever the generator is collected
+            scan.close()
+            if manifest is not None:
+                manifest.close()
+
+    return StreamingResponse(_closing_stream(events()), media_type="application/x-ndjson")
 
 
 @router.post("/api/search", response_model=SearchResponse)
@@ -281,15 +727,13 @@ async def search_faces(
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    # Save to temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename or ".png")[1]) as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
-    
     try:
-        # Get embedding from uploaded image
-        fp = get_processor()
-        query_embedding = fp.get_embedding(tmp_path)
+        # Get embedding from uploaded image (cached by content hash, micro-batched)
+        from imaging import ImageTooLarge
+        from micro_batcher import embed_upload, read_upload
+        contents = await read_upload(file)
+        fp = await run_in_threadpool(get_processor)
+        query_embedding = await embed_upload(fp, contents)
         
         if query_embedding is None:
             return SearchResponse(
@@ -297,16 +741,25 @@ async def search_faces(
                 error="No face detected in the uploaded image"
             )
         
-        # Search Supabase
-        from database_supabase import search_similar, log_usage
+        # Search Supabase; the usage row doesn't depend on the result, so
+        # it is written concurrently
+        from database_supabase_async import search_similar, log_usage
         
         # We pass min_similarity directly as threshold
-        matches = search_similar(
+        calls = [search_similar(
             query_embedding, 
             threshold=min_similarity, 
             limit=limit,
             org_id=auth.get("org_id")
-        )
+        )]
+        if auth.get("org_id"):
+            calls.append(log_usage(
+                org_id=auth["org_id"],
+                user_id=auth.get("user_id"),
+                action="search",
+                metadata={"limit": limit, "threshold": min_similarity}
+            ))
+        matches = (await asyncio.gather(*calls))[0]
         
         # Convert to response model
         search_matches = []
@@ -318,30 +771,22 @@ async def search_faces(
                  photo_date=m.get("photo_date", "Unknown"),
                  created_at=m.get("created_at", "Unknown")
              ))
-        
-        if auth.get("org_id"):
-            log_usage(
-                org_id=auth["org_id"],
-                user_id=auth.get("user_id"),
-                action="search",
-                metadata={"limit": limit, "threshold": min_similarity}
-            )
             
         return SearchResponse(
             success=True,
             matches=search_matches
         )
     
+    except HTTPException:
+        raise
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Error searching faces: {e}")
         return SearchResponse(
             success=False,
             error=str(e)
         )
-    finally:
-        # Cleanup temp file
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
 
 
 @router.get("/api/image")
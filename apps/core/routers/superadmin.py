@@ -10,8 +10,9 @@ from typing import List, Optional
 from pydantic import BaseModel
 import logging
 
-from dependencies import get_auth_context
+from dependencies import get_auth_context, model_status
 from database_supabase import get_client
+from import_profiler import import_report
 
 router = APIRouter(prefix="/api/superadmin", tags=["SuperAdmin"])
 logger = logging.getLogger(__name__)
@@ -162,3 +163,15 @@ async def list_all_users(auth: dict = Depends(require_superadmin)):
     except Exception as e:
         logger.error(f"Users list error: {e}")
         return {"error": str(e)}
+
+
+@router.get("/startup")
+async def get_startup_report(top: int = 30, auth: dict = Depends(require_superadmin)):
+    """
+    Cold start breakdown: per-module import cost recorded at boot, the
+    background preimport, and the model load phases.
+    """
+    return {
+        "imports": import_report(top),
+        "model": model_status().get("startup"),
+    }
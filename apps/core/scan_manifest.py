@@ -0,0 +1,181 @@
+"""
+Scan Manifest for Aura Core.
+Persistent record of which files a directory scan has already indexed, so
+rescans only process new or modified photos and can resume after a crash.
+"""
+import os
+import hashlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+logger = logging.getLogger(__name__)
+
+# SQLite file (relative to apps/core, next to the legacy LanceDB data)
+MANIFEST_PATH = os.getenv(
+    "SCAN_MANIFEST_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "scan_manifest.db")
+)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's contents, read in 1 MB chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ScanManifest:
+    """
+    Per-org manifest of indexed files: path, size, mtime, content hash,
+    face count and the model version that produced the embeddings.
+
+    Files with zero faces are recorded too (negative entries) so faceless
+    shots are not re-decoded on every rescan. Entries should only be
+    recorded once their face records are persisted, which is what makes an
+    interrupted scan resumable.
+    """
+
+    def __init__(self, org_id: Optional[str], model_version: str, db_path: Optional[str] = None):
+        self.org_id = org_id or ""
+        self.model_version = model_version
+        self.db_path = db_path or MANIFEST_PATH
+        self.skipped = 0  # files needs_scan() reported as unchanged
+        self._lock = threading.Lock()
+
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        # Scans iterate in a worker thread, so the connection is shared
+        # across threads and serialised with our own lock.
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS scan_manifest (
+                org_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                content_hash TEXT NOT NULL,
+                face_count INTEGER NOT NULL,
+                model_version TEXT NOT NULL,
+                indexed_at TEXT NOT NULL,
+                PRIMARY KEY (org_id, path)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """Fetch the manifest entry for a path, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, content_hash, face_count, model_version, indexed_at "
+                "FROM scan_manifest WHERE org_id = ? AND path = ?",
+                (self.org_id, path)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "path": path,
+            "size": row[0],
+            "mtime": row[1],
+            "content_hash": row[2],
+            "face_count": row[3],
+            "model_version": row[4],
+            "indexed_at": row[5]
+        }
+
+    def needs_scan(self, path: str) -> bool:
+        """
+        True if the file is new, changed, or was indexed by another model.
+
+        size + mtime is the fast path; when only mtime differs (copy, touch,
+        re-sync) the content hash decides, and a matching hash just refreshes
+        the stored mtime.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return True
+
+        entry = self.get(path)
+        if entry is None or entry["model_version"] != self.model_version:
+            return True
+        if entry["size"] != st.st_size:
+            return True
+        if entry["mtime"] == st.st_mtime:
+            self.skipped += 1
+            return False
+
+        try:
+            if file_hash(path) != entry["content_hash"]:
+                return True
+        except OSError:
+            return True
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE scan_manifest SET mtime = ? WHERE org_id = ? AND path = ?",
+                (st.st_mtime, self.org_id, path)
+            )
+            self._conn.commit()
+        self.skipped += 1
+        return False
+
+    def record(self, path: str, face_count: int, content_hash: Optional[str] = None) -> bool:
+        """Record a single indexed file. See record_many."""
+        return self.record_many([(path, face_count, content_hash)]) == 1
+
+    def record_many(self, entries: List[tuple]) -> int:
+        """
+        Upsert (path, face_count, content_hash) entries in one transaction.
+
+        content_hash should be the hash of the bytes the faces came from
+        (the scan event's content_hash); files are only read and hashed
+        again when it is None or left out. Returns the number of entries
+        written. Files that vanished since the scan are skipped.
+        """
+        rows = []
+        now = datetime.now().isoformat()
+        for path, face_count, *rest in entries:
+            content_hash = rest[0] if rest else None
+            try:
+                st = os.stat(path)
+                rows.append((
+                    self.org_id, path, st.st_size, st.st_mtime, content_hash or file_hash(path),
+                    face_count, self.model_version, now
+                ))
+            except OSError as e:
+                logger.warning(f"Skipping manifest entry for {path}: {e}")
+
+        if not rows:
+            return 0
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scan_manifest "
+                "(org_id, path, size, mtime, content_hash, face_count, model_version, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def forget(self, path: str) -> None:
+        """Remove a path so the next scan re-indexes it."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM scan_manifest WHERE org_id = ? AND path = ?",
+                (self.org_id, path)
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
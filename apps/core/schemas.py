@@ -14,11 +14,22 @@ class ScanResult(BaseModel):
     embedding: List[float]
     photo_date: Optional[str] = None
 
+class PersistChunk(BaseModel):
+    start: int
+    rows: int
+    stored: int
+    bytes_added: int = 0
+    attempts: int
+    error: Optional[str] = None
+
 class ScanDirectoryResponse(BaseModel):
     success: bool
     results: List[ScanResult] = []
     total_processed: int = 0
     total_stored: int = 0
+    total_failed: int = 0
+    total_skipped: int = 0
+    chunks: List[PersistChunk] = []
     error: Optional[str] = None
 
 class SearchMatch(BaseModel):
@@ -0,0 +1,269 @@
+"""
+Storage Ledger for Aura Core.
+
+Every stored photo used to call increment_org_storage once, and when that
+RPC failed the fallback read storage_used_bytes and wrote back the sum,
+losing concurrent increments. Quota (storage_limit_gb) wasn't checked at
+ingest at all, since doing so would have cost another query per upload.
+
+The ledger keeps, per worker:
+- pending byte deltas per org, added by update_storage_stats in memory and
+  flushed every STORAGE_FLUSH_INTERVAL_MS as one atomic increment per org.
+  A failed increment stays pending and is retried; there is no
+  read-modify-write.
+- a cached quota view per org (limit and used bytes), read once and then
+  refreshed in the background every STORAGE_QUOTA_TTL seconds. Used bytes
+  include this worker's unflushed deltas, so check_quota() answers from
+  memory.
+
+Other workers' recent uploads show up at the next refresh, so an org can
+overshoot its quota by at most what all workers ingest within one TTL.
+main.lifespan flushes pending deltas on shutdown.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 0 = increment the org counter on every call (the old behaviour)
+STORAGE_LEDGER_ENABLED = os.getenv("STORAGE_LEDGER_ENABLED", "1") == "1"
+STORAGE_FLUSH_INTERVAL_MS = int(os.getenv("STORAGE_FLUSH_INTERVAL_MS", 5000))
+# Seconds a cached quota view is used before it is re-read
+STORAGE_QUOTA_TTL = float(os.getenv("STORAGE_QUOTA_TTL", 60))
+# 0 = only account for storage, never reject uploads
+STORAGE_QUOTA_ENFORCED = os.getenv("STORAGE_QUOTA_ENFORCED", "1") == "1"
+
+GB = 1024 ** 3
+
+
+class StorageQuotaExceeded(Exception):
+    """Raised when an upload would take an org past its storage limit."""
+
+
+class StorageLedger:
+    """
+    Per-org byte deltas and quota views, flushed/refreshed by a daemon thread.
+
+    increment_fn(org_id, delta) applies one atomic increment and returns
+    True on success. fetch_fn(org_ids) returns {org_id: {"storage_limit_gb",
+    "storage_used_bytes"}} for the orgs it found.
+    """
+
+    def __init__(
+        self,
+        increment_fn: Callable[[str, int], bool],
+        fetch_fn: Callable[[Iterable[str]], Dict[str, Dict[str, Any]]],
+        interval_ms: int = STORAGE_FLUSH_INTERVAL_MS,
+        quota_ttl: float = STORAGE_QUOTA_TTL
+    ):
+        self.increment_fn = increment_fn
+        self.fetch_fn = fetch_fn
+        self.interval = interval_ms / 1000
+        self.quota_ttl = quota_ttl
+        self._pending: Dict[str, int] = {}
+        self._quotas: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # flushes and refreshes never overlap
+        self._closed = False
+        self._counters = {"recorded": 0, "increments": 0, "failed_increments": 0, "refreshes": 0, "rejected": 0}
+        self._thread = threading.Thread(target=self._run, name="storage-ledger", daemon=True)
+        self._thread.start()
+
+    def add(self, org_id: str, delta: int) -> None:
+        """Account delta bytes to org_id (negative for deletions)."""
+        if not org_id or not delta:
+            return
+        with self._cond:
+            self._pending[org_id] = self._pending.get(org_id, 0) + delta
+            self._counters["recorded"] += 1
+            quota = self._quotas.get(org_id)
+            if quota is not None:
+                quota["used_bytes"] += delta
+
+    def pending(self, org_id: str) -> int:
+        with self._cond:
+            return self._pending.get(org_id, 0)
+
+    def quota(self, org_id: str) -> Optional[Dict[str, Any]]:
+        """Cached {"limit_bytes", "used_bytes", "fetched_at"}, or None if not loaded."""
+        with self._cond:
+            quota = self._quotas.get(org_id)
+            return dict(quota) if quota is not None else None
+
+    def is_cached(self, org_id: str) -> bool:
+        with self._cond:
+            return org_id in self._quotas
+
+    def check(self, org_id: str, incoming_bytes: int = 0) -> Dict[str, Any]:
+        """
+        Raise StorageQuotaExceeded if incoming_bytes would exceed the org's
+        limit. Loads the org's view first if it isn't cached yet (the only
+        case that touches the database). Returns the view.
+        """
+        if not self.is_cached(org_id):
+            self.refresh([org_id])
+        quota = self.quota(org_id)
+        if quota is None or quota["limit_bytes"] is None:
+            return quota or {}
+        if quota["used_bytes"] + incoming_bytes > quota["limit_bytes"]:
+            with self._cond:
+                self._counters["rejected"] += 1
+            raise StorageQuotaExceeded(
+                f"Storage quota exceeded ({quota['limit_bytes'] / GB:.1f} GB limit)"
+            )
+        return quota
+
+    def refresh(self, org_ids: Optional[Iterable[str]] = None) -> None:
+        """Re-read quota views (default: every cached org past its TTL)."""
+        with self._flush_lock:
+            self._refresh(org_ids)
+
+    def _refresh(self, org_ids: Optional[Iterable[str]]) -> None:
+        now = time.monotonic()
+        if org_ids is None:
+            with self._cond:
+                org_ids = [o for o, q in self._quotas.items() if now - q["fetched_at"] >= self.quota_ttl]
+        org_ids = list(org_ids)
+        if not org_ids:
+            return
+        try:
+            rows = self.fetch_fn(org_ids)
+        except Exception as e:
+            logger.error(f"Storage quota refresh failed: {e}")
+            return
+
+        with self._cond:
+            self._counters["refreshes"] += 1
+            for org_id in org_ids:
+                # Unknown orgs are cached without a limit, so they don't
+                # cost a query on every check
+                row = rows.get(org_id) or {}
+                limit_gb = row.get("storage_limit_gb")
+                self._quotas[org_id] = {
+                    "limit_bytes": int(limit_gb * GB) if limit_gb is not None else None,
+                    # The database doesn't include what this worker hasn't flushed yet
+                    "used_bytes": (row.get("storage_used_bytes") or 0) + self._pending.get(org_id, 0),
+                    "fetched_at": now,
+                }
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed, self.interval)
+                if self._closed:
+                    return
+            self.flush()
+            self.refresh()
+
+    def flush(self) -> int:
+        """Apply pending deltas, one increment per org. Returns orgs flushed."""
+        flushed = 0
+        with self._flush_lock:
+            with self._cond:
+                pending, self._pending = self._pending, {}
+            for org_id, delta in pending.items():
+                if not delta:
+                    continue
+                try:
+                    ok = self.increment_fn(org_id, delta)
+                except Exception as e:
+                    logger.error(f"Storage increment failed for org {org_id}: {e}")
+                    ok = False
+                with self._cond:
+                    if ok:
+                        self._counters["increments"] += 1
+                        flushed += 1
+                    else:
+                        # Keep it for the next flush instead of guessing
+                        self._counters["failed_increments"] += 1
+                        self._pending[org_id] = self._pending.get(org_id, 0) + delta
+        return flushed
+
+    def close(self, timeout: Optional[float] = None) -> int:
+        """Stop the background thread and flush what is pending."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        flushed = self.flush()
+        with self._cond:
+            if self._pending:
+                logger.error(f"Storage deltas not flushed on shutdown: {self._pending}")
+        return flushed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self._counters,
+                "pending_orgs": len(self._pending),
+                "pending_bytes": sum(self._pending.values()),
+                "cached_orgs": len(self._quotas),
+            }
+
+
+def _increment(org_id: str, delta: int) -> bool:
+    from database_supabase import increment_org_storage
+    return increment_org_storage(org_id, delta)
+
+
+def _fetch(org_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    from database_supabase import get_org_storage
+    return get_org_storage(org_ids)
+
+
+# Global ledger shared by both data layers
+_ledger: Optional[StorageLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_storage_ledger() -> StorageLedger:
+    """Lazily create the process-wide ledger from STORAGE_* settings."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = StorageLedger(_increment, _fetch)
+    return _ledger
+
+
+def record_storage(org_id: str, delta: int) -> Optional[bool]:
+    """
+    Account delta bytes in the ledger if it is enabled; returns True, or
+    None when it is off and the caller should increment directly.
+    """
+    if not STORAGE_LEDGER_ENABLED:
+        return None
+    get_storage_ledger().add(org_id, delta)
+    return True
+
+
+def check_quota(org_id: Optional[str], incoming_bytes: int = 0) -> None:
+    """Raise StorageQuotaExceeded if org_id can't take incoming_bytes more."""
+    if not org_id or not STORAGE_QUOTA_ENFORCED:
+        return
+    get_storage_ledger().check(org_id, incoming_bytes)
+
+
+async def check_quota_async(org_id: Optional[str], incoming_bytes: int = 0) -> None:
+    """check_quota for async routes: inline when cached, else in a thread."""
+    if not org_id or not STORAGE_QUOTA_ENFORCED:
+        return
+    if get_storage_ledger().is_cached(org_id):
+        check_quota(org_id, incoming_bytes)
+    else:
+        await asyncio.to_thread(check_quota, org_id, incoming_bytes)
+
+
+def storage_ledger_stats() -> Optional[Dict[str, Any]]:
+    return _ledger.stats() if _ledger is not None else None
+
+
+def close_storage_ledger() -> int:
+    """Final flush on shutdown (called from main.lifespan)."""
+    global _ledger
+    with _ledger_lock:
+        ledger, _ledger = _ledger, None
+    return ledger.close() if ledger is not None else 0
@@ -5,7 +5,7 @@ Run with: ./venv/bin/pytest tests/ -v
 """
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import os
 import sys
 import json
@@ -18,34 +18,61 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 mock_db_supa = MagicMock()
 mock_db_supa.get_stats.return_value = {"total_faces": 42, "table_exists": True}
 mock_db_supa.store_embeddings.return_value = 5
+mock_db_supa.get_org_storage.return_value = {}  # storage ledger: orgs without a quota
 mock_db_supa.search_similar.return_value = [
     {"id": "test-id", "path": "test.jpg", "distance": 0.1, "similarity": 0.9, "photo_date": "2023-01-01"}
 ]
 sys.modules["database_supabase"] = mock_db_supa
 
 from main import app
+import database_supabase_async
 
 client = TestClient(app)
 
+# The async data layer used by the request-path routes is patched per test
+mock_db_async = MagicMock()
+ASYNC_DB_FUNCTIONS = (
+    "store_embeddings", "store_embeddings_batch", "store_embedding", "upsert_photo_faces", "search_similar",
+    "get_signed_url", "get_stats", "get_user_embedding", "add_photo_matches",
+    "log_usage", "update_storage_stats", "close_client"
+)
+
+
+@pytest.fixture(autouse=True)
+def async_db():
+    for name in ASYNC_DB_FUNCTIONS:
+        setattr(mock_db_async, name, AsyncMock(name=name))
+    mock_db_async.get_stats.return_value = {"total_faces": 42, "table_exists": True}
+    mock_db_async.search_similar.return_value = []
+    with patch.multiple(database_supabase_async, **{name: getattr(mock_db_async, name) for name in ASYNC_DB_FUNCTIONS}):
+        yield mock_db_async
+
+
+def _jpeg_bytes():
+    import numpy as np
+    import cv2
+    _, encoded = cv2.imencode(".jpg", np.zeros((64, 64, 3), dtype=np.uint8))
+    return encoded.tobytes()
+
 class TestAuthEndpoint:
     """Tests for the /api/auth/face-login endpoint."""
     
     def test_face_login_success(self):
         """Face login should succeed with valid face match."""
         # Mock processor to return embedding
-        with patch("main.get_processor") as mock_get_proc:
+        with patch("routers.auth.get_processor") as mock_get_proc:
             mock_proc_instance = MagicMock()
-            mock_proc_instance.get_embedding.return_value = [0.1] * 512
+            mock_proc_instance.get_embedding_from_image.return_value = [0.1] * 512
             mock_get_proc.return_value = mock_proc_instance
             
             # Mock DB search to return a match
-            mock_db_supa.search_similar.return_value = [
+            mock_db_async.search_similar.return_value = [
                 {"id": "user-face-id", "path": "user.jpg", "distance": 0.2, "similarity": 0.8}
             ]
 
             # Create dummy image
             with tempfile.NamedTemporaryFile(suffix=".jpg") as tmp:
-                tmp.write(b"fake image data")
+                tmp.write(_jpeg_bytes())
                 tmp.seek(0)
                 
                 response = client.post(
@@ -61,13 +88,13 @@ class TestAuthEndpoint:
 
     def test_face_login_no_face(self):
         """Face login should fail if no face detected."""
-        with patch("main.get_processor") as mock_get_proc:
+        with patch("routers.auth.get_processor") as mock_get_proc:
             mock_proc_instance = MagicMock()
-            mock_proc_instance.get_embedding.return_value = None
+            mock_proc_instance.get_embedding_from_image.return_value = None
             mock_get_proc.return_value = mock_proc_instance
 
             with tempfile.NamedTemporaryFile(suffix=".jpg") as tmp:
-                tmp.write(b"fake image data")
+                tmp.write(_jpeg_bytes())
                 tmp.seek(0)
                 response = client.post(
                     "/api/auth/face-login",
@@ -143,6 +170,95 @@ class TestEmbedEndpoint:
         
         assert response.status_code == 400
 
+    def test_embed_repeat_upload_served_from_cache(self):
+        """The same bytes uploaded twice should only be embedded once."""
+        from embedding_cache import EmbeddingCache
+
+        import numpy as np
+        import cv2
+
+        mock_proc = MagicMock()
+        mock_proc.model_version = "buffalo_l"
+        mock_proc.get_embedding_from_image.return_value = [0.1] * 512
+        _, selfie = cv2.imencode(".jpg", np.zeros((64, 64, 3), dtype=np.uint8))
+
+        with patch("routers.photos.get_processor", return_value=mock_proc), \
+             patch("embedding_cache._cache", EmbeddingCache(max_entries=8)):
+            for _ in range(3):
+                response = client.post(
+                    "/api/embed",
+                    files={"file": ("selfie.jpg", selfie.tobytes(), "image/jpeg")}
+                )
+                assert response.json()["success"] is True
+
+        mock_proc.get_embedding_from_image.assert_called_once()
+
+    def test_embed_invalid_image(self):
+        """Undecodable uploads are reported, not embedded."""
+        mock_proc = MagicMock()
+
+        with patch("routers.photos.get_processor", return_value=mock_proc):
+            response = client.post(
+                "/api/embed",
+                files={"file": ("selfie.jpg", b"definitely not a jpeg", "image/jpeg")}
+            )
+
+        data = response.json()
+        assert data["success"] is False
+        assert data["error"] == "Invalid image file"
+        mock_proc.get_embedding_from_image.assert_not_called()
+
+    def test_embed_returns_429_when_inference_queue_full(self):
+        from inference_executor import InferenceQueueFull
+
+        class FullExecutor:
+            async def run(self, fn, *args, **kwargs):
+                raise InferenceQueueFull("full")
+
+        # A real (uncached) JPEG: garbage bytes are now rejected before inference
+        import numpy as np
+        import cv2
+        _, selfie = cv2.imencode(".jpg", np.full((48, 48, 3), 200, dtype=np.uint8))
+
+        with patch("routers.photos.get_processor", return_value=MagicMock()), \
+             patch("inference_executor._executor", FullExecutor()):
+            response = client.post(
+                "/api/embed",
+                files={"file": ("selfie.jpg", selfie.tobytes(), "image/jpeg")}
+            )
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+
+    def test_embed_rejects_oversized_upload_before_inference(self):
+        mock_proc = MagicMock()
+
+        with patch("routers.photos.get_processor", return_value=mock_proc), \
+             patch("micro_batcher.MAX_UPLOAD_BYTES", 100):
+            response = client.post(
+                "/api/embed",
+                files={"file": ("selfie.jpg", _jpeg_bytes() + b"\0" * 200, "image/jpeg")}
+            )
+
+        assert response.status_code == 413
+        mock_proc.get_embedding_from_image.assert_not_called()
+
+    def test_search_rejects_decompression_bomb(self):
+        # Valid PNG header claiming 100000 x 100000 pixels
+        import struct
+        bomb = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 100000, 100000) + b"\x08\x02\0\0\0"
+        mock_proc = MagicMock()
+
+        with patch("routers.photos.get_processor", return_value=mock_proc):
+            response = client.post(
+                "/api/search",
+                files={"file": ("selfie.png", bomb, "image/png")}
+            )
+
+        assert response.status_code == 413
+        mock_proc.get_embedding_from_image.assert_not_called()
+
 
 class TestScanEndpoint:
     """Tests for the /api/scan endpoint."""
@@ -175,6 +291,263 @@ class TestScanEndpoint:
         assert len(data["results"]) >= 1
 
 
+def _upsert_report(records, failed_paths=(), new_files=True):
+    # upsert_embeddings report with one chunk per record; new files add
+    # their size_bytes, rewritten ones add nothing
+    chunks = [
+        {"start": i, "rows": 1,
+         "stored": int("embedding" in r and r["path"] not in failed_paths),
+         "bytes_added": r.get("size_bytes", 0) if new_files and r["path"] not in failed_paths else 0,
+         "attempts": 3 if r["path"] in failed_paths else 1,
+         "error": "timeout" if r["path"] in failed_paths else None}
+        for i, r in enumerate(records)
+    ]
+    return {
+        "stored": sum(c["stored"] for c in chunks),
+        "failed": sum(c["rows"] for c in chunks if c["error"]),
+        "bytes_added": sum(c["bytes_added"] for c in chunks),
+        "chunks": chunks
+    }
+
+
+class TestScanPersist:
+    """Chunked upserts from /api/scan."""
+
+    def _scan(self, files, report=_upsert_report):
+        from dependencies import get_auth_context
+        from scan_manifest import ScanManifest
+
+        mock_db_supa.upsert_embeddings.reset_mock()
+        mock_db_supa.upsert_embeddings.side_effect = report
+        app.dependency_overrides[get_auth_context] = lambda: {"org_id": "org1", "user_id": "u1"}
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                events = []
+                for i, (name, faces) in enumerate(files):
+                    path = os.path.join(tmp_dir, name)
+                    with open(path, "wb") as f:
+                        f.write(b"x" * 100)
+                    events.append({
+                        "path": path, "index": i + 1, "total": len(files),
+                        "faces": [{"path": path, "embedding": [0.1] * 4, "photo_date": None}] * faces,
+                        "content_hash": f"sha-{name}"
+                    })
+                mock_proc = MagicMock()
+                mock_proc.model_version = "buffalo_l"
+                mock_proc.iter_scan.return_value = (e for e in events)
+                db_path = os.path.join(tmp_dir, "manifest.db")
+
+                with patch("routers.photos.get_processor", return_value=mock_proc), \
+                     patch("scan_manifest.MANIFEST_PATH", db_path):
+                    response = client.post("/api/scan", params={"directory_path": tmp_dir})
+
+                # Files count as marked if recorded with the hash of the bytes scanned
+                manifest = ScanManifest("org1", "buffalo_l", db_path=db_path)
+                marked = {
+                    name for name, _ in files
+                    if (manifest.get(os.path.join(tmp_dir, name)) or {}).get("content_hash") == f"sha-{name}"
+                }
+                manifest.close()
+        finally:
+            mock_db_supa.upsert_embeddings.side_effect = None
+            app.dependency_overrides.clear()
+        return response.json(), marked
+
+    def test_records_keyed_by_face_index(self):
+        data, marked = self._scan([("a.jpg", 2), ("b.jpg", 0), ("c.jpg", 1)])
+
+        records = mock_db_supa.upsert_embeddings.call_args.args[0]
+        assert [(os.path.basename(r["path"]), r.get("face_index"), r.get("size_bytes")) for r in records] == [
+            ("a.jpg", 0, 100), ("a.jpg", 1, 0), ("b.jpg", None, None), ("c.jpg", 0, 100)
+        ]
+        # Faceless b.jpg is sent without embedding, clearing faces it had
+        assert "embedding" not in records[2]
+        assert data["total_stored"] == 3 and data["total_failed"] == 0
+        assert len(data["chunks"]) == 4
+        assert marked == {"a.jpg", "b.jpg", "c.jpg"}
+        assert mock_db_async.update_storage_stats.call_args.args == ("org1", 200)
+        # Accounting goes through the async data layer, not the sync client
+        mock_db_async.update_storage_stats.assert_awaited_once()
+        assert mock_db_async.log_usage.await_args.kwargs["bytes_processed"] == 200
+
+    def test_rescan_charges_only_added_bytes(self):
+        data, marked = self._scan(
+            [("a.jpg", 2), ("c.jpg", 1)],
+            report=lambda records: _upsert_report(records, new_files=False)
+        )
+
+        assert data["total_stored"] == 3
+        mock_db_async.update_storage_stats.assert_not_called()
+
+    def test_failed_chunk_only_loses_its_files(self):
+        # The chunks holding b.jpg fail after their retries
+        data, marked = self._scan(
+            [("a.jpg", 1), ("b.jpg", 2), ("c.jpg", 1)],
+            report=lambda records: _upsert_report(records, {records[2]["path"]})
+        )
+
+        assert data["success"] is True
+        assert data["total_stored"] == 2 and data["total_failed"] == 2
+        assert [c["error"] for c in data["chunks"]] == [None, "timeout", "timeout", None]
+        # b.jpg is scanned again next time; storage counts only what landed
+        assert marked == {"a.jpg", "c.jpg"}
+        assert mock_db_async.update_storage_stats.call_args.args == ("org1", 200)
+
+    def test_chunks_past_quota_are_not_written(self):
+        from storage_ledger import StorageQuotaExceeded
+
+        def check(org_id, incoming):
+            if incoming > 150:
+                raise StorageQuotaExceeded("Storage quota exceeded (5 GB limit)")
+
+        # One file per write chunk: a.jpg and b.jpg fit, c.jpg's 100 bytes don't
+        with patch("bulk_writer.DB_WRITE_CHUNK_ROWS", 1), \
+             patch("storage_ledger.check_quota", side_effect=check):
+            data, marked = self._scan([("a.jpg", 2), ("b.jpg", 0), ("c.jpg", 1)])
+
+        records = mock_db_supa.upsert_embeddings.call_args.args[0]
+        assert [os.path.basename(r["path"]) for r in records] == ["a.jpg", "a.jpg", "b.jpg"]
+        assert data["success"] is False and "quota" in data["error"]
+        assert data["total_stored"] == 2 and data["total_failed"] == 1
+        assert marked == {"a.jpg", "b.jpg"}
+        assert mock_db_async.update_storage_stats.call_args.args == ("org1", 100)
+
+
+class TestScanStreamEndpoint:
+    """Tests for the /api/scan/stream NDJSON endpoint."""
+
+    def _events(self, n_files, faces_per_file=1):
+        for i in range(1, n_files + 1):
+            path = f"/photos/{i}.jpg"
+            yield {
+                "path": path,
+                "index": i,
+                "total": n_files,
+                "faces": [
+                    {"path": path, "embedding": [0.1] * 512, "photo_date": "2023-01-01"}
+                    for _ in range(faces_per_file)
+                ]
+            }
+
+    def test_stream_emits_file_progress_and_done(self):
+        mock_proc = MagicMock()
+        mock_proc.iter_scan.return_value = self._events(5)
+        mock_db_supa.upsert_embeddings.reset_mock()
+        mock_db_supa.upsert_embeddings.side_effect = _upsert_report
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+             patch("routers.photos.get_processor", return_value=mock_proc), \
+             patch("routers.photos.SCAN_PERSIST_CHUNK", 2):
+            response = client.post(
+                "/api/scan/stream",
+                params={"directory_path": tmp_dir, "incremental": False}
+            )
+
+        mock_db_supa.upsert_embeddings.side_effect = None
+        assert response.status_code == 200
+        lines = [json.loads(l) for l in response.text.splitlines()]
+        types = [l["type"] for l in lines]
+
+        assert types.count("file") == 5
+        assert types.count("progress") == 2
+        assert lines[-1]["type"] == "done"
+        assert lines[-1]["total_stored"] == 5
+        # Two full chunks of 2 plus the final flush of 1
+        assert lines[-1]["total_failed"] == 0
+        assert [len(c.args[0]) for c in mock_db_supa.upsert_embeddings.call_args_list] == [2, 2, 1]
+        assert "embeddings" not in lines[0]
+
+    def test_stream_stops_at_quota(self):
+        from storage_ledger import StorageQuotaExceeded
+
+        scan = self._events(5)
+        mock_proc = MagicMock()
+        mock_proc.iter_scan.return_value = scan
+        mock_db_supa.upsert_embeddings.reset_mock()
+        mock_db_supa.upsert_embeddings.side_effect = _upsert_report
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+             patch("routers.photos.get_processor", return_value=mock_proc), \
+             patch("routers.photos.SCAN_PERSIST_CHUNK", 2), \
+             patch("storage_ledger.check_quota",
+                   side_effect=[None, StorageQuotaExceeded("Storage quota exceeded (5 GB limit)")]):
+            response = client.post(
+                "/api/scan/stream",
+                params={"directory_path": tmp_dir, "incremental": False}
+            )
+
+        mock_db_supa.upsert_embeddings.side_effect = None
+        lines = [json.loads(l) for l in response.text.splitlines()]
+
+        # The second chunk is rejected and the fifth file is never scanned
+        assert [l["type"] for l in lines].count("file") == 4
+        assert lines[-1]["type"] == "error" and "quota" in lines[-1]["error"]
+        assert lines[-1]["total_stored"] == 2 and lines[-1]["total_failed"] == 2
+        assert [len(c.args[0]) for c in mock_db_supa.upsert_embeddings.call_args_list] == [2]
+        # The abandoned scan is closed when the stream ends
+        assert scan.gi_frame is None
+
+    def test_stream_without_persist_skips_db(self):
+        mock_proc = MagicMock()
+        mock_proc.iter_scan.return_value = self._events(2)
+        mock_db_supa.upsert_embeddings.reset_mock()
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+             patch("routers.photos.get_processor", return_value=mock_proc):
+            response = client.post(
+                "/api/scan/stream",
+                params={"directory_path": tmp_dir, "persist": False, "include_embeddings": True}
+            )
+
+        lines = [json.loads(l) for l in response.text.splitlines()]
+        assert len(lines[0]["embeddings"]) == 1
+        assert lines[-1]["total_stored"] == 0
+        mock_db_supa.upsert_embeddings.assert_not_called()
+
+    def test_stream_records_manifest_after_persist(self):
+        from scan_manifest import ScanManifest
+
+        mock_db_supa.upsert_embeddings.side_effect = _upsert_report
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            photos = []
+            for name in ("a.jpg", "b.jpg"):
+                path = os.path.join(tmp_dir, name)
+                with open(path, "wb") as f:
+                    f.write(name.encode())
+                photos.append(path)
+
+            mock_proc = MagicMock()
+            mock_proc.model_version = "buffalo_l"
+            mock_proc.iter_scan.return_value = (e for e in [
+                {"path": photos[0], "index": 1, "total": 2,
+                 "faces": [{"path": photos[0], "embedding": [0.1] * 512, "photo_date": "2023-01-01"}],
+                 "content_hash": "sha-a"},
+                {"path": photos[1], "index": 2, "total": 2, "faces": [], "content_hash": "sha-b"},
+            ])
+            db_path = os.path.join(tmp_dir, "manifest.db")
+
+            with patch("routers.photos.get_processor", return_value=mock_proc), \
+                 patch("scan_manifest.MANIFEST_PATH", db_path):
+                response = client.post("/api/scan/stream", params={"directory_path": tmp_dir})
+
+            mock_db_supa.upsert_embeddings.side_effect = None
+            assert json.loads(response.text.splitlines()[-1])["type"] == "done"
+
+            manifest = ScanManifest(None, "buffalo_l", db_path=db_path)
+            assert manifest.get(photos[0])["face_count"] == 1
+            assert manifest.get(photos[1])["face_count"] == 0
+            # Recorded with the hash from the scan, not by reading the file again
+            assert manifest.get(photos[0])["content_hash"] == "sha-a"
+            assert manifest.needs_scan(photos[0]) is False
+            manifest.close()
+            assert mock_proc.iter_scan.call_args.kwargs["manifest"] is not None
+
+    def test_stream_missing_directory(self):
+        response = client.post("/api/scan/stream", params={"directory_path": "/nonexistent/path"})
+        assert response.status_code == 404
+
+
 class TestSearchEndpoint:
     """Tests for the /api/search endpoint."""
     
@@ -287,37 +660,179 @@ class TestQREndpoint:
 class TestIndexPhotoEndpoint:
     """Tests for the /api/index-photo endpoint."""
     
-    @patch("main.get_processor")
-    @patch("database_supabase.store_embedding")
-    def test_index_photo_success(self, mock_store, mock_get_processor):
-        # Mock processor
+    @patch("routers.photos.get_processor")
+    def test_index_photo_success(self, mock_get_processor):
+        import database_supabase_async
+
+        # Mock processor: two faces, smaller one first
         mock_processor = MagicMock()
-        mock_processor.get_embedding_from_image.return_value = [0.1] * 512
+        mock_processor.get_embeddings_batch.side_effect = lambda images: [[
+            {"bbox": [0, 0, 10, 10], "score": 0.7, "embedding": [0.2] * 512},
+            {"bbox": [20, 20, 60, 60], "score": 0.9, "embedding": [0.1] * 512},
+        ] for _ in images]
         mock_get_processor.return_value = mock_processor
         
-        # Mock store
-        mock_store.return_value = "new_record_id"
-        
         # Create dummy image
         import numpy as np
         import cv2
         img = np.zeros((100, 100, 3), dtype=np.uint8)
         _, img_encoded = cv2.imencode('.jpg', img)
         
-        response = client.post(
-            "/api/index-photo",
-            files={"file": ("thumb.jpg", img_encoded.tobytes(), "image/jpeg")},
-            data={"path": "photos/test.jpg", "metadata": "{}"}
-        )
+        written = {"ids": ["id-0", "id-1"], "bytes_added": 0}  # re-index of an unchanged file
+        with patch.object(database_supabase_async, "upsert_photo_faces", return_value=written) as mock_store, \
+             patch.object(database_supabase_async, "update_storage_stats") as mock_storage:
+            response = client.post(
+                "/api/index-photo",
+                files={"file": ("thumb.jpg", img_encoded.tobytes(), "image/jpeg")},
+                data={"path": "photos/test.jpg", "metadata": "{}"}
+            )
         
         assert response.status_code == 200
         data = response.json()
         assert data["status"] == "indexed"
-        assert data["id"] == "new_record_id"
+        assert data["id"] == "id-0"
+        assert data["ids"] == ["id-0", "id-1"]
+        assert data["faces_found"] == 2
         
-        # Verify calls
-        mock_processor.get_embedding_from_image.assert_called_once()
+        # Every face stored in one insert, largest first
+        mock_processor.get_embeddings_batch.assert_called_once()
         mock_store.assert_called_once()
+        records = mock_store.call_args.args[0]
+        assert [r["face_index"] for r in records] == [0, 1]
+        assert records[0]["bbox"] == [20, 20, 60, 60] and records[0]["det_score"] == 0.9
+        assert records[0]["embedding"] == [0.1] * 512
+        assert all(r["path"] == "photos/test.jpg" for r in records)
+        # File size counted once, and only charged when the write added bytes
+        assert records[0]["size_bytes"] == len(img_encoded.tobytes()) and records[1]["size_bytes"] == 0
+        mock_storage.assert_not_called()
+
+    @patch("routers.photos.get_processor")
+    def test_index_photo_no_face(self, mock_get_processor):
+        import database_supabase_async
+        import numpy as np
+        import cv2
+
+        mock_processor = MagicMock()
+        mock_processor.get_embeddings_batch.side_effect = lambda images: [[] for _ in images]
+        mock_get_processor.return_value = mock_processor
+        _, img_encoded = cv2.imencode('.jpg', np.zeros((100, 100, 3), dtype=np.uint8))
+
+        written = {"ids": [None], "bytes_added": 0}
+        with patch.object(database_supabase_async, "upsert_photo_faces", return_value=written) as mock_store:
+            response = client.post(
+                "/api/index-photo",
+                files={"file": ("thumb.jpg", img_encoded.tobytes(), "image/jpeg")},
+                data={"path": "photos/test.jpg"}
+            )
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "skipped"
+        # Faces indexed earlier under this path are cleared
+        mock_store.assert_called_once_with([{"path": "photos/test.jpg"}])
+
+
+class TestIndexPhotosEndpoint:
+    """Tests for the bulk /api/index-photos endpoint."""
+
+    def _thumb(self, value):
+        import numpy as np
+        import cv2
+        _, encoded = cv2.imencode(".jpg", np.full((64, 64, 3), value, dtype=np.uint8))
+        return encoded.tobytes()
+
+    @patch("routers.photos.get_processor")
+    def test_batch_is_embedded_and_stored_once(self, mock_get_processor):
+        import database_supabase_async
+
+        mock_processor = MagicMock()
+        # Bright thumbnails have faces (two in d.jpg), dark ones don't
+        face = {"bbox": [0, 0, 10, 10], "score": 0.8, "embedding": [0.1] * 512}
+        mock_processor.get_embeddings_batch.side_effect = lambda images: [
+            [face] * (1 if img[0, 0, 0] < 210 else 2) if img[0, 0, 0] > 100 else []
+            for img in images
+        ]
+        mock_get_processor.return_value = mock_processor
+
+        files = [
+            ("files", ("a.jpg", self._thumb(200), "image/jpeg")),
+            ("files", ("b.jpg", self._thumb(0), "image/jpeg")),
+            ("files", ("c.jpg", b"not an image", "image/jpeg")),
+            ("files", ("d.jpg", self._thumb(220), "image/jpeg")),
+        ]
+        data = {
+            "paths": ["org/a.jpg", "org/b.jpg", "org/c.jpg", "org/d.jpg"],
+            "metadata": json.dumps([{"created_at": "2025-07-16"}, {}, {}, {"album": "x"}]),
+        }
+
+        written = {"ids": ["id-a", None, "id-d0", "id-d1"], "bytes_added": 123}
+        with patch.object(database_supabase_async, "upsert_photo_faces", return_value=written) as mock_store, \
+             patch.object(database_supabase_async, "update_storage_stats") as mock_storage, \
+             patch.object(database_supabase_async, "log_usage") as mock_log:
+            from dependencies import get_auth_context
+            app.dependency_overrides[get_auth_context] = lambda: {"org_id": "org1", "user_id": "u1"}
+            try:
+                response = client.post("/api/index-photos", files=files, data=data)
+            finally:
+                app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        body = response.json()
+        assert [r["status"] for r in body["results"]] == ["indexed", "skipped", "error", "indexed"]
+        assert body["results"][0]["id"] == "id-a" and body["results"][3]["id"] == "id-d0"
+        assert body["results"][3]["ids"] == ["id-d0", "id-d1"]
+        assert [body["results"][i]["faces_found"] for i in (0, 3)] == [1, 2]
+        assert (body["indexed"], body["skipped"], body["failed"]) == (2, 1, 1)
+
+        # One inference call, one insert, one storage update, one usage row
+        mock_processor.get_embeddings_batch.assert_called_once()
+        assert len(mock_processor.get_embeddings_batch.call_args.args[0]) == 3
+        records = mock_store.call_args.args[0]
+        assert [(r["path"], r.get("face_index")) for r in records] == [
+            ("org/a.jpg", 0), ("org/b.jpg", None), ("org/d.jpg", 0), ("org/d.jpg", 1)
+        ]
+        assert "embedding" not in records[1]  # faceless b.jpg clears its rows
+        assert records[0]["photo_date"] == "2025-07-16"
+        assert all(r["org_id"] == "org1" for r in records)
+        # Storage is charged what the upsert added, not the uploaded bytes
+        mock_storage.assert_called_once_with("org1", 123)
+        mock_log.assert_called_once()
+
+    def test_mismatched_paths_rejected(self):
+        response = client.post(
+            "/api/index-photos",
+            files=[("files", ("a.jpg", self._thumb(200), "image/jpeg"))],
+            data={"paths": ["a.jpg", "b.jpg"]}
+        )
+        assert response.status_code == 400
+
+    def test_batch_size_limit(self):
+        with patch("routers.photos.INDEX_BATCH_MAX", 1):
+            response = client.post(
+                "/api/index-photos",
+                files=[("files", ("a.jpg", b"x", "image/jpeg")), ("files", ("b.jpg", b"y", "image/jpeg"))],
+                data={"paths": ["a.jpg", "b.jpg"]}
+            )
+        assert response.status_code == 413
+
+    @patch("routers.photos.get_processor")
+    def test_quota_exceeded_rejected_before_inference(self, mock_get_processor):
+        from dependencies import get_auth_context
+        from storage_ledger import StorageQuotaExceeded
+
+        with patch("storage_ledger.check_quota_async", side_effect=StorageQuotaExceeded("Storage quota exceeded (5 GB limit)")):
+            app.dependency_overrides[get_auth_context] = lambda: {"org_id": "org1", "user_id": "u1"}
+            try:
+                response = client.post(
+                    "/api/index-photos",
+                    files=[("files", ("a.jpg", self._thumb(200), "image/jpeg"))],
+                    data={"paths": ["org/a.jpg"]}
+                )
+            finally:
+                app.dependency_overrides.clear()
+
+        assert response.status_code == 403
+        mock_get_processor.assert_not_called()
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,128 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulk_writer
+from bulk_writer import chunk_records, write_chunks
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(bulk_writer, "DB_WRITE_BACKOFF", 0)
+
+
+def records(n):
+    return [{"path": f"{i}.jpg", "face_index": 0, "size_bytes": 10} for i in range(n)]
+
+
+def stored(chunk):
+    return {"stored": len(chunk), "bytes_added": sum(r["size_bytes"] for r in chunk)}
+
+
+class TestChunkRecords:
+    def test_row_bound_keeps_order(self):
+        chunks = chunk_records(records(5), max_rows=2)
+
+        assert [len(c) for c in chunks] == [2, 2, 1]
+        assert [r["path"] for c in chunks for r in c] == [f"{i}.jpg" for i in range(5)]
+
+    def test_byte_bound(self):
+        rows = [{"path": str(i) + "x" * 100} for i in range(4)]
+
+        assert [len(c) for c in chunk_records(rows, max_rows=10, max_bytes=250)] == [2, 2]
+        # A record larger than the bound still gets written, on its own
+        assert [len(c) for c in chunk_records(rows, max_rows=10, max_bytes=10)] == [1, 1, 1, 1]
+
+    def test_files_are_never_split(self):
+        rows = [{"path": p, "face_index": i} for p, n in (("a", 1), ("b", 3), ("c", 1)) for i in range(n)]
+
+        assert [[r["path"] for r in c] for c in chunk_records(rows, max_rows=2)] == [
+            ["a"], ["b", "b", "b"], ["c"]
+        ]
+        assert [len(c) for c in chunk_records(rows, max_rows=4)] == [4, 1]
+
+    def test_empty(self):
+        assert chunk_records([]) == []
+
+
+class TestWriteChunks:
+    def test_reports_every_chunk(self, monkeypatch):
+        monkeypatch.setattr(bulk_writer, "DB_WRITE_CHUNK_ROWS", 2)
+
+        report = write_chunks(records(5), stored)
+
+        assert report["stored"] == 5 and report["failed"] == 0 and report["bytes_added"] == 50
+        assert [(c["start"], c["rows"], c["stored"], c["attempts"], c["error"]) for c in report["chunks"]] == [
+            (0, 2, 2, 1, None), (2, 2, 2, 1, None), (4, 1, 1, 1, None)
+        ]
+
+    def test_retries_then_gives_up(self, monkeypatch):
+        monkeypatch.setattr(bulk_writer, "DB_WRITE_CHUNK_ROWS", 2)
+        monkeypatch.setattr(bulk_writer, "DB_WRITE_RETRIES", 3)
+        attempts = {}
+        lock = threading.Lock()
+
+        def write(chunk):
+            key = chunk[0]["path"]
+            with lock:
+                attempts[key] = attempts.get(key, 0) + 1
+            if key == "0.jpg" and attempts[key] < 2:
+                raise ConnectionError("reset")
+            if key == "2.jpg":
+                raise TimeoutError("statement timeout")
+            return stored(chunk)
+
+        report = write_chunks(records(4), write)
+
+        assert report["stored"] == 2 and report["failed"] == 2
+        assert report["bytes_added"] == 20
+        first, second = report["chunks"]
+        assert first["attempts"] == 2 and first["error"] is None
+        assert second["start"] == 2 and second["attempts"] == 3
+        assert second["error"] == "statement timeout"
+
+    def test_upsert_makes_retries_idempotent(self, monkeypatch):
+        # A chunk whose response was lost is re-sent whole; keyed writes
+        # leave exactly one row per (org_id, path, face_index)
+        monkeypatch.setattr(bulk_writer, "DB_WRITE_CHUNK_ROWS", 3)
+        table = {}
+        lost = {"once": True}
+
+        def upsert(chunk):
+            for r in chunk:
+                table[(r.get("org_id"), r["path"], r["face_index"])] = r
+            if lost.pop("once", False):
+                raise ConnectionError("response lost")
+            return stored(chunk)
+
+        report = write_chunks(records(7), upsert)
+        write_chunks(records(7), upsert)  # a repeated scan
+
+        assert report["stored"] == 7
+        assert len(table) == 7
+
+    def test_concurrency_bound(self, monkeypatch):
+        monkeypatch.setattr(bulk_writer, "DB_WRITE_CHUNK_ROWS", 1)
+        monkeypatch.setattr(bulk_writer, "DB_WRITE_CONCURRENCY", 2)
+        active, peak = [0], [0]
+        lock = threading.Lock()
+        gate = threading.Barrier(2, timeout=2)
+
+        def write(chunk):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            try:
+                gate.wait()
+            except threading.BrokenBarrierError:
+                pass
+            with lock:
+                active[0] -= 1
+            return {"stored": 1}
+
+        assert write_chunks(records(4), write)["stored"] == 4
+        assert peak[0] == 2
@@ -0,0 +1,143 @@
+import os
+import sys
+import importlib.util
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database_postgres
+import database_supabase_async
+
+
+class TestInsertSQL:
+    def test_columns_cast_and_vector_sent_binary(self):
+        sql = database_postgres.insert_sql(["path", "embedding", "metadata", "org_id"])
+
+        assert sql == (
+            "INSERT INTO public.photos (path, embedding, metadata, org_id) "
+            "VALUES (%s::text, %b::vector, %s::jsonb, %s::uuid) "
+            "ON CONFLICT (org_id, path, face_index) "
+            "DO UPDATE SET embedding = EXCLUDED.embedding, metadata = EXCLUDED.metadata RETURNING id"
+        )
+
+    def test_file_faces_counts_faceless_files_as_zero(self):
+        records = [
+            {"org_id": "o", "path": "a.jpg", "embedding": [0.1], "face_index": 0},
+            {"org_id": "o", "path": "a.jpg", "embedding": [0.1], "face_index": 1},
+            {"org_id": "o", "path": "b.jpg"},
+        ]
+
+        assert database_postgres.file_faces(records) == {("o", "a.jpg"): 2, ("o", "b.jpg"): 0}
+
+    def test_unknown_columns_rejected(self):
+        with pytest.raises(ValueError):
+            database_postgres.insert_sql(["path", "id; DROP TABLE photos"])
+
+
+def test_backend_selection():
+    with patch.object(database_postgres, "DB_BACKEND", "supabase"):
+        assert not database_postgres.use_postgres()
+    with patch.object(database_postgres, "DB_BACKEND", "postgres"):
+        assert database_postgres.use_postgres()
+
+
+@pytest.mark.skipif(importlib.util.find_spec("psycopg_pool") is not None, reason="psycopg installed")
+def test_missing_driver_is_reported():
+    with patch.object(database_postgres, "_pool", None):
+        with pytest.raises(RuntimeError, match="psycopg"):
+            database_postgres.get_pool()
+        # Helpers keep the Supabase fallbacks
+        assert database_postgres.search_similar([0.1] * 4) == []
+        assert database_postgres.store_embeddings_batch([{"path": "a.jpg"}]) == [None]
+
+
+@pytest.mark.asyncio
+async def test_async_layer_delegates_hot_paths():
+    match = {"id": "p1", "source_path": "a.jpg", "similarity": 0.9, "distance": 0.1}
+    with patch.object(database_postgres, "DB_BACKEND", "postgres"), \
+         patch.object(database_postgres, "search_similar", return_value=[match]) as search, \
+         patch.object(database_postgres, "upsert_photo_faces", return_value={"ids": ["id-1"], "bytes_added": 0}) as store, \
+         patch.object(database_postgres, "add_photo_matches", return_value=1) as add, \
+         patch.object(database_supabase_async, "_request") as rest:
+        assert await database_supabase_async.search_similar([0.1] * 4, 0.7, 5, "org1") == [match]
+        assert await database_supabase_async.store_embeddings_batch([{"path": "a.jpg"}]) == ["id-1"]
+        assert await database_supabase_async.add_photo_matches([{"photo_id": "p1", "user_id": "u1"}]) == 1
+
+    search.assert_called_once_with([0.1] * 4, 0.7, 5, "org1")
+    store.assert_called_once()
+    add.assert_called_once()
+    rest.assert_not_called()
+
+
+class FakePhotos:
+    """In-memory photos table answering the statements upsert_photo_faces runs."""
+
+    def __init__(self):
+        self.rows = {}  # (org_id, path, face_index) -> row
+        self.results = []
+
+    # pool.connection() / conn.cursor() context managers
+    def connection(self):
+        return self
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _files(self, params):
+        return set(zip(params["org_ids"], params["paths"]))
+
+    def execute(self, sql, params):
+        if sql == database_postgres.FILE_BYTES_SQL:
+            files = self._files(params)
+            self.results = [(sum(r.get("size_bytes") or 0 for k, r in self.rows.items() if k[:2] in files),)]
+        elif sql == database_postgres.DELETE_STALE_SQL:
+            faces = dict(zip(zip(params["org_ids"], params["paths"]), params["faces"]))
+            self.rows = {k: r for k, r in self.rows.items() if k[:2] not in faces or k[2] < faces[k[:2]]}
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def executemany(self, sql, params_seq, returning=False):
+        columns = sql.split("(", 1)[1].split(")", 1)[0].split(", ")
+        self.results = []
+        for params in params_seq:
+            row = dict(zip(columns, params))
+            key = (row.get("org_id"), row["path"], row.get("face_index") or 0)
+            self.rows[key] = row
+            self.results.append((f"{key[1]}#{key[2]}",))
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+    def nextset(self):
+        pass
+
+
+class TestUpsertPhotoFaces:
+    def faces(self, path, n, size):
+        return [
+            {"org_id": "o", "path": path, "embedding": [0.1], "face_index": i, "size_bytes": size if i == 0 else 0}
+            for i in range(n)
+        ]
+
+    def test_rewrite_drops_stale_faces_and_charges_only_new_bytes(self):
+        table = FakePhotos()
+        with patch.object(database_postgres, "get_pool", return_value=table), \
+             patch.object(database_postgres, "_params", lambda record, columns: [record[c] for c in columns]):
+            first = database_postgres.upsert_photo_faces(self.faces("a.jpg", 3, 100) + self.faces("b.jpg", 1, 50))
+            # a.jpg was edited: two faces now, bigger file; b.jpg lost its face
+            second = database_postgres.upsert_photo_faces(self.faces("a.jpg", 2, 120) + [{"org_id": "o", "path": "b.jpg"}])
+            # Same content again: nothing new to charge
+            third = database_postgres.upsert_photo_faces(self.faces("a.jpg", 2, 120))
+
+        assert first == {"ids": ["a.jpg#0", "a.jpg#1", "a.jpg#2", "b.jpg#0"], "bytes_added": 150}
+        assert second == {"ids": ["a.jpg#0", "a.jpg#1", None], "bytes_added": 120 - 150}
+        assert third["bytes_added"] == 0
+        assert sorted(table.rows) == [("o", "a.jpg", 0), ("o", "a.jpg", 1)]
@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import asyncio
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database_supabase_async as db
+
+
+class FakeSupabase:
+    """PostgREST/Storage stand-in recording every request."""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        handler = self.routes.get((request.method, request.url.path))
+        if handler is None:
+            return httpx.Response(404, json={"message": "not found"})
+        status, body = handler(request)
+        return httpx.Response(status, json=body) if body is not None else httpx.Response(status)
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    def install(routes):
+        fake = routes if callable(routes) else FakeSupabase(routes)
+        monkeypatch.setattr(db, "_client", httpx.AsyncClient(
+            base_url="https://test.supabase.co",
+            headers={"apikey": "key", "Authorization": "Bearer key"},
+            transport=httpx.MockTransport(fake)
+        ))
+        monkeypatch.setattr(db, "_client_loop", asyncio.get_running_loop())
+        return fake
+    yield install
+
+
+def upsert_rpc(fail=lambda rows: False):
+    # upsert_photo_faces stand-in: ids are paths, faceless files get null
+    def handler(r):
+        rows = json.loads(r.content)["p_rows"]
+        if fail(rows):
+            return 503, {"message": "busy"}
+        return 200, {
+            "ids": [f"{row['path']}#{row.get('face_index', 0)}" if "embedding" in row else None for row in rows],
+            "bytes_added": sum(row.get("size_bytes", 0) for row in rows),
+        }
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_returns_ids_in_order(supabase):
+    fake = supabase({("POST", "/rest/v1/rpc/upsert_photo_faces"): upsert_rpc()})
+
+    written = await db.upsert_photo_faces([
+        {"path": "a.jpg", "embedding": [0.1], "face_index": 0, "size_bytes": 10},
+        {"path": "a.jpg", "embedding": [0.2], "face_index": 1, "size_bytes": 0},
+        {"path": "b.jpg"},  # no faces anymore: clears its rows
+    ])
+
+    assert written == {"ids": ["a.jpg#0", "a.jpg#1", None], "bytes_added": 10}
+    assert fake.requests[0].headers["apikey"] == "key"
+    assert await db.store_embeddings_batch([{"path": "c.jpg", "embedding": [0.1]}]) == ["c.jpg#0"]
+
+
+@pytest.mark.asyncio
+async def test_upsert_embeddings_chunks_and_retries(supabase, monkeypatch):
+    import bulk_writer
+    monkeypatch.setattr(bulk_writer, "DB_WRITE_CHUNK_ROWS", 2)
+    monkeypatch.setattr(bulk_writer, "DB_WRITE_BACKOFF", 0)
+    calls = []
+
+    def fail(rows):
+        calls.append([row["path"] for row in rows])
+        # The second chunk fails once, then goes through
+        return rows[0]["path"] == "c.jpg" and calls.count(["c.jpg", "d.jpg"]) == 1
+
+    supabase({("POST", "/rest/v1/rpc/upsert_photo_faces"): upsert_rpc(fail)})
+    records = [
+        {"path": p, "embedding": [0.1], "face_index": 0, "size_bytes": 5}
+        for p in ("a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg")
+    ]
+
+    report = await db.upsert_embeddings(records)
+
+    assert report["stored"] == 5 and report["failed"] == 0 and report["bytes_added"] == 25
+    assert [(c["start"], c["rows"], c["attempts"]) for c in report["chunks"]] == [(0, 2, 1), (2, 2, 2), (4, 1, 1)]
+    assert len(calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_upsert_embeddings_reports_failed_chunks(supabase, monkeypatch):
+    import bulk_writer
+    monkeypatch.setattr(bulk_writer, "DB_WRITE_CHUNK_ROWS", 1)
+    monkeypatch.setattr(bulk_writer, "DB_WRITE_RETRIES", 2)
+    monkeypatch.setattr(bulk_writer, "DB_WRITE_BACKOFF", 0)
+    supabase({("POST", "/rest/v1/rpc/upsert_photo_faces"): upsert_rpc(lambda rows: rows[0]["path"] == "b.jpg")})
+
+    report = await db.upsert_embeddings([
+        {"path": "a.jpg", "embedding": [0.1], "size_bytes": 5},
+        {"path": "b.jpg", "embedding": [0.1], "size_bytes": 7},
+    ])
+
+    assert report["stored"] == 1 and report["failed"] == 1 and report["bytes_added"] == 5
+    failed = report["chunks"][1]
+    assert failed["start"] == 1 and failed["attempts"] == 2 and failed["error"]
+    assert await db.store_embeddings([{"path": "a.jpg", "embedding": [0.1]}]) == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_return_sync_fallbacks(supabase, monkeypatch):
+    import usage_buffer
+    monkeypatch.setattr(usage_buffer, "USAGE_BUFFER_ENABLED", False)
+    supabase({
+        ("POST", "/rest/v1/rpc/upsert_photo_faces"): lambda r: (500, {"message": "boom"}),
+        ("POST", "/rest/v1/rpc/match_faces"): lambda r: (500, {"message": "boom"}),
+        ("POST", "/rest/v1/usage_logs"): lambda r: (500, {"message": "boom"}),
+    })
+
+    assert await db.store_embeddings_batch([{"path": "a.jpg"}]) == [None]
+    assert await db.search_similar([0.1] * 4) == []
+    assert await db.log_usage("org1", "search") is False
+
+
+@pytest.mark.asyncio
+async def test_search_similar_uses_tenant_rpc_and_normalizes(supabase):
+    fake = supabase({
+        ("POST", "/rest/v1/rpc/match_faces_tenant"): lambda r: (200, [
+            {"id": "p1", "path": "org/a.jpg", "similarity": 0.8, "photo_date": "2025-07-16"}
+        ]),
+    })
+
+    matches = await db.search_similar([0.1] * 4, threshold=0.7, limit=5, org_id="org1")
+
+    assert json.loads(fake.requests[0].content)["p_org_id"] == "org1"
+    assert matches[0]["source_path"] == "org/a.jpg"
+    assert matches[0]["distance"] == pytest.approx(0.2)
+
+
+@pytest.mark.asyncio
+async def test_signed_url_is_absolute(supabase):
+    supabase({
+        ("POST", "/storage/v1/object/sign/photos/org/a.jpg"): lambda r: (200, {"signedURL": "/object/sign/photos/org/a.jpg?token=t"}),
+    })
+
+    url = await db.get_signed_url("/org/a.jpg")
+
+    assert url == "https://test.supabase.co/storage/v1/object/sign/photos/org/a.jpg?token=t"
+
+
+@pytest.mark.asyncio
+async def test_storage_stats_without_ledger_use_the_atomic_rpc(supabase, monkeypatch):
+    import storage_ledger
+    monkeypatch.setattr(storage_ledger, "STORAGE_LEDGER_ENABLED", False)
+    fake = supabase({
+        ("POST", "/rest/v1/rpc/increment_org_storage"): lambda r: (200, None),
+    })
+
+    assert await db.update_storage_stats("org1", 50) is True
+    assert len(fake.requests) == 1
+    assert json.loads(fake.requests[0].content) == {"p_org_id": "org1", "p_bytes": 50}
+
+
+@pytest.mark.asyncio
+async def test_storage_stats_never_read_modify_write(supabase, monkeypatch):
+    import storage_ledger
+    monkeypatch.setattr(storage_ledger, "STORAGE_LEDGER_ENABLED", False)
+    fake = supabase({
+        ("POST", "/rest/v1/rpc/increment_org_storage"): lambda r: (404, {"message": "no such function"}),
+    })
+
+    assert await db.update_storage_stats("org1", 50) is False
+    assert [(r.method, r.url.path) for r in fake.requests] == [("POST", "/rest/v1/rpc/increment_org_storage")]
+
+
+@pytest.mark.asyncio
+async def test_independent_calls_run_concurrently(supabase):
+    in_flight = []
+    peak = []
+
+    async def slow(request):
+        in_flight.append(request)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.05)
+        in_flight.remove(request)
+        return httpx.Response(200, json={"signedURL": "/object/sign/x"})
+
+    supabase(slow)
+
+    results = await asyncio.gather(*(db.get_signed_url(f"{i}.jpg") for i in range(4)))
+
+    assert all(results)
+    assert max(peak) == 4
+
+
+@pytest.mark.asyncio
+async def test_client_requires_credentials(monkeypatch):
+    monkeypatch.setattr(db, "_client", None)
+    monkeypatch.delenv("SUPABASE_URL", raising=False)
+    monkeypatch.delenv("SUPABASE_KEY", raising=False)
+
+    with pytest.raises(ValueError):
+        db.get_client()
@@ -0,0 +1,88 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import EmbeddingCache, cache_key, MISS
+
+
+class TestCacheKey:
+    def test_depends_on_content_and_model(self):
+        assert cache_key(b"a", "buffalo_l") == cache_key(b"a", "buffalo_l")
+        assert cache_key(b"a", "buffalo_l") != cache_key(b"b", "buffalo_l")
+        assert cache_key(b"a", "buffalo_l") != cache_key(b"a", "buffalo_l_int8")
+
+
+class TestEmbeddingCache:
+    def test_miss_then_hit(self):
+        cache = EmbeddingCache(max_entries=4, ttl=60)
+        assert cache.get("k") is MISS
+        cache.put("k", [0.5, 0.5])
+        assert cache.get("k") == [0.5, 0.5]
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_negative_results_are_cached(self):
+        cache = EmbeddingCache(max_entries=4, ttl=60)
+        compute = MagicMock(return_value=None)
+        assert cache.get_or_compute("k", compute) is None
+        assert cache.get_or_compute("k", compute) is None
+        compute.assert_called_once()
+
+    def test_lru_eviction(self):
+        cache = EmbeddingCache(max_entries=2, ttl=60)
+        cache.put("a", [1.0])
+        cache.put("b", [2.0])
+        cache.get("a")  # a becomes most recently used
+        cache.put("c", [3.0])
+        assert cache.get("b") is MISS
+        assert cache.get("a") == [1.0]
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        cache = EmbeddingCache(max_entries=4, ttl=10)
+        with patch("embedding_cache.time.time", return_value=1000.0):
+            cache.put("k", [1.0])
+        with patch("embedding_cache.time.time", return_value=1011.0):
+            assert cache.get("k") is MISS
+            assert cache.stats()["entries"] == 0
+
+    def test_disabled_cache_always_computes(self):
+        cache = EmbeddingCache(max_entries=0)
+        compute = MagicMock(return_value=[1.0])
+        cache.get_or_compute("k", compute)
+        cache.get_or_compute("k", compute)
+        assert compute.call_count == 2
+
+    def test_disabled_cache_skips_the_disk_tier(self, tmp_path):
+        db_path = tmp_path / "cache.db"
+        cache = EmbeddingCache(max_entries=0, disk_path=str(db_path))
+        cache.put("k", [1.0])
+        assert cache.get("k") is MISS
+        assert not cache.disk_tier and not db_path.exists()
+        assert cache.stats()["misses"] == 0
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        db_path = str(tmp_path / "cache.db")
+        first = EmbeddingCache(max_entries=4, ttl=60, disk_path=db_path)
+        first.put("k", [0.25, 0.75])
+        first.put("none", None)
+        first.close()
+
+        second = EmbeddingCache(max_entries=4, ttl=60, disk_path=db_path)
+        assert second.get("k") == [0.25, 0.75]
+        assert second.get("none") is None
+        assert second.stats()["disk_hits"] == 2
+        second.close()
+
+    def test_purge_expired(self, tmp_path):
+        cache = EmbeddingCache(max_entries=4, ttl=10, disk_path=str(tmp_path / "cache.db"))
+        with patch("embedding_cache.time.time", return_value=1000.0):
+            cache.put("k", [1.0])
+        with patch("embedding_cache.time.time", return_value=2000.0):
+            assert cache.purge_expired() == 2  # memory + disk
+        cache.close()
+
@@ -0,0 +1,173 @@
+import os
+import sys
+import hashlib
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unittest.mock import patch
+
+from imaging import (
+    read_image_size, reduced_decode_flag, decode_image, load_image,
+    parse_exif, read_image_info, apply_orientation, ingest_image_file,
+    sniff_image_type, check_upload, InvalidImage, ImageTooLarge
+)
+
+
+def encode(ext, w, h):
+    img = np.full((h, w, 3), 128, dtype=np.uint8)
+    ok, buf = cv2.imencode(ext, img)
+    assert ok
+    return buf.tobytes()
+
+
+class TestReadImageSize:
+    @pytest.mark.parametrize("ext", [".jpg", ".png", ".webp"])
+    def test_reads_header_dimensions(self, ext):
+        assert read_image_size(encode(ext, 320, 200)) == (320, 200)
+
+    def test_unknown_format(self):
+        assert read_image_size(b"not an image at all") is None
+
+    def test_truncated_jpeg(self):
+        assert read_image_size(encode(".jpg", 320, 200)[:4]) is None
+
+
+class TestCheckUpload:
+    @pytest.mark.parametrize("ext,kind", [(".jpg", "jpeg"), (".png", "png"), (".webp", "webp")])
+    def test_accepts_supported_formats(self, ext, kind):
+        data = encode(ext, 320, 200)
+        assert sniff_image_type(data) == kind
+        assert check_upload(data) == (320, 200)
+
+    @pytest.mark.parametrize("data", [b"", b"GIF89a....", b"%PDF-1.7", b"<html>"])
+    def test_rejects_non_images_by_magic(self, data):
+        with pytest.raises(InvalidImage) as exc_info:
+            check_upload(data)
+        assert not isinstance(exc_info.value, ImageTooLarge)
+
+    def test_rejects_truncated_header(self):
+        with pytest.raises(InvalidImage):
+            check_upload(encode(".jpg", 320, 200)[:8])
+
+    def test_byte_limit(self):
+        with pytest.raises(ImageTooLarge):
+            check_upload(encode(".png", 320, 200), max_bytes=10)
+
+    def test_pixel_limit_checked_from_header(self):
+        data = encode(".jpg", 320, 200)
+        assert check_upload(data, max_pixels=320 * 200) == (320, 200)
+        with pytest.raises(ImageTooLarge):
+            check_upload(data, max_pixels=320 * 200 - 1)
+
+
+class TestReducedDecodeFlag:
+    @pytest.mark.parametrize("longest,expected", [
+        (6000, cv2.IMREAD_REDUCED_COLOR_4),   # 1500 >= 1280, 750 < 1280
+        (12000, cv2.IMREAD_REDUCED_COLOR_8),
+        (3000, cv2.IMREAD_REDUCED_COLOR_2),
+        (2000, cv2.IMREAD_COLOR),
+    ])
+    def test_picks_largest_reduction_above_target(self, longest, expected):
+        assert reduced_decode_flag((longest, longest // 2), 1280) == expected
+
+    def test_non_jpeg_and_unknown_decode_fully(self):
+        assert reduced_decode_flag((6000, 4000), 1280, jpeg=False) == cv2.IMREAD_COLOR
+        assert reduced_decode_flag(None, 1280) == cv2.IMREAD_COLOR
+
+
+class TestDecode:
+    def test_decode_image_reduces_and_caps(self):
+        img = decode_image(encode(".jpg", 4000, 2000), max_dim=1280)
+        assert max(img.shape[:2]) == 1280
+
+    def test_decode_image_without_limit_keeps_size(self):
+        img = decode_image(encode(".png", 300, 100))
+        assert img.shape[:2] == (100, 300)
+
+    def test_decode_image_invalid(self):
+        assert decode_image(b"garbage", max_dim=1280) is None
+
+    def test_load_image_uses_reduced_flag(self, tmp_path):
+        path = tmp_path / "big.jpg"
+        path.write_bytes(encode(".jpg", 2800, 1400))
+
+        img = load_image(str(path), max_dim=1280)
+
+        assert img.shape[:2] == (640, 1280)
+
+    def test_load_image_missing_file(self):
+        assert load_image("/nonexistent/file.jpg", max_dim=1280) is None
+
+
+def jpeg_with_exif(w=40, h=20, orientation=None, date_original=None, date_time=None):
+    from io import BytesIO
+    from PIL import Image
+
+    img = Image.new("RGB", (w, h), (200, 10, 10))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    if date_time:
+        exif[0x0132] = date_time
+    if date_original:
+        exif.get_ifd(0x8769)[0x9003] = date_original
+    buf = BytesIO()
+    img.save(buf, "JPEG", exif=exif.tobytes())
+    return buf.getvalue()
+
+
+class TestParseExif:
+    def test_reads_orientation_and_dates(self):
+        data = jpeg_with_exif(orientation=6, date_original="2023:07:16 18:54:03", date_time="2023:08:01 10:00:00")
+
+        info = parse_exif(data)
+
+        assert info["orientation"] == 6
+        assert info["date_time_original"] == "2023:07:16 18:54:03"
+        assert info["date_time"] == "2023:08:01 10:00:00"
+
+    def test_no_exif(self):
+        assert parse_exif(encode(".jpg", 10, 10)) == {}
+
+    def test_non_jpeg(self):
+        assert parse_exif(encode(".png", 10, 10)) == {}
+
+    def test_read_image_info_includes_frame_size(self):
+        info = read_image_info(jpeg_with_exif(w=64, h=32, orientation=1))
+        assert (info["width"], info["height"]) == (64, 32)
+
+
+class TestIngestImageFile:
+    @pytest.mark.parametrize("orientation,shape", [(1, (20, 40)), (3, (20, 40)), (6, (40, 20)), (8, (40, 20))])
+    def test_applies_orientation(self, tmp_path, orientation, shape):
+        path = tmp_path / "o.jpg"
+        path.write_bytes(jpeg_with_exif(w=40, h=20, orientation=orientation))
+
+        img, info = ingest_image_file(str(path))
+
+        assert img.shape[:2] == shape
+        assert info["orientation"] == orientation
+
+    def test_reads_file_once(self, tmp_path):
+        path = tmp_path / "once.jpg"
+        path.write_bytes(jpeg_with_exif(date_original="2023:07:16 18:54:03"))
+
+        with patch("builtins.open", wraps=open) as mock_open:
+            img, info = ingest_image_file(str(path), max_dim=1280)
+
+        assert mock_open.call_count == 1
+        assert img is not None
+        assert info["mtime"] == os.stat(path).st_mtime
+        assert info["content_hash"] == hashlib.sha256(path.read_bytes()).hexdigest()
+
+    def test_orientation_transforms(self):
+        img = np.arange(6, dtype=np.uint8).reshape(2, 3)
+        assert apply_orientation(img, 2)[0, 0] == 2
+        assert apply_orientation(img, 4)[0, 0] == 3
+        assert apply_orientation(img, 5).shape == (3, 2)
+        assert apply_orientation(img, 7)[0, 0] == 5
+        assert apply_orientation(img, None) is img
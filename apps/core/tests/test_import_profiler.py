@@ -0,0 +1,101 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import import_profiler
+
+
+@pytest.fixture
+def fake_modules(tmp_path, monkeypatch):
+    # parent imports child; both sleep so timings are measurable
+    (tmp_path / "aura_fake_child.py").write_text("import time\ntime.sleep(0.02)\n")
+    (tmp_path / "aura_fake_parent.py").write_text(textwrap.dedent("""
+        import time
+        import aura_fake_child
+        time.sleep(0.01)
+    """))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield
+    for name in ("aura_fake_parent", "aura_fake_child"):
+        sys.modules.pop(name, None)
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    monkeypatch.setattr(import_profiler, "PROFILE_IMPORTS", True)
+    was_enabled = import_profiler._finder in sys.meta_path
+    import_profiler.enable()
+    yield import_profiler
+    if not was_enabled:
+        import_profiler.disable()
+
+
+class TestImportTiming:
+    def test_records_self_and_cumulative_time(self, fake_modules, profiler):
+        import aura_fake_parent  # noqa: F401
+
+        records = {r["module"]: r for r in profiler.import_report(top=None)["modules"]}
+        parent, child = records["aura_fake_parent"], records["aura_fake_child"]
+
+        assert child["cumulative_ms"] >= 20 and not child["top_level"]
+        assert parent["cumulative_ms"] >= parent["self_ms"] + child["cumulative_ms"] - 1
+        assert 10 <= parent["self_ms"] < 20
+        assert parent["top_level"]
+
+    def test_module_still_behaves_normally(self, fake_modules, profiler):
+        import aura_fake_child
+        assert aura_fake_child.__spec__.loader is aura_fake_child.__loader__
+
+    def test_disabled_profiler_records_nothing(self, fake_modules, monkeypatch):
+        monkeypatch.setattr(import_profiler, "PROFILE_IMPORTS", False)
+        was_enabled = import_profiler._finder in sys.meta_path
+        import_profiler.disable()
+        import_profiler.enable()
+        try:
+            import aura_fake_child
+            assert "exec_module" not in vars(aura_fake_child.__loader__)
+        finally:
+            if was_enabled:
+                sys.meta_path.insert(0, import_profiler._finder)
+
+
+class TestPreimport:
+    def test_background_preimport_reports_each_module(self, fake_modules):
+        thread = import_profiler.start_preimport(["aura_fake_child", "aura_missing_module"])
+        thread.join(5)
+
+        status = import_profiler.import_report()["preimport"]
+        assert status["status"] == "done"
+        assert isinstance(status["modules"]["aura_fake_child"], float)
+        assert status["modules"]["aura_missing_module"].startswith("error")
+        assert "aura_fake_child" in sys.modules
+
+    def test_nothing_to_preimport(self):
+        assert import_profiler.start_preimport([]) is None
+
+    def test_profiler_is_removed_after_preimport(self, fake_modules, profiler):
+        import aura_fake_child
+        assert "exec_module" in vars(aura_fake_child.__loader__)
+
+        thread = profiler.start_preimport(["aura_fake_parent"])
+        thread.join(5)
+
+        assert profiler._finder not in sys.meta_path
+        assert "exec_module" not in vars(aura_fake_child.__loader__)
+        report = profiler.import_report(top=None)
+        assert report["enabled"] is False
+        assert {"aura_fake_child", "aura_fake_parent"} <= {r["module"] for r in report["modules"]}
+
+
+@pytest.mark.asyncio
+async def test_startup_endpoint_combines_import_and_model_report():
+    sys.modules.setdefault("database_supabase", __import__("unittest.mock").mock.MagicMock())
+    from routers.superadmin import get_startup_report
+
+    report = await get_startup_report(top=5, auth={"role": "superadmin"})
+    assert set(report) == {"imports", "model"}
+    assert len(report["imports"]["modules"]) <= 5
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_executor import (
+    InferenceExecutor, InferenceQueueFull, InferenceTimeout, InferenceUnavailable, run_inference
+)
+
+
+@pytest.mark.asyncio
+async def test_run_returns_result_off_the_loop():
+    executor = InferenceExecutor(workers=1, queue_size=1, timeout=5)
+    loop_thread = threading.get_ident()
+
+    result = await executor.run(lambda x: (x * 2, threading.get_ident()), 21)
+
+    assert result[0] == 42
+    assert result[1] != loop_thread
+    assert executor.stats()["completed"] == 1
+    executor.shutdown(1)
+
+
+@pytest.mark.asyncio
+async def test_exceptions_propagate():
+    executor = InferenceExecutor(workers=1, queue_size=0)
+
+    def boom():
+        raise ValueError("bad image")
+
+    with pytest.raises(ValueError):
+        await executor.run(boom)
+    assert executor.stats()["failed"] == 1
+    assert executor.stats()["pending"] == 0
+    executor.shutdown(1)
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_full():
+    executor = InferenceExecutor(workers=1, queue_size=1, timeout=5)
+    release = threading.Event()
+
+    running = asyncio.ensure_future(executor.run(release.wait))
+    queued = asyncio.ensure_future(executor.run(release.wait))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(InferenceQueueFull):
+        await executor.run(lambda: None)
+    assert executor.stats()["rejected"] == 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+    executor.shutdown(1)
+
+
+@pytest.mark.asyncio
+async def test_timeout_keeps_slot_until_job_finishes():
+    executor = InferenceExecutor(workers=1, queue_size=0, timeout=0.05)
+    release = threading.Event()
+
+    with pytest.raises(InferenceTimeout):
+        await executor.run(release.wait)
+
+    # The timed-out job is still running and still occupies the only slot
+    with pytest.raises(InferenceQueueFull):
+        await executor.run(lambda: None)
+
+    release.set()
+    assert executor.shutdown(1) is True
+    assert executor.stats()["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_shutdown_drains_then_refuses():
+    executor = InferenceExecutor(workers=1, queue_size=1, timeout=5)
+    job = asyncio.ensure_future(executor.run(time.sleep, 0.1))
+    await asyncio.sleep(0.01)
+
+    drained = await asyncio.to_thread(executor.shutdown, 2)
+
+    assert drained is True
+    await job
+    with pytest.raises(InferenceUnavailable):
+        await executor.run(lambda: None)
+
+
+@pytest.mark.asyncio
+async def test_run_inference_maps_backpressure_to_http():
+    class Full:
+        async def run(self, fn, *args, **kwargs):
+            raise InferenceQueueFull("full")
+
+    class Slow:
+        async def run(self, fn, *args, **kwargs):
+            raise InferenceTimeout("slow")
+
+    with patch("inference_executor._executor", Full()):
+        with pytest.raises(HTTPException) as exc_info:
+            await run_inference(lambda: None)
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers["Retry-After"] == "1"
+
+    with patch("inference_executor._executor", Slow()):
+        with pytest.raises(HTTPException) as exc_info:
+            await run_inference(lambda: None)
+    assert exc_info.value.status_code == 503
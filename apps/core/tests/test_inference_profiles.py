@@ -0,0 +1,84 @@
+import os
+import sys
+from unittest.mock import patch
+
+import onnxruntime
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference_profiles
+from inference_profiles import (
+    get_profile, build_session_options, thread_candidates, load_tuning, save_tuning,
+    model_pack_name, model_version
+)
+
+
+class TestGetProfile:
+    def test_named_profile(self):
+        profile = get_profile("search-fast")
+        assert profile["name"] == "search-fast"
+        assert profile["det_size"] == (320, 320)
+        assert profile["allowed_modules"] == ["detection", "recognition"]
+
+    def test_default_profile(self):
+        assert get_profile()["name"] == inference_profiles.DEFAULT_PROFILE
+
+    def test_overrides_ignore_none(self):
+        profile = get_profile("scan-accurate", intra_op_threads=2, inter_op_threads=None)
+        assert profile["intra_op_threads"] == 2
+        assert profile["inter_op_threads"] == 0
+
+    def test_returns_copy(self):
+        get_profile("scan-accurate")["det_size"] = (1, 1)
+        assert inference_profiles.INFERENCE_PROFILES["scan-accurate"]["det_size"] == (640, 640)
+
+    def test_unknown_profile(self):
+        with pytest.raises(ValueError):
+            get_profile("does-not-exist")
+
+    def test_unknown_precision(self):
+        with pytest.raises(ValueError):
+            get_profile("scan-accurate", precision="fp16")
+
+    def test_int8_uses_quantized_pack(self):
+        assert model_pack_name(get_profile("scan-accurate", precision="fp32")) == "buffalo_l"
+        assert model_pack_name(get_profile("scan-accurate", precision="int8")) == "buffalo_l_int8"
+
+    def test_model_version_includes_det_size(self):
+        # Same pack, different detector size: embeddings aren't interchangeable
+        assert model_version(get_profile("scan-accurate")) != model_version(get_profile("search-fast"))
+        assert model_version(get_profile("search-fast", precision="int8")) == "buffalo_l_int8@320x320"
+
+
+class TestSessionOptions:
+    def test_maps_profile_fields(self):
+        profile = get_profile(
+            "scan-accurate", intra_op_threads=3, inter_op_threads=2,
+            graph_optimization="extended", execution_mode="parallel"
+        )
+        options = build_session_options(profile)
+
+        assert options.intra_op_num_threads == 3
+        assert options.inter_op_num_threads == 2
+        assert options.graph_optimization_level == onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        assert options.execution_mode == onnxruntime.ExecutionMode.ORT_PARALLEL
+
+    def test_zero_threads_keeps_ort_default(self):
+        options = build_session_options(get_profile("scan-accurate"))
+        assert options.intra_op_num_threads == 0
+
+
+class TestTuning:
+    def test_thread_candidates(self):
+        assert [c[0] for c in thread_candidates(6)] == [1, 2, 4, 6]
+        assert thread_candidates(1) == [(1, 1)]
+
+    def test_cache_roundtrip(self, tmp_path):
+        profile = get_profile("search-fast")
+        with patch("inference_profiles.TUNING_CACHE_PATH", str(tmp_path / "tuning.json")):
+            assert load_tuning(profile) is None
+            save_tuning(profile, {"intra_op_threads": 4, "inter_op_threads": 1})
+            assert load_tuning(profile)["intra_op_threads"] == 4
+            # Other profiles are tuned independently
+            assert load_tuning(get_profile("scan-accurate")) is None
@@ -0,0 +1,202 @@
+import os
+import sys
+import threading
+from unittest.mock import MagicMock, patch
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imaging import InvalidImage
+from inference_server import (
+    InferenceClient, InferenceServer, InferenceServerError, pack_images, unpack_images,
+    pack_embed_results, unpack_embed_results, pack_face_results, unpack_face_results
+)
+from micro_batcher import embed_images_batch
+
+
+def _jpeg(value=128, size=64):
+    ok, buf = cv2.imencode(".jpg", np.full((size, size, 3), value, dtype=np.uint8))
+    return buf.tobytes()
+
+
+def _fake_processor():
+    fp = MagicMock()
+    fp.model_version = "buffalo_l"
+    fp.profile = {"name": "scan-accurate"}
+    fp.get_embedding_from_image.side_effect = lambda img: [float(img[0, 0, 0])] * 4
+    fp.get_embeddings_batch.side_effect = lambda images: [
+        [] if img is None or img[0, 0, 0] < 10 else
+        [{"bbox": [0, 0, 10, 10], "score": 0.75, "embedding": [float(img[0, 0, 0])] * 4}]
+        for img in images
+    ]
+    fp.scan_file_hashed.side_effect = lambda path, tiled=None: ([
+        {"path": path, "embedding": [0.5] * 4, "photo_date": "2025-07-16"},
+        {"path": path, "embedding": [0.25] * 4, "photo_date": "2025-07-16"},
+    ], "ab" * 32)
+    return fp
+
+
+@pytest.fixture
+def server(tmp_path):
+    # AF_UNIX paths are length-limited, keep it short
+    srv = InferenceServer(_fake_processor(), str(tmp_path / "inf.sock"))
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def client(server):
+    c = InferenceClient(server.socket_path)
+    yield c
+    c.close()
+
+
+class TestProtocol:
+    def test_image_payload_round_trip(self):
+        blobs = [b"abc", b"", b"x" * 1000]
+        assert unpack_images(pack_images(blobs)) == blobs
+
+    def test_truncated_image_payload_is_rejected(self):
+        with pytest.raises(InferenceServerError):
+            unpack_images(pack_images([b"abcdef"])[:-2])
+
+    def test_embed_results_round_trip(self):
+        results = [[0.5, -1.0], None, InvalidImage("bad")]
+        decoded = unpack_embed_results(pack_embed_results(results), 3)
+        assert decoded[0] == [0.5, -1.0]
+        assert decoded[1] is None
+        assert isinstance(decoded[2], InvalidImage)
+
+    def test_face_results_round_trip(self):
+        faces = [
+            {"bbox": [1.0, 2.0, 30.0, 40.0], "score": 0.5, "embedding": [0.5, -1.0]},
+            {"bbox": [5.0, 5.0, 9.0, 9.0], "score": 0.25, "embedding": [2.0, 0.0]},
+        ]
+        decoded = unpack_face_results(pack_face_results([faces, [], InvalidImage("bad")]), 3)
+        assert decoded[0] == faces
+        assert decoded[1] == []
+        assert isinstance(decoded[2], InvalidImage)
+
+
+class TestSidecar:
+    def test_client_reports_server_model(self, client):
+        assert client.model_version == "buffalo_l"
+        assert client.profile["name"] == "scan-accurate"
+        assert client.warm_up() >= 0
+
+    def test_embed_batch_statuses(self, client):
+        results = client.embed_images([_jpeg(200), b"not an image", _jpeg(0)])
+        assert results[0] == pytest.approx([200.0] * 4, abs=2)
+        assert isinstance(results[1], InvalidImage)
+        assert results[2] is None
+
+    def test_embed_faces_returns_every_face(self, client):
+        results = client.embed_faces([_jpeg(200), b"not an image", _jpeg(0)])
+        assert len(results[0]) == 1
+        assert results[0][0]["bbox"] == [0, 0, 10, 10] and results[0][0]["score"] == 0.75
+        assert results[0][0]["embedding"] == pytest.approx([200.0] * 4, abs=2)
+        assert isinstance(results[1], InvalidImage)
+        assert results[2] == []
+
+    def test_single_image_from_array(self, client, server):
+        img = np.full((32, 32, 3), 77, dtype=np.uint8)
+        assert client.get_embedding_from_image(img) == [77.0] * 4
+        server.processor.get_embedding_from_image.assert_called_once()
+
+    def test_scan_file_runs_in_sidecar(self, client, server, tmp_path):
+        path = str(tmp_path / "group.jpg")
+        faces = client.scan_file(path, tiled=True)
+
+        server.processor.scan_file_hashed.assert_called_once_with(path, tiled=True)
+        assert [f["embedding"] for f in faces] == [[0.5] * 4, [0.25] * 4]
+        assert all(f["path"] == path and f["photo_date"] == "2025-07-16" for f in faces)
+
+    def test_scan_returns_content_hash(self, client, tmp_path):
+        faces, content_hash = client.scan_file_hashed(str(tmp_path / "group.jpg"))
+        assert len(faces) == 2 and content_hash == "ab" * 32
+
+    def test_iter_scan_uses_manifest(self, client, tmp_path):
+        for name in ("a.jpg", "b.jpg", "notes.txt"):
+            (tmp_path / name).write_bytes(b"x")
+        manifest = MagicMock()
+        manifest.needs_scan.side_effect = lambda p: p.endswith("b.jpg")
+
+        events = list(client.iter_scan(str(tmp_path), manifest=manifest))
+        assert [os.path.basename(e["path"]) for e in events] == ["b.jpg"]
+        assert events[0]["total"] == 1 and len(events[0]["faces"]) == 2
+        assert events[0]["content_hash"] == "ab" * 32
+
+    def test_server_errors_surface_to_client(self, client, server):
+        server.processor.scan_file_hashed.side_effect = RuntimeError("boom")
+        assert client.scan_file("/tmp/x.jpg") == []
+        with pytest.raises(InferenceServerError):
+            client._call(99)
+        # Connection is still usable afterwards
+        assert client.info()["model_version"] == "buffalo_l"
+
+    def test_concurrent_clients(self, client):
+        errors = []
+
+        def worker(value):
+            try:
+                assert client.embed_images([_jpeg(value)])[0][0] == pytest.approx(value, abs=2)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(50 + i * 10,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+
+    def test_client_reconnects_after_server_restart(self, tmp_path):
+        path = str(tmp_path / "r.sock")
+        first = InferenceServer(_fake_processor(), path)
+        threading.Thread(target=first.serve_forever, daemon=True).start()
+        c = InferenceClient(path)
+        first.shutdown()
+        first.server_close()
+        c._local.sock.shutdown(2)  # the old connection is gone
+
+        second = InferenceServer(_fake_processor(), path)
+        threading.Thread(target=second.serve_forever, daemon=True).start()
+        try:
+            assert c.info()["model_version"] == "buffalo_l"
+        finally:
+            c.close()
+            second.shutdown()
+            second.server_close()
+
+    def test_unreachable_sidecar_raises(self, tmp_path):
+        with pytest.raises(OSError):
+            InferenceClient(str(tmp_path / "missing.sock"))
+
+
+def test_micro_batcher_delegates_to_remote_client():
+    fp = MagicMock(spec=InferenceClient)
+    fp.embed_images.return_value = [[1.0], None]
+    # Spec'd on the client: local inference methods don't exist to be called
+    assert embed_images_batch(fp, [b"a", b"b"]) == [[1.0], None]
+    fp.embed_images.assert_called_once_with([b"a", b"b"])
+
+
+def test_get_processor_connects_to_sidecar(server):
+    import dependencies
+    state = {
+        "status": "idle", "error": None, "started_at": None,
+        "finished_at": None, "load_seconds": None, "warmup_ms": None,
+    }
+    with patch.object(dependencies, "processor", None), \
+         patch.object(dependencies, "_model_state", state), \
+         patch.object(dependencies, "INFERENCE_SOCKET", server.socket_path):
+        fp = dependencies.get_processor(timeout=5)
+        assert isinstance(fp, InferenceClient)
+        assert fp.model_version == "buffalo_l"
+        fp.close()
@@ -0,0 +1,224 @@
+import os
+import sys
+import asyncio
+import threading
+from unittest.mock import MagicMock, patch
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import EmbeddingCache
+from imaging import InvalidImage
+from micro_batcher import MicroBatcher, embed_faces_batch, embed_images_batch, embed_upload, embed_upload_faces
+
+
+def _jpeg(width=64, height=64):
+    _, data = cv2.imencode(".jpg", np.zeros((height, width, 3), dtype=np.uint8))
+    return data.tobytes()
+
+
+class Recorder:
+    """process_batch stand-in that records batch sizes and can be held open."""
+
+    def __init__(self):
+        self.batches = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        await self.gate.wait()
+        return [item * 10 for item in items]
+
+
+@pytest.mark.asyncio
+async def test_idle_request_dispatches_immediately():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch=8, max_wait_ms=5000)
+
+    result = await asyncio.wait_for(batcher.submit(1), timeout=1)
+
+    assert result == 10
+    assert recorder.batches == [[1]]
+    await batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_requests_queue_into_next_batch_while_busy():
+    recorder = Recorder()
+    recorder.gate.clear()
+    batcher = MicroBatcher(recorder, max_batch=8, max_wait_ms=50)
+
+    first = asyncio.ensure_future(batcher.submit(1))
+    await asyncio.sleep(0.01)  # first batch is now in flight
+    rest = [asyncio.ensure_future(batcher.submit(i)) for i in (2, 3, 4)]
+    await asyncio.sleep(0.01)
+    recorder.gate.set()
+
+    assert await first == 10
+    assert await asyncio.gather(*rest) == [20, 30, 40]
+    assert recorder.batches == [[1], [2, 3, 4]]
+    assert batcher.stats()["largest_batch"] == 3
+    await batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_max_batch_size_respected():
+    recorder = Recorder()
+    recorder.gate.clear()
+    batcher = MicroBatcher(recorder, max_batch=2, max_wait_ms=50)
+
+    busy = asyncio.ensure_future(batcher.submit(0))
+    await asyncio.sleep(0.01)
+    waiting = [asyncio.ensure_future(batcher.submit(i)) for i in (1, 2, 3)]
+    await asyncio.sleep(0.01)
+    recorder.gate.set()
+    await asyncio.gather(busy, *waiting)
+
+    assert all(len(batch) <= 2 for batch in recorder.batches)
+    assert sum(len(batch) for batch in recorder.batches) == 4
+    await batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_per_item_exceptions_and_batch_failures():
+    async def process(items):
+        if "explode" in items:
+            raise RuntimeError("batch failed")
+        return [ValueError("bad") if item == "bad" else item for item in items]
+
+    batcher = MicroBatcher(process, max_batch=4, max_wait_ms=0)
+
+    assert await batcher.submit("ok") == "ok"
+    with pytest.raises(ValueError):
+        await batcher.submit("bad")
+    with pytest.raises(RuntimeError):
+        await batcher.submit("explode")
+    await batcher.close()
+
+
+class TestEmbedImagesBatch:
+    def test_single_image_uses_unbatched_path(self):
+        fp = MagicMock()
+        fp.get_embedding_from_image.return_value = [0.5] * 512
+
+        assert embed_images_batch(fp, [_jpeg()]) == [[0.5] * 512]
+        fp.get_embeddings_batch.assert_not_called()
+
+    def test_batch_picks_largest_face_and_flags_bad_input(self):
+        fp = MagicMock()
+        fp.get_embeddings_batch.return_value = [
+            [
+                {"bbox": [0, 0, 10, 10], "score": 0.9, "embedding": [1.0]},
+                {"bbox": [0, 0, 30, 30], "score": 0.8, "embedding": [2.0]},
+            ],
+            [],
+            [],
+        ]
+
+        results = embed_images_batch(fp, [_jpeg(), _jpeg(), b"garbage"])
+
+        assert results[0] == [2.0]
+        assert results[1] is None
+        assert isinstance(results[2], InvalidImage)
+        fp.get_embeddings_batch.assert_called_once()
+
+    def test_single_invalid_image(self):
+        results = embed_images_batch(MagicMock(), [b"garbage"])
+        assert isinstance(results[0], InvalidImage)
+
+
+class TestEmbedFacesBatch:
+    def test_every_face_largest_first(self):
+        fp = MagicMock()
+        small = {"bbox": [0, 0, 10, 10], "score": 0.9, "embedding": [1.0]}
+        large = {"bbox": [0, 0, 30, 30], "score": 0.8, "embedding": [2.0]}
+        fp.get_embeddings_batch.return_value = [[small, large], [], []]
+
+        results = embed_faces_batch(fp, [_jpeg(), _jpeg(), b"garbage"])
+
+        assert results[0] == [large, small]
+        assert results[1] == []
+        assert isinstance(results[2], InvalidImage)
+        fp.get_embeddings_batch.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_embed_upload_faces_batches_with_embed_upload():
+    fp = MagicMock()
+    fp.model_version = "buffalo_l"
+    face = {"bbox": [0, 0, 10, 10], "score": 0.9, "embedding": [0.1] * 512}
+    fp.get_embeddings_batch.side_effect = lambda images: [[face] for _ in images]
+    fp.get_embedding_from_image.return_value = [0.1] * 512
+
+    with patch("micro_batcher._batcher", None):
+        faces, embedding = await asyncio.gather(
+            embed_upload_faces(fp, _jpeg()), embed_upload(fp, _jpeg(), use_cache=False)
+        )
+
+    assert faces == [face]
+    assert embedding == [0.1] * 512
+
+
+@pytest.mark.asyncio
+async def test_embed_upload_uses_cache():
+    fp = MagicMock()
+    fp.model_version = "buffalo_l"
+    fp.get_embedding_from_image.return_value = [0.1] * 512
+
+    with patch("embedding_cache._cache", EmbeddingCache(max_entries=8)), \
+         patch("micro_batcher._batcher", None):
+        first = await embed_upload(fp, _jpeg())
+        second = await embed_upload(fp, _jpeg())
+        uncached = await embed_upload(fp, _jpeg(), use_cache=False)
+
+    assert first == second == uncached == [0.1] * 512
+    assert fp.get_embedding_from_image.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_embed_upload_skips_a_disabled_cache():
+    fp = MagicMock()
+    fp.model_version = "buffalo_l"
+    fp.get_embedding_from_image.return_value = [0.1] * 512
+
+    with patch("embedding_cache._cache", EmbeddingCache(max_entries=0)), \
+         patch("micro_batcher._batcher", None), \
+         patch("micro_batcher.cache_key") as key:
+        await embed_upload(fp, _jpeg())
+        await embed_upload(fp, _jpeg())
+
+    key.assert_not_called()
+    assert fp.get_embedding_from_image.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_embed_upload_keeps_disk_cache_off_the_loop(tmp_path):
+    fp = MagicMock()
+    fp.model_version = "buffalo_l"
+    fp.get_embedding_from_image.return_value = [0.1] * 512
+    cache = EmbeddingCache(max_entries=8, disk_path=str(tmp_path / "cache.db"))
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def record(fn):
+        def wrapper(*args):
+            threads.append(threading.get_ident())
+            return fn(*args)
+        return wrapper
+
+    with patch.object(cache, "get", record(cache.get)), \
+         patch.object(cache, "put", record(cache.put)), \
+         patch("embedding_cache._cache", cache), \
+         patch("micro_batcher._batcher", None):
+        first = await embed_upload(fp, _jpeg())
+        second = await embed_upload(fp, _jpeg())
+    cache.close()
+
+    assert first == second == [0.1] * 512
+    assert fp.get_embedding_from_image.call_count == 1
+    # get, put, get: none of them on the event loop thread
+    assert len(threads) == 3 and loop_thread not in threads
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Routers import database_supabase at module level
+sys.modules.setdefault("database_supabase", MagicMock())
+
+import dependencies
+from main import app
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    state = {
+        "status": "idle", "error": None, "started_at": None,
+        "finished_at": None, "load_seconds": None, "warmup_ms": None,
+    }
+    with patch.object(dependencies, "processor", None), \
+         patch.object(dependencies, "_model_state", state):
+        yield state
+
+
+def _wait_for(predicate, timeout=2):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestBackgroundLoading:
+    def test_loads_and_warms_up_in_background(self):
+        fp = MagicMock()
+        fp.warm_up.return_value = 12.5
+        with patch("processor.FaceProcessor", return_value=fp):
+            assert dependencies.start_model_loading() is True
+            assert _wait_for(lambda: dependencies.model_status()["status"] == "ready")
+
+        fp.warm_up.assert_called_once()
+        assert dependencies.get_processor() is fp
+        assert dependencies.model_status()["warmup_ms"] == 12.5
+
+    def test_second_start_is_noop_while_loading(self, fresh_state):
+        fresh_state["status"] = "loading"
+        assert dependencies.start_model_loading() is False
+
+    def test_failure_is_reported_and_retried_after_backoff(self):
+        with patch("processor.FaceProcessor", side_effect=RuntimeError("download failed")):
+            dependencies.start_model_loading()
+            assert _wait_for(lambda: dependencies.model_status()["status"] == "failed")
+
+            with pytest.raises(HTTPException) as exc_info:
+                dependencies.get_processor(timeout=0.1)
+            assert exc_info.value.status_code == 503
+            assert "download failed" in exc_info.value.detail
+
+            # Within the backoff window no new attempt is made
+            assert dependencies.start_model_loading() is False
+            with patch("dependencies.MODEL_RETRY_SECONDS", 0):
+                assert dependencies.start_model_loading() is True
+            assert _wait_for(lambda: dependencies.model_status()["status"] == "failed")
+
+    def test_get_processor_times_out_with_503(self, fresh_state):
+        release = threading.Event()
+
+        def slow_load():
+            release.wait(2)
+            raise RuntimeError("aborted")
+
+        with patch("processor.FaceProcessor", side_effect=slow_load):
+            with pytest.raises(HTTPException) as exc_info:
+                dependencies.get_processor(timeout=0.05)
+            release.set()
+
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers["Retry-After"] == "5"
+
+
+class TestProbes:
+    client = TestClient(app)
+
+    def test_ready_reports_loading_without_touching_model(self, fresh_state):
+        fresh_state["status"] = "loading"
+        with patch("processor.FaceProcessor") as mock_cls:
+            response = self.client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "loading"
+        mock_cls.assert_not_called()
+
+    def test_ready_ok_when_loaded(self, fresh_state):
+        fresh_state["status"] = "ready"
+        response = self.client.get("/ready")
+        assert response.status_code == 200
+
+    def test_health_does_not_load_model(self):
+        with patch("processor.FaceProcessor") as mock_cls:
+            response = self.client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["processor_loaded"] is False
+        mock_cls.assert_not_called()
+
+    def test_health_does_not_import_or_create_batcher(self):
+        with patch.dict(sys.modules, {"micro_batcher": None}):
+            # None in sys.modules makes any import of it fail
+            response = self.client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["micro_batch"] is None
+
+    def test_health_reports_created_batcher(self):
+        batcher = MagicMock()
+        batcher.stats.return_value = {"batches": 3}
+        module = MagicMock(_batcher=batcher)
+        with patch.dict(sys.modules, {"micro_batcher": module}):
+            response = self.client.get("/health")
+        assert response.json()["micro_batch"] == {"batches": 3}
+
+
+class TestCloseProcessor:
+    def test_closes_loaded_model(self):
+        fp = MagicMock()
+        with patch.object(dependencies, "processor", fp):
+            dependencies.close_processor()
+        fp.close.assert_called_once()
+
+    def test_nothing_loaded(self):
+        dependencies.close_processor()
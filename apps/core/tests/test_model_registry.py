@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+onnx = pytest.importorskip("onnx")
+onnxruntime = pytest.importorskip("onnxruntime")
+from onnx import helper, TensorProto
+
+import model_registry
+from model_registry import (
+    REGISTRY_FILE, ModelIntegrityError, bake_pack, resolve_model_dir, sha256_file, verify_pack
+)
+
+TASKS = {"det_10g.onnx": "detection", "w600k_r50.onnx": "recognition", "1k3d68.onnx": "landmark_3d_68"}
+
+
+def _tiny_model(path):
+    # y = (x + 1) + 1: constant folding has something to optimize
+    one = helper.make_tensor("one", TensorProto.FLOAT, [1], [1.0])
+    graph = helper.make_graph(
+        [helper.make_node("Add", ["x", "one"], ["h"]), helper.make_node("Add", ["h", "one"], ["y"])],
+        "tiny",
+        [helper.make_tensor_value_info("x", TensorProto.FLOAT, [1, 4])],
+        [helper.make_tensor_value_info("y", TensorProto.FLOAT, [1, 4])],
+        [one],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+@pytest.fixture
+def source_pack(tmp_path):
+    src = tmp_path / "insightface" / "models" / "buffalo_l"
+    src.mkdir(parents=True)
+    for name in TASKS:
+        _tiny_model(str(src / name))
+    with patch("insightface.utils.ensure_available", return_value=str(src)), \
+         patch("insightface.model_zoo.model_zoo.get_model",
+               side_effect=lambda path, **kw: SimpleNamespace(taskname=TASKS[os.path.basename(path)])):
+        yield src
+
+
+@pytest.fixture
+def baked(source_pack, tmp_path):
+    registry = tmp_path / "registry"
+    bake_pack("buffalo_l", str(registry))
+    return registry
+
+
+class TestBake:
+    def test_bakes_only_used_models_with_checksums(self, baked, source_pack):
+        pack_dir = baked / "buffalo_l"
+        entry = json.loads((pack_dir / REGISTRY_FILE).read_text())
+
+        assert sorted(entry["files"]) == ["det_10g.onnx", "w600k_r50.onnx"]
+        assert not (pack_dir / "1k3d68.onnx").exists()
+        assert entry["onnxruntime"] == onnxruntime.__version__
+        meta = entry["files"]["det_10g.onnx"]
+        assert meta["source_sha256"] == sha256_file(str(source_pack / "det_10g.onnx"))
+        assert meta["sha256"] == sha256_file(str(pack_dir / "det_10g.onnx"))
+
+    def test_baked_graph_runs_without_optimization(self, baked):
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        session = onnxruntime.InferenceSession(
+            str(baked / "buffalo_l" / "w600k_r50.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        out = session.run(None, {"x": np.zeros((1, 4), dtype=np.float32)})[0]
+        assert np.allclose(out, 2.0)
+
+    def test_pinned_checksum_mismatch_aborts(self, source_pack, tmp_path):
+        pinned = model_registry.pin_pack("buffalo_l")
+        with pytest.raises(ModelIntegrityError):
+            bake_pack("buffalo_l", str(tmp_path / "registry"), expected={**pinned, "det_10g.onnx": "0" * 64})
+        assert not (tmp_path / "registry").exists()
+
+    def test_file_without_pinned_checksum_aborts(self, source_pack, tmp_path):
+        pinned = model_registry.pin_pack("buffalo_l")
+        del pinned["w600k_r50.onnx"]
+        with pytest.raises(ModelIntegrityError, match="no pinned checksum"):
+            bake_pack("buffalo_l", str(tmp_path / "registry"), expected=pinned)
+
+    def test_pin_then_bake_from_cli(self, source_pack, tmp_path):
+        checksums = tmp_path / "checksums.json"
+        model_registry.main(["pin", "--pack", "buffalo_l", "--checksums", str(checksums)])
+        pinned = json.loads(checksums.read_text())
+        assert sorted(pinned["buffalo_l"]) == ["det_10g.onnx", "w600k_r50.onnx"]
+
+        registry = tmp_path / "registry"
+        model_registry.main([
+            "bake", "--pack", "buffalo_l", "--checksums", str(checksums), "--output", str(registry)
+        ])
+        assert (registry / "buffalo_l" / REGISTRY_FILE).exists()
+
+    def test_cli_rejects_unpinned_pack(self, source_pack, tmp_path):
+        checksums = tmp_path / "checksums.json"
+        checksums.write_text("{}")
+        with pytest.raises(ModelIntegrityError):
+            model_registry.main([
+                "bake", "--pack", "buffalo_l", "--checksums", str(checksums), "--output", str(tmp_path / "r")
+            ])
+
+
+class TestResolve:
+    def test_verified_pack_is_used(self, baked):
+        assert resolve_model_dir("buffalo_l", str(baked)) == str(baked / "buffalo_l")
+
+    def test_no_registry_or_pack_falls_back(self, baked):
+        with patch.object(model_registry, "MODEL_REGISTRY_DIR", None):
+            assert resolve_model_dir("buffalo_l") is None
+        assert resolve_model_dir("buffalo_s", str(baked)) is None
+
+    def test_truncated_file_falls_back(self, baked):
+        path = baked / "buffalo_l" / "det_10g.onnx"
+        path.write_bytes(path.read_bytes()[:-1])
+        assert resolve_model_dir("buffalo_l", str(baked), verify="size") is None
+
+    def test_full_verify_catches_same_size_corruption(self, baked):
+        path = baked / "buffalo_l" / "det_10g.onnx"
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xFF
+        path.write_bytes(bytes(data))
+
+        verify_pack(str(baked / "buffalo_l"), "size")
+        with pytest.raises(ModelIntegrityError):
+            verify_pack(str(baked / "buffalo_l"), "full")
+
+    def test_other_onnxruntime_version_falls_back(self, baked):
+        with patch.object(model_registry, "_ort_version", return_value="0.0.1"):
+            assert resolve_model_dir("buffalo_l", str(baked)) is None
+
+
+def _recognition_model(path, normalize_in_graph):
+    # 112x112 crop -> 16-d feature. MXNet-era graphs start with named
+    # Sub/Mul nodes, which is how ArcFaceONNX picks input_mean/input_std.
+    rng = np.random.default_rng(0)
+    init = [
+        helper.make_tensor("w", TensorProto.FLOAT, [4, 3, 8, 8], rng.standard_normal(4 * 3 * 8 * 8).tolist()),
+        helper.make_tensor("fc", TensorProto.FLOAT, [4 * 14 * 14, 16], rng.standard_normal(4 * 14 * 14 * 16).tolist()),
+    ]
+    nodes, x = [], "data"
+    if normalize_in_graph:
+        init += [
+            helper.make_tensor("mean", TensorProto.FLOAT, [1], [127.5]),
+            helper.make_tensor("scale", TensorProto.FLOAT, [1], [0.0078125]),
+        ]
+        nodes += [
+            helper.make_node("Sub", ["data", "mean"], ["centered"], name="Sub_0"),
+            helper.make_node("Mul", ["centered", "scale"], ["scaled"], name="Mul_1"),
+        ]
+        x = "scaled"
+    nodes += [
+        helper.make_node("Conv", [x, "w"], ["conv"], strides=[8, 8], name="Conv_2"),
+        helper.make_node("Flatten", ["conv"], ["flat"], name="Flatten_3"),
+        helper.make_node("MatMul", ["flat", "fc"], ["fc1"], name="MatMul_4"),
+    ]
+    graph = helper.make_graph(
+        nodes, "rec",
+        [helper.make_tensor_value_info("data", TensorProto.FLOAT, [1, 3, 112, 112])],
+        [helper.make_tensor_value_info("fc1", TensorProto.FLOAT, [1, 16])],
+        init,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+class TestBakedRecognition:
+    @pytest.mark.parametrize("normalize_in_graph", [True, False])
+    def test_baked_graph_keeps_arcface_preprocessing(self, tmp_path, normalize_in_graph):
+        # Graph optimization must not rename or fuse the leading Sub/Mul:
+        # ArcFaceONNX would switch input_mean/std and change every embedding
+        from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+
+        src, dst = str(tmp_path / "w600k_r50.onnx"), str(tmp_path / "baked.onnx")
+        _recognition_model(src, normalize_in_graph)
+        model_registry._optimize(src, dst, "extended")
+
+        stock, baked = ArcFaceONNX(src), ArcFaceONNX(dst)
+        crop = np.random.default_rng(1).integers(0, 255, size=(112, 112, 3), dtype=np.uint8)
+
+        assert (baked.input_mean, baked.input_std) == (stock.input_mean, stock.input_std)
+        assert np.allclose(baked.get_feat(crop), stock.get_feat(crop), rtol=1e-4, atol=1e-3)
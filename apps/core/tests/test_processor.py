@@ -5,9 +5,11 @@ import sys
 import os
 from datetime import datetime
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
+import processor as processor_module
 from processor import FaceProcessor
 
 @pytest.fixture
@@ -24,8 +26,12 @@ def mock_face_analysis():
 
 @pytest.fixture
 def mock_cv2():
-    with patch("processor.cv2") as mock_cv:
+    # Decoding lives in imaging.py; share one cv2 mock across both modules.
+    # Scans read raw bytes once (imaging.read_image_file) and imdecode them.
+    with patch("processor.cv2") as mock_cv, patch("imaging.cv2", mock_cv), \
+         patch("imaging.read_image_file", return_value=(b"", 1672531200.0)):
         mock_cv.imread.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
+        mock_cv.imdecode.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
         yield mock_cv
 
 class TestFaceProcessorInit:
@@ -46,6 +52,104 @@ class TestFaceProcessorInit:
         
         assert "Model load failed" in str(exc_info.value)
 
+class TestWarmUp:
+    def test_warm_up_runs_detection_and_recognition(self, mock_face_analysis):
+        _, app, _ = mock_face_analysis
+        rec = MagicMock()
+        rec.input_size = (112, 112)
+        app.models = {"recognition": rec}
+
+        processor = FaceProcessor(profile="search-fast")
+        elapsed = processor.warm_up()
+
+        frame = app.det_model.detect.call_args[0][0]
+        assert frame.shape == (320, 320, 3)
+        assert rec.get_feat.call_args[0][0][0].shape == (112, 112, 3)
+        assert elapsed >= 0
+
+
+class TestInferenceProfiles:
+    def test_profile_selects_modules_and_det_size(self, mock_face_analysis):
+        MockFaceAnalysis, app, _ = mock_face_analysis
+
+        processor = FaceProcessor(profile="search-fast")
+
+        kwargs = MockFaceAnalysis.call_args.kwargs
+        assert kwargs["name"] == "buffalo_l"
+        assert kwargs["allowed_modules"] == ["detection", "recognition"]
+        assert kwargs["sess_options"] is not None
+        assert app.prepare.call_args.kwargs["det_size"] == (320, 320)
+        assert processor.model_version == "buffalo_l@320x320"
+
+    def test_int8_precision_loads_quantized_pack(self, mock_face_analysis):
+        MockFaceAnalysis, _, _ = mock_face_analysis
+
+        processor = FaceProcessor(precision="int8")
+
+        assert MockFaceAnalysis.call_args.kwargs["name"] == "buffalo_l_int8"
+        assert processor.model_version == "buffalo_l_int8@640x640"
+
+    def test_baked_pack_loads_without_graph_optimization(self, mock_face_analysis):
+        import onnxruntime
+        MockFaceAnalysis, _, _ = mock_face_analysis
+
+        with patch("processor.resolve_model_dir", return_value="/registry/buffalo_l"):
+            processor = FaceProcessor()
+
+        kwargs = MockFaceAnalysis.call_args.kwargs
+        assert kwargs["name"] == "/registry/buffalo_l"
+        assert kwargs["sess_options"].graph_optimization_level == \
+            onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        assert processor.model_pack == "buffalo_l"
+        assert processor.load_timings["baked"] is True
+        assert {"resolve_ms", "sessions_ms", "prepare_ms"} <= set(processor.load_timings)
+
+    def test_explicit_threads_override_profile(self, mock_face_analysis):
+        MockFaceAnalysis, _, _ = mock_face_analysis
+
+        FaceProcessor(intra_op_threads=2)
+
+        assert MockFaceAnalysis.call_args.kwargs["sess_options"].intra_op_num_threads == 2
+
+    def test_autotune_uses_cached_result(self, mock_face_analysis):
+        MockFaceAnalysis, _, _ = mock_face_analysis
+
+        with patch("processor.load_tuning", return_value={"intra_op_threads": 3, "inter_op_threads": 1}), \
+             patch("processor.autotune_profile") as mock_tune:
+            processor = FaceProcessor(autotune=True)
+
+        mock_tune.assert_not_called()
+        assert processor.profile["intra_op_threads"] == 3
+
+    def test_autotune_profile_picks_fastest(self, mock_face_analysis):
+        from processor import autotune_profile
+        from inference_profiles import get_profile
+
+        built = []
+        real_init = FaceProcessor.__init__
+
+        def tracking_init(self, *args, **kwargs):
+            real_init(self, *args, **kwargs)
+            built.append(kwargs["intra_op_threads"])
+
+        # Fake clock: the 2-thread candidate is fastest
+        durations = {1: 0.4, 2: 0.1, 4: 0.3}
+        clock = {"t": 0.0}
+
+        def perf_counter():
+            clock["t"] += durations[built[-1]] / 2 if built else 0
+            return clock["t"]
+
+        with patch.object(FaceProcessor, "__init__", tracking_init), \
+             patch("processor.thread_candidates", return_value=[(1, 1), (2, 1), (4, 1)]), \
+             patch("processor.time.perf_counter", side_effect=perf_counter), \
+             patch("processor.save_tuning") as mock_save:
+            result = autotune_profile(get_profile("search-fast"), runs=1)
+
+        assert built == [1, 2, 4]
+        assert result["intra_op_threads"] == 2
+        mock_save.assert_called_once()
+
 class TestGetEmbedding:
     def test_get_embedding_success(self, mock_face_analysis, mock_cv2):
         processor = FaceProcessor()
@@ -158,6 +262,24 @@ class TestGetPhotoDate:
         today = datetime.now().strftime("%Y-%m-%d")
         assert date == today
 
+    def test_get_photo_date_from_image_info(self, mock_face_analysis):
+        processor = FaceProcessor()
+
+        with patch("PIL.Image.open") as mock_open:
+            date = processor.get_photo_date("test.jpg", image_info={"date_time_original": "2023:07:16 18:54:03"})
+            mock_open.assert_not_called()
+
+        assert date == "2023-07-16"
+
+    def test_get_photo_date_image_info_falls_back_to_mtime(self, mock_face_analysis):
+        processor = FaceProcessor()
+
+        with patch("os.path.getmtime") as mock_mtime:
+            date = processor.get_photo_date("test.jpg", image_info={"mtime": 1672531200})
+            mock_mtime.assert_not_called()
+
+        assert "2023" in date
+
     def test_get_photo_date_no_exif_data(self, mock_face_analysis):
         processor = FaceProcessor()
         
@@ -201,6 +323,7 @@ class TestScanDirectory:
 
     def test_scan_directory_image_read_fail(self, mock_face_analysis, mock_cv2):
         mock_cv2.imread.return_value = None
+        mock_cv2.imdecode.return_value = None
         
         processor = FaceProcessor()
         
@@ -266,3 +389,232 @@ class TestScanDirectory:
                 results = processor.scan_directory("/photos")
         
         assert len(results) == 1
+
+class TestGetEmbeddingsBatch:
+    @pytest.fixture
+    def batch_app(self, mock_face_analysis):
+        _, app, _ = mock_face_analysis
+
+        def detect(img, max_num=0, metric="default"):
+            # One face per frame, two faces for wide frames
+            n = 2 if img.shape[1] > 200 else 1
+            bboxes = np.array([[10, 10, 60, 60, 0.9]] * n, dtype=np.float32)
+            kpss = np.array([[[20, 20], [40, 20], [30, 30], [22, 45], [38, 45]]] * n, dtype=np.float32)
+            return bboxes, kpss
+
+        rec = MagicMock()
+        rec.input_size = (112, 112)
+        rec.get_feat.side_effect = lambda crops: np.ones((len(crops), 512), dtype=np.float32)
+
+        app.det_model.detect.side_effect = detect
+        app.models = {"recognition": rec}
+        return app, rec
+
+    def test_batch_groups_faces_per_image(self, batch_app):
+        processor = FaceProcessor()
+        images = [np.zeros((100, 100, 3), dtype=np.uint8), np.zeros((100, 300, 3), dtype=np.uint8)]
+
+        results = processor.get_embeddings_batch(images)
+
+        assert len(results) == 2
+        assert len(results[0]) == 1
+        assert len(results[1]) == 2
+        face = results[1][0]
+        assert face["bbox"] == [10.0, 10.0, 60.0, 60.0]
+        assert abs(face["score"] - 0.9) < 1e-6
+        # Embeddings are L2-normalised
+        assert abs(np.linalg.norm(face["embedding"]) - 1.0) < 1e-5
+
+    def test_batch_runs_single_recognition_call(self, batch_app):
+        _, rec = batch_app
+        processor = FaceProcessor()
+        images = [np.zeros((100, 100, 3), dtype=np.uint8)] * 4
+
+        processor.get_embeddings_batch(images)
+
+        rec.get_feat.assert_called_once()
+        assert len(rec.get_feat.call_args[0][0]) == 4
+
+    def test_batch_chunks_recognition(self, batch_app):
+        _, rec = batch_app
+        processor = FaceProcessor()
+        images = [np.zeros((100, 100, 3), dtype=np.uint8)] * 5
+
+        with patch("processor.REC_BATCH_SIZE", 2):
+            results = processor.get_embeddings_batch(images)
+
+        assert rec.get_feat.call_count == 3
+        assert all(len(r) == 1 for r in results)
+
+    def test_batch_skips_missing_and_faceless_images(self, batch_app):
+        app, rec = batch_app
+        processor = FaceProcessor()
+        app.det_model.detect.side_effect = lambda img, **kw: (np.zeros((0, 5)), None)
+
+        results = processor.get_embeddings_batch([None, np.zeros((50, 50, 3), dtype=np.uint8)])
+
+        assert results == [[], []]
+        rec.get_feat.assert_not_called()
+
+class TestTiledDetection:
+    @pytest.fixture
+    def tile_app(self, mock_face_analysis):
+        _, app, _ = mock_face_analysis
+
+        def detect(img, max_num=0, metric="default"):
+            # One face near the top-left corner of every region
+            bboxes = np.array([[10, 10, 60, 60, 0.9]], dtype=np.float32)
+            kpss = np.array([[[20, 20], [40, 20], [30, 30], [22, 45], [38, 45]]], dtype=np.float32)
+            return bboxes, kpss
+
+        rec = MagicMock()
+        rec.input_size = (112, 112)
+        rec.get_feat.side_effect = lambda crops: np.ones((len(crops), 512), dtype=np.float32)
+
+        app.det_model.detect.side_effect = detect
+        app.models = {"recognition": rec}
+        return app, rec
+
+    def test_tiles_offset_and_merge(self, tile_app):
+        app, _ = tile_app
+        processor = FaceProcessor()
+        img = np.zeros((1000, 2000, 3), dtype=np.uint8)
+
+        with patch("processor.tile_grid", return_value=[(0, 0, 1000, 1000), (1000, 0, 2000, 1000)]):
+            bboxes, kpss = processor.detect_tiled(img)
+
+        # Global pass + 2 tiles; the global and first-tile hits are the same face
+        assert app.det_model.detect.call_count == 3
+        assert len(bboxes) == 2
+        assert sorted(bboxes[:, 0].tolist()) == [10.0, 1010.0]
+        right = int(np.argmax(bboxes[:, 0]))
+        assert kpss[right][0].tolist() == [1020.0, 20.0]
+
+    def test_single_tile_uses_plain_detection(self, tile_app):
+        app, _ = tile_app
+        processor = FaceProcessor()
+
+        bboxes, _ = processor.detect_tiled(np.zeros((500, 500, 3), dtype=np.uint8))
+
+        app.det_model.detect.assert_called_once()
+        assert len(bboxes) == 1
+        assert processor._tile_pool is None
+
+    def test_close_shuts_down_tile_threads(self, tile_app):
+        processor = FaceProcessor()
+        with patch("processor.tile_grid", return_value=[(0, 0, 1000, 1000), (1000, 0, 2000, 1000)]):
+            processor.detect_tiled(np.zeros((1000, 2000, 3), dtype=np.uint8))
+        pool = processor._tile_pool
+
+        processor.close()
+
+        assert processor._tile_pool is None
+        assert pool._shutdown
+        processor.close()  # idempotent
+
+    def test_no_faces_in_any_tile(self, tile_app):
+        app, _ = tile_app
+        processor = FaceProcessor()
+        app.det_model.detect.side_effect = lambda img, **kw: (np.zeros((0, 5)), None)
+
+        with patch("processor.tile_grid", return_value=[(0, 0, 10, 10), (10, 0, 20, 10)]):
+            assert processor.detect_tiled(np.zeros((10, 20, 3), dtype=np.uint8)) == (None, None)
+
+    def test_batch_recognizes_only_survivors(self, tile_app):
+        _, rec = tile_app
+        processor = FaceProcessor()
+        img = np.zeros((1000, 2000, 3), dtype=np.uint8)
+
+        with patch("processor.tile_grid", return_value=[(0, 0, 1000, 1000), (1000, 0, 2000, 1000)]):
+            results = processor.get_embeddings_batch([img], tiled=True)
+
+        assert len(results[0]) == 2
+        assert len(rec.get_feat.call_args[0][0]) == 2
+
+    def test_tiled_scan_file_decodes_at_tiled_max_dim(self, tile_app, mock_cv2):
+        app, _ = tile_app
+        processor = FaceProcessor()
+
+        with patch("processor.ingest_image_file",
+                   return_value=(np.zeros((100, 100, 3), dtype=np.uint8), {"mtime": 1672531200.0})) as mock_ingest:
+            faces = processor.scan_file("/photos/group.jpg", tiled=True)
+
+        assert mock_ingest.call_args[0][1] == processor_module.TILED_MAX_DIM
+        assert len(faces) == 1
+        app.get.assert_not_called()
+
+
+class TestIterScan:
+    def test_iter_scan_yields_every_file_with_progress(self, mock_face_analysis, mock_cv2):
+        _, app, face = mock_face_analysis
+        # Second image has no faces but must still be reported
+        app.get.side_effect = [[face], [], [face, face]]
+
+        processor = FaceProcessor()
+
+        with patch("os.walk", return_value=[("/photos", [], ["a.jpg", "b.jpg", "c.jpg"])]), \
+             patch.object(processor, "get_photo_date", return_value="2023-01-01"):
+            events = list(processor.iter_scan("/photos"))
+
+        assert [e["index"] for e in events] == [1, 2, 3]
+        assert all(e["total"] == 3 for e in events)
+        assert [len(e["faces"]) for e in events] == [1, 0, 2]
+
+    def test_iter_scan_is_lazy(self, mock_face_analysis, mock_cv2):
+        _, app, _ = mock_face_analysis
+        processor = FaceProcessor()
+
+        with patch("os.walk", return_value=[("/photos", [], ["a.jpg", "b.jpg"])]), \
+             patch.object(processor, "get_photo_date", return_value="2023-01-01"):
+            events = processor.iter_scan("/photos")
+            next(events)
+            assert app.get.call_count == 1
+
+    def test_iter_scan_skips_unchanged_files(self, mock_face_analysis, mock_cv2):
+        processor = FaceProcessor()
+        manifest = MagicMock()
+        manifest.needs_scan.side_effect = lambda path: path.endswith("new.jpg")
+
+        with patch("os.walk", return_value=[("/photos", [], ["new.jpg", "old.jpg"])]), \
+             patch.object(processor, "get_photo_date", return_value="2023-01-01"):
+            events = list(processor.iter_scan("/photos", manifest=manifest))
+
+        assert [e["path"] for e in events] == ["/photos/new.jpg"]
+        assert events[0]["total"] == 1
+
+class TestParallelScan:
+    class InlinePool(ThreadPoolExecutor):
+        """Thread-backed stand-in for ProcessPoolExecutor (models are mocked)."""
+        def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+            super().__init__(max_workers, initializer=initializer, initargs=initargs)
+
+    def test_parallel_scan_matches_serial_order(self, mock_face_analysis, mock_cv2):
+        processor = FaceProcessor()
+        walk = [
+            ("/photos", ["sub"], ["b.jpg", "a.jpg"]),
+            ("/photos/sub", [], ["c.png"])
+        ]
+
+        with patch("os.walk", return_value=walk), \
+             patch.object(FaceProcessor, "get_photo_date", return_value="2023-01-01"), \
+             patch("processor.os.cpu_count", return_value=4):
+            serial = processor.scan_directory("/photos", workers=1)
+            with patch("processor.ProcessPoolExecutor", self.InlinePool):
+                parallel = processor.scan_directory("/photos", workers=3)
+
+        assert [r["path"] for r in parallel] == [r["path"] for r in serial]
+        assert [r["path"] for r in parallel] == ["/photos/a.jpg", "/photos/b.jpg", "/photos/sub/c.png"]
+
+    def test_parallel_scan_workers_get_thread_budget(self, mock_face_analysis, mock_cv2):
+        processor = FaceProcessor()
+        walk = [("/photos", [], ["1.jpg", "2.jpg", "3.jpg"])]
+
+        with patch("os.walk", return_value=walk), \
+             patch.object(FaceProcessor, "get_photo_date", return_value="2023-01-01"), \
+             patch("processor.os.cpu_count", return_value=8), \
+             patch("processor.ProcessPoolExecutor", self.InlinePool), \
+             patch("processor._init_scan_worker", wraps=processor_module._init_scan_worker) as init:
+            results = processor.scan_directory("/photos", workers=2)
+
+        assert len(results) == 3
+        assert init.call_args[0] == (4,)
@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import processor_pool
+from processor_pool import PoolTimeout, ProcessorPool, create_processor
+
+
+def _replica(name="r"):
+    fp = MagicMock(name=name)
+    fp.model_version = "buffalo_l"
+    fp.profile = {"name": "search-fast"}
+    return fp
+
+
+class TestCheckout:
+    def test_replicas_are_exclusive(self):
+        pool = ProcessorPool([_replica("a"), _replica("b")])
+        with pool.checkout() as first, pool.checkout() as second:
+            assert first is not second
+            assert pool.stats()["busy"] == 2
+        assert pool.stats()["busy"] == 0
+
+    def test_times_out_when_exhausted(self):
+        pool = ProcessorPool([_replica()])
+        with pool.checkout():
+            with pytest.raises(PoolTimeout):
+                with pool.checkout(timeout=0.05):
+                    pass
+        assert pool.stats()["timeouts"] == 1
+
+    def test_waiters_get_replica_back_and_wait_is_measured(self):
+        pool = ProcessorPool([_replica()])
+        got = []
+
+        def waiter():
+            with pool.checkout(timeout=2) as fp:
+                got.append(fp)
+
+        with pool.checkout():
+            t = threading.Thread(target=waiter)
+            t.start()
+            time.sleep(0.05)
+        t.join()
+
+        stats = pool.stats()
+        assert got == pool.replicas
+        assert stats["checkouts"] == 2 and stats["waited"] == 1
+        assert stats["max_wait_ms"] >= 40
+        assert 0 < stats["utilisation"] <= 1
+
+    def test_replica_returned_on_error(self):
+        pool = ProcessorPool([_replica()])
+        with pytest.raises(RuntimeError):
+            with pool.checkout():
+                raise RuntimeError("inference failed")
+        assert pool.stats()["busy"] == 0
+
+    def test_empty_pool_rejected(self):
+        with pytest.raises(ValueError):
+            ProcessorPool([])
+
+
+class TestProcessorInterface:
+    def test_calls_run_concurrently_on_separate_replicas(self):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow_embed(img):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return [1.0]
+
+        replicas = [_replica(str(i)) for i in range(3)]
+        for r in replicas:
+            r.get_embedding_from_image.side_effect = slow_embed
+        pool = ProcessorPool(replicas)
+
+        threads = [threading.Thread(target=pool.get_embedding_from_image, args=(None,)) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert peak[0] == 3
+        assert sum(r.get_embedding_from_image.call_count for r in replicas) == 6
+
+    def test_serial_iter_scan_checks_out_per_file(self):
+        replica = _replica()
+        replica.list_images.return_value = ["a", "b"]
+        replica.scan_file_hashed.side_effect = lambda path, tiled=None: ([{"path": path}], "h-" + path)
+        manifest = MagicMock()
+        manifest.needs_scan.return_value = True
+        pool = ProcessorPool([replica])
+
+        events = pool.iter_scan("/photos", workers=1, manifest=manifest, tiled=True)
+        first = next(events)
+        assert first["path"] == "a" and first["content_hash"] == "h-a" and first["total"] == 2
+        # Nothing is held between files
+        assert pool.stats()["busy"] == 0
+        assert [e["path"] for e in events] == ["b"]
+        replica.scan_file_hashed.assert_called_with("b", tiled=True)
+
+    def test_parallel_iter_scan_takes_no_replica(self):
+        replica = _replica()
+        replica.list_images.return_value = ["a", "b"]
+        pool = ProcessorPool([replica])
+
+        def scan_parallel(paths, workers, tiled=None):
+            assert pool.stats()["busy"] == 0
+            return iter([([], None) for _ in paths])
+
+        with patch("processor._scan_parallel", side_effect=scan_parallel) as parallel:
+            assert [e["path"] for e in pool.iter_scan("/photos", workers=2)] == ["a", "b"]
+        parallel.assert_called_once_with(["a", "b"], 2, tiled=None)
+        replica.scan_file_hashed.assert_not_called()
+
+    def test_warm_up_covers_all_replicas(self):
+        replicas = [_replica(), _replica()]
+        replicas[0].warm_up.return_value = 5.0
+        replicas[1].warm_up.return_value = 9.0
+        assert ProcessorPool(replicas).warm_up() == 9.0
+
+    def test_close_covers_all_replicas(self):
+        replicas = [_replica(), _replica()]
+        ProcessorPool(replicas).close()
+        assert all(r.close.call_count == 1 for r in replicas)
+
+    def test_create_splits_threads(self):
+        factory = MagicMock(side_effect=lambda **kw: _replica())
+        with patch("os.cpu_count", return_value=8):
+            pool = ProcessorPool.create(4, factory=factory, profile="search-fast")
+        assert pool.size == 4
+        factory.assert_called_with(intra_op_threads=2, profile="search-fast")
+
+
+class TestCreateProcessor:
+    def test_single_processor_by_default(self):
+        with patch.object(processor_pool, "PROCESSOR_POOL_SIZE", 1), \
+             patch("processor.FaceProcessor") as face_processor:
+            assert create_processor() is face_processor.return_value
+
+    def test_pool_when_configured(self):
+        with patch.object(processor_pool, "PROCESSOR_POOL_SIZE", 2), \
+             patch.object(processor_pool, "PROCESSOR_POOL_THREADS", 3), \
+             patch("processor.FaceProcessor", side_effect=lambda **kw: _replica()) as face_processor:
+            pool = create_processor()
+        assert isinstance(pool, ProcessorPool) and pool.size == 2
+        face_processor.assert_called_with(intra_op_threads=3)
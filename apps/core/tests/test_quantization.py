@@ -0,0 +1,145 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import quantization
+from quantization import (
+    _BlobReader, detection_recall, match_set_overlap, compare_precisions, quantize_model_pack
+)
+
+
+def _unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def _mock_processor(boxes, feats):
+    fp = MagicMock()
+    kpss = np.zeros((len(boxes), 5, 2), dtype=np.float32)
+    fp.app.det_model.detect.return_value = (np.asarray(boxes, dtype=np.float32).reshape(-1, 5), kpss)
+    rec = fp.app.models.__getitem__.return_value
+    rec.input_size = (112, 112)
+    rec.get_feat.return_value = np.asarray(feats, dtype=np.float32)
+    return fp
+
+
+class TestDetectionRecall:
+    def test_counts_overlapping_boxes(self):
+        reference = np.array([[0, 0, 10, 10], [50, 50, 60, 60]], dtype=np.float32)
+        candidate = np.array([[1, 1, 10, 10]], dtype=np.float32)
+        assert detection_recall(reference, candidate) == 1
+
+    def test_empty_candidate(self):
+        reference = np.array([[0, 0, 10, 10]], dtype=np.float32)
+        assert detection_recall(reference, np.zeros((0, 4))) == 0
+
+
+class TestMatchSetOverlap:
+    def test_identical_embeddings_agree(self):
+        emb = _unit([[1, 0], [1, 0.1], [0, 1]])
+        result = match_set_overlap(emb, emb, 0.6)
+        assert result == {"mean_jaccard": 1.0, "flipped_pairs": 0.0}
+
+    def test_flipped_pair(self):
+        reference = _unit([[1, 0], [1, 0.1], [0, 1]])
+        candidate = _unit([[1, 0], [0.1, 1], [0, 1]])
+        result = match_set_overlap(reference, candidate, 0.6)
+        # Pair (0,1) stops matching and pair (1,2) starts matching
+        assert result["flipped_pairs"] == pytest.approx(2 / 3)
+        assert result["mean_jaccard"] == pytest.approx(0.0)
+
+    def test_single_face(self):
+        emb = _unit([[1, 0]])
+        assert match_set_overlap(emb, emb, 0.6)["mean_jaccard"] == 1.0
+
+
+class TestBlobReader:
+    def test_yields_feeds_then_none(self):
+        blob = np.zeros((1, 3, 4, 4), dtype=np.float32)
+        reader = _BlobReader("input.1", [blob])
+        assert reader.get_next()["input.1"] is blob
+        assert reader.get_next() is None
+
+
+class TestComparePrecisions:
+    @pytest.fixture(autouse=True)
+    def mock_image_io(self):
+        with patch("quantization.load_image", return_value=np.zeros((100, 100, 3), dtype=np.uint8)), \
+             patch("insightface.utils.face_align.norm_crop", return_value=np.zeros((112, 112, 3), dtype=np.uint8)):
+            yield
+
+    def test_report_fields(self):
+        boxes = [[0, 0, 50, 50, 0.9], [60, 60, 90, 90, 0.8]]
+        reference = _mock_processor(boxes, [[1, 0], [0, 1]])
+        candidate = _mock_processor(boxes[:1], [[0.99, 0.05], [0.05, 0.99]])
+
+        report = compare_precisions(["a.jpg"], reference, candidate, threshold=0.6)
+
+        assert report["faces"] == 2
+        assert report["candidate_faces"] == 1
+        assert report["detection_recall"] == 0.5
+        assert report["cosine"]["min"] > 0.99
+        assert report["match_overlap"]["flipped_pairs"] == 0.0
+        for name in ("reference", "candidate"):
+            assert set(report["latency_ms"][name]) == {"decode", "detect", "align", "recognize"}
+            assert report["latency_ms"][name]["detect"]["mean"] is not None
+
+    def test_recognition_uses_reference_crops(self):
+        boxes = [[0, 0, 50, 50, 0.9]]
+        reference = _mock_processor(boxes, [[1, 0]])
+        candidate = _mock_processor([], [[1, 0]])
+
+        report = compare_precisions(["a.jpg"], reference, candidate)
+
+        # INT8 detector found nothing, recognition is still compared
+        candidate.app.models["recognition"].get_feat.assert_called_once()
+        assert report["detection_recall"] == 0.0
+        assert report["cosine"]["mean"] == pytest.approx(1.0)
+
+    def test_unreadable_images_skipped(self):
+        reference = _mock_processor([], [])
+        candidate = _mock_processor([], [])
+        with patch("quantization.load_image", return_value=None):
+            report = compare_precisions(["bad.jpg"], reference, candidate)
+        assert report["faces"] == 0
+        assert "cosine" not in report
+
+
+class TestQuantizeModelPack:
+    def test_static_requires_calibration_dir(self):
+        with pytest.raises(ValueError):
+            quantize_model_pack(mode="static")
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            quantize_model_pack(mode="fp16")
+
+    def test_dynamic_writes_int8_pack(self, tmp_path):
+        src_dir = tmp_path / "src"
+        src_dir.mkdir()
+        for name in ("det_10g.onnx", "w600k_r50.onnx", "1k3d68.onnx"):
+            (src_dir / name).write_bytes(b"model")
+
+        fp = MagicMock()
+        fp.profile = {"model_pack": "buffalo_l", "precision": "fp32"}
+        fp.app.det_model.model_file = str(src_dir / "det_10g.onnx")
+        fp.app.models = {"recognition": MagicMock(model_file=str(src_dir / "w600k_r50.onnx"))}
+
+        def fake_quantize(src, dst, **kwargs):
+            with open(dst, "wb") as f:
+                f.write(b"int8")
+
+        with patch("processor.FaceProcessor", return_value=fp), \
+             patch("onnxruntime.quantization.quantize_dynamic", side_effect=fake_quantize) as mock_q:
+            out_dir = quantize_model_pack(mode="dynamic", output_root=str(tmp_path))
+
+        assert out_dir == str(tmp_path / "models" / "buffalo_l_int8")
+        assert mock_q.call_count == 2
+        assert (tmp_path / "models" / "buffalo_l_int8" / "det_10g.onnx").read_bytes() == b"int8"
+        # Unquantized modules are copied so the pack is self-contained
+        assert (tmp_path / "models" / "buffalo_l_int8" / "1k3d68.onnx").read_bytes() == b"model"
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scan_manifest import ScanManifest, file_hash
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "img.jpg"
+    path.write_bytes(b"original image bytes")
+    return str(path)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    m = ScanManifest("org-1", "buffalo_l", db_path=str(tmp_path / "manifest.db"))
+    yield m
+    m.close()
+
+
+class TestScanManifest:
+    def test_new_file_needs_scan(self, manifest, photo):
+        assert manifest.needs_scan(photo) is True
+
+    def test_recorded_file_is_skipped(self, manifest, photo):
+        manifest.record(photo, 2)
+
+        assert manifest.needs_scan(photo) is False
+        assert manifest.skipped == 1
+        entry = manifest.get(photo)
+        assert entry["face_count"] == 2
+        assert entry["content_hash"] == file_hash(photo)
+
+    def test_negative_entry_is_skipped(self, manifest, photo):
+        manifest.record(photo, 0)
+        assert manifest.needs_scan(photo) is False
+
+    def test_modified_file_needs_scan(self, manifest, photo):
+        manifest.record(photo, 1)
+        with open(photo, "wb") as f:
+            f.write(b"edited image bytes, longer")
+
+        assert manifest.needs_scan(photo) is True
+
+    def test_touched_file_with_same_content_is_skipped(self, manifest, photo):
+        manifest.record(photo, 1)
+        new_mtime = time.time() + 100
+        os.utime(photo, (new_mtime, new_mtime))
+
+        assert manifest.needs_scan(photo) is False
+        # mtime refreshed so the next check takes the fast path
+        assert manifest.get(photo)["mtime"] == os.stat(photo).st_mtime
+
+    def test_model_change_needs_scan(self, tmp_path, manifest, photo):
+        manifest.record(photo, 1)
+        other = ScanManifest("org-1", "antelopev2", db_path=manifest.db_path)
+
+        assert other.needs_scan(photo) is True
+        other.close()
+
+    def test_entries_are_scoped_per_org(self, manifest, photo):
+        manifest.record(photo, 1)
+        other = ScanManifest("org-2", "buffalo_l", db_path=manifest.db_path)
+
+        assert other.needs_scan(photo) is True
+        other.close()
+
+    def test_record_uses_given_hash_without_reading(self, manifest, photo):
+        with patch("scan_manifest.file_hash") as mock_hash:
+            manifest.record(photo, 1, "scanned-hash")
+
+        mock_hash.assert_not_called()
+        assert manifest.get(photo)["content_hash"] == "scanned-hash"
+
+    def test_record_many_skips_missing_files(self, manifest, photo):
+        written = manifest.record_many([(photo, 1), ("/nonexistent/x.jpg", 0)])
+        assert written == 1
+
+    def test_forget(self, manifest, photo):
+        manifest.record(photo, 1)
+        manifest.forget(photo)
+        assert manifest.get(photo) is None
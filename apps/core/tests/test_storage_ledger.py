@@ -0,0 +1,137 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage_ledger import GB, StorageLedger, StorageQuotaExceeded
+
+
+class FakeOrgs:
+    """organizations table stand-in with an atomic increment."""
+
+    def __init__(self, orgs, fail=False):
+        self.orgs = orgs
+        self.fail = fail
+        self.increments = []
+        self.fetches = 0
+
+    def increment(self, org_id, delta):
+        if self.fail:
+            return False
+        self.increments.append((org_id, delta))
+        self.orgs[org_id]["storage_used_bytes"] += delta
+        return True
+
+    def fetch(self, org_ids):
+        self.fetches += 1
+        return {o: dict(self.orgs[o]) for o in org_ids if o in self.orgs}
+
+
+def _ledger(db, **kwargs):
+    kwargs.setdefault("interval_ms", 60000)
+    return StorageLedger(db.increment, db.fetch, **kwargs)
+
+
+def test_deltas_coalesce_into_one_increment_per_org():
+    db = FakeOrgs({"a": {"storage_limit_gb": 5, "storage_used_bytes": 0},
+                   "b": {"storage_limit_gb": 5, "storage_used_bytes": 0}})
+    ledger = _ledger(db)
+
+    for _ in range(100):
+        ledger.add("a", 10)
+    ledger.add("b", 7)
+
+    assert ledger.flush() == 2
+    assert sorted(db.increments) == [("a", 1000), ("b", 7)]
+    assert ledger.stats()["pending_bytes"] == 0
+    ledger.close()
+
+
+def test_failed_increment_is_kept_and_retried():
+    db = FakeOrgs({"a": {"storage_limit_gb": 5, "storage_used_bytes": 0}}, fail=True)
+    ledger = _ledger(db)
+    ledger.add("a", 100)
+
+    assert ledger.flush() == 0
+    ledger.add("a", 50)
+    db.fail = False
+
+    assert ledger.flush() == 1
+    assert db.increments == [("a", 150)]
+    ledger.close()
+
+
+def test_concurrent_adds_are_not_lost():
+    db = FakeOrgs({"a": {"storage_limit_gb": 5, "storage_used_bytes": 0}})
+    ledger = _ledger(db)
+
+    def upload():
+        for _ in range(500):
+            ledger.add("a", 1)
+
+    threads = [threading.Thread(target=upload) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ledger.close()
+
+    assert db.orgs["a"]["storage_used_bytes"] == 4000
+
+
+def test_quota_checks_use_the_cached_view():
+    db = FakeOrgs({"a": {"storage_limit_gb": 1, "storage_used_bytes": GB - 1000}})
+    ledger = _ledger(db)
+
+    ledger.check("a", 500)
+    ledger.add("a", 600)  # unflushed, but counted against the quota
+    with pytest.raises(StorageQuotaExceeded):
+        ledger.check("a", 500)
+
+    assert db.fetches == 1
+    assert ledger.stats()["rejected"] == 1
+    ledger.close()
+
+
+def test_refresh_keeps_unflushed_deltas():
+    db = FakeOrgs({"a": {"storage_limit_gb": 1, "storage_used_bytes": 100}})
+    ledger = _ledger(db, quota_ttl=0)
+    ledger.check("a")
+    ledger.add("a", 50)
+
+    ledger.refresh()
+
+    assert ledger.quota("a")["used_bytes"] == 150
+    ledger.close()
+
+
+def test_unknown_org_is_cached_without_limit():
+    db = FakeOrgs({})
+    ledger = _ledger(db)
+
+    ledger.check("ghost", 10 * GB)
+    ledger.check("ghost", 10 * GB)
+
+    assert db.fetches == 1
+    ledger.close()
+
+
+def test_close_flushes_pending():
+    db = FakeOrgs({"a": {"storage_limit_gb": 5, "storage_used_bytes": 0}})
+    ledger = _ledger(db)
+    ledger.add("a", 42)
+
+    assert ledger.close() == 1
+    assert db.orgs["a"]["storage_used_bytes"] == 42
+
+
+def test_quota_error_shows_fractional_limits():
+    db = FakeOrgs({"a": {"storage_limit_gb": 0.5, "storage_used_bytes": 0}})
+    ledger = _ledger(db)
+
+    with pytest.raises(StorageQuotaExceeded, match=r"\(0\.5 GB limit\)"):
+        ledger.check("a", GB)
+    ledger.close()
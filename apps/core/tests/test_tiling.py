@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiling import tile_grid, nms
+
+
+class TestTileGrid:
+    def test_small_frame_is_one_tile(self):
+        assert tile_grid(800, 600, tile=1024, overlap=192) == [(0, 0, 800, 600)]
+
+    def test_tiles_cover_frame_with_overlap(self):
+        tiles = tile_grid(3000, 2000, tile=1024, overlap=192, max_tiles=100)
+
+        xs = sorted({t[0] for t in tiles})
+        assert xs[0] == 0
+        assert max(t[2] for t in tiles) == 3000
+        assert max(t[3] for t in tiles) == 2000
+        # Neighbouring tiles overlap by at least the requested margin
+        assert all(b - a <= 1024 - 192 for a, b in zip(xs, xs[1:]))
+        assert all(t[2] - t[0] <= 1024 and t[3] - t[1] <= 1024 for t in tiles)
+
+    def test_max_tiles_grows_tile_size(self):
+        tiles = tile_grid(8000, 6000, tile=1024, overlap=192, max_tiles=6)
+        assert len(tiles) <= 6
+        assert max(t[2] for t in tiles) == 8000
+        assert max(t[3] for t in tiles) == 6000
+
+
+class TestNMS:
+    def test_suppresses_overlapping_lower_scores(self):
+        bboxes = np.array([
+            [0, 0, 100, 100, 0.8],
+            [5, 5, 100, 100, 0.9],
+            [200, 200, 250, 250, 0.7],
+        ], dtype=np.float32)
+        assert nms(bboxes, 0.4).tolist() == [1, 2]
+
+    def test_empty(self):
+        assert len(nms(np.zeros((0, 5), dtype=np.float32))) == 0
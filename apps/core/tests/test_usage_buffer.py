@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from usage_buffer import UsageBuffer
+
+
+class Sink:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self.written = threading.Event()
+
+    def __call__(self, rows):
+        if self.fail:
+            return False
+        self.batches.append(list(rows))
+        self.written.set()
+        return True
+
+
+def _event(i):
+    return {"org_id": "org1", "action": "search", "metadata": {"i": i}}
+
+
+def test_flushes_in_bulk_when_row_limit_reached():
+    sink = Sink()
+    buffer = UsageBuffer(sink, interval_ms=60000, max_rows=3, capacity=10)
+
+    for i in range(3):
+        assert buffer.add(_event(i))
+
+    assert sink.written.wait(2)
+    assert [[e["metadata"]["i"] for e in batch] for batch in sink.batches] == [[0, 1, 2]]
+    assert all("created_at" in e for e in sink.batches[0])
+    buffer.close()
+
+
+def test_flushes_on_interval():
+    sink = Sink()
+    buffer = UsageBuffer(sink, interval_ms=20, max_rows=100, capacity=100)
+
+    buffer.add(_event(0))
+
+    assert sink.written.wait(2)
+    assert buffer.stats()["flushed"] == 1
+    buffer.close()
+
+
+def test_capacity_bounds_memory_and_counts_drops():
+    sink = Sink(fail=True)
+    buffer = UsageBuffer(sink, interval_ms=60000, max_rows=2, capacity=4)
+
+    accepted = [buffer.add(_event(i)) for i in range(6)]
+    buffer.flush()
+
+    stats = buffer.stats()
+    assert accepted.count(False) >= 2
+    assert stats["pending"] <= 4
+    assert stats["dropped"] >= 2
+    assert stats["failed_flushes"] >= 1
+    buffer.close()
+
+
+def test_failed_batch_is_retried_in_order():
+    sink = Sink(fail=True)
+    buffer = UsageBuffer(sink, interval_ms=60000, max_rows=10, capacity=10)
+    buffer.add(_event(0))
+    buffer.add(_event(1))
+
+    assert buffer.flush() == 0
+    sink.fail = False
+    buffer.add(_event(2))
+
+    assert buffer.flush() == 3
+    assert [e["metadata"]["i"] for e in sink.batches[0]] == [0, 1, 2]
+    assert buffer.stats()["requeued"] == 2
+    buffer.close()
+
+
+def test_close_flushes_pending_and_rejects_new_events():
+    sink = Sink()
+    buffer = UsageBuffer(sink, interval_ms=60000, max_rows=100, capacity=100)
+    for i in range(5):
+        buffer.add(_event(i))
+
+    assert buffer.close() == 5
+    assert not buffer.add(_event(6))
+    assert buffer.stats()["dropped"] == 1
+
+
+def test_log_usage_is_buffered_without_a_round_trip(monkeypatch):
+    import usage_buffer
+    import database_supabase_async
+
+    sink = Sink()
+    monkeypatch.setattr(usage_buffer, "USAGE_BUFFER_ENABLED", True)
+    monkeypatch.setattr(usage_buffer, "_buffer", UsageBuffer(sink, interval_ms=60000))
+    monkeypatch.setattr(database_supabase_async, "_request", None)  # any HTTP call would fail
+
+    import asyncio
+    assert asyncio.run(database_supabase_async.log_usage("org1", "upload", bytes_processed=10))
+    assert usage_buffer.close_usage_buffer() == 1
+    assert sink.batches[0][0]["bytes_processed"] == 10
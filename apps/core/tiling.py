@@ -0,0 +1,94 @@
+"""
+Tiled Detection helpers for Aura Core.
+
+The detector letterboxes every frame into det_size (640x640), so a face
+that is 40 px wide in a 6000 px group shot shrinks to ~4 px and is missed.
+Tiling runs the detector on overlapping crops at close to native
+resolution, then merges the per-tile boxes with NMS.
+
+Cost is bounded: the grid never exceeds TILE_MAX_TILES detector passes
+(tiles grow instead), plus one whole-frame pass for faces larger than a
+tile.
+"""
+import os
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+# Tile edge in source pixels; each tile is letterboxed into det_size
+TILE_SIZE = int(os.getenv("TILE_SIZE", 1024))
+
+# Overlap between neighbouring tiles. Should exceed the largest face a tile
+# is expected to catch so every such face lies fully inside some tile.
+TILE_OVERLAP = int(os.getenv("TILE_OVERLAP", 192))
+
+# Upper bound on detector passes per image (excluding the global pass)
+TILE_MAX_TILES = int(os.getenv("TILE_MAX_TILES", 12))
+
+# Same IoU threshold SCRFD uses internally
+TILE_NMS_IOU = float(os.getenv("TILE_NMS_IOU", 0.4))
+
+
+def _axis_starts(length: int, tile: int, overlap: int) -> List[int]:
+    """Evenly spaced tile origins along one axis, last tile flush with the edge."""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    step = (length - tile) / (count - 1)
+    return [int(round(i * step)) for i in range(count)]
+
+
+def tile_grid(
+    width: int,
+    height: int,
+    tile: int = TILE_SIZE,
+    overlap: int = TILE_OVERLAP,
+    max_tiles: int = TILE_MAX_TILES
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Overlapping (x0, y0, x1, y1) tiles covering a width x height frame.
+
+    If the grid would exceed max_tiles, the tile size grows until it fits,
+    trading some small-face recall for a fixed per-image cost.
+    """
+    overlap = min(overlap, tile // 2)
+    while True:
+        xs = _axis_starts(width, tile, overlap)
+        ys = _axis_starts(height, tile, overlap)
+        if len(xs) * len(ys) <= max_tiles:
+            break
+        tile = int(tile * 1.25)
+        overlap = min(overlap, tile // 2)
+
+    return [
+        (x, y, min(x + tile, width), min(y + tile, height))
+        for y in ys for x in xs
+    ]
+
+
+def nms(bboxes: np.ndarray, iou_threshold: float = TILE_NMS_IOU) -> np.ndarray:
+    """
+    Greedy non-maximum suppression over (N, 5) [x1, y1, x2, y2, score] rows.
+    Returns the indices of the kept boxes, highest score first.
+    """
+    if len(bboxes) == 0:
+        return np.zeros((0,), dtype=np.int64)
+
+    x1, y1, x2, y2, scores = bboxes[:, 0], bboxes[:, 1], bboxes[:, 2], bboxes[:, 3], bboxes[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.maximum(0.0, xx2 - xx1 + 1) * np.maximum(0.0, yy2 - yy1 + 1)
+        iou = inter / (areas[i] + areas[order[1:]] - inter)
+        order = order[np.where(iou <= iou_threshold)[0] + 1]
+
+    return np.asarray(keep, dtype=np.int64)
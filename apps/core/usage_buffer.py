@@ -0,0 +1,184 @@
+"""
+Usage Buffer for Aura Core.
+
+log_usage used to insert one usage_logs row per call, so nearly every
+search, upload, browse or profile update paid a full Supabase round trip
+for analytics nobody reads in real time, and the table took a stream of
+tiny writes.
+
+log_usage now appends the event here and returns. A background thread
+writes buffered events as one bulk insert every USAGE_FLUSH_INTERVAL_MS,
+or as soon as USAGE_FLUSH_ROWS are waiting. Memory is bounded: beyond
+USAGE_BUFFER_MAX pending events new ones are dropped (and counted), and
+events from a failed flush are put back only as far as that bound allows.
+main.lifespan flushes what is left on shutdown. Counters show up in
+/health.
+
+Each event keeps its own created_at, so delayed writes don't skew the
+analytics timeline.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 0 = write every event immediately (the old behaviour)
+USAGE_BUFFER_ENABLED = os.getenv("USAGE_BUFFER_ENABLED", "1") == "1"
+USAGE_FLUSH_INTERVAL_MS = int(os.getenv("USAGE_FLUSH_INTERVAL_MS", 2000))
+USAGE_FLUSH_ROWS = int(os.getenv("USAGE_FLUSH_ROWS", 200))
+USAGE_BUFFER_MAX = int(os.getenv("USAGE_BUFFER_MAX", 10000))
+
+
+class UsageBuffer:
+    """
+    Bounded, thread-safe event buffer flushed in bulk by a daemon thread.
+
+    flush_fn receives a list of rows and returns True once they are stored.
+    add() never blocks on the database and is safe from threads and from
+    the event loop alike.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Dict[str, Any]]], bool],
+        interval_ms: int = USAGE_FLUSH_INTERVAL_MS,
+        max_rows: int = USAGE_FLUSH_ROWS,
+        capacity: int = USAGE_BUFFER_MAX
+    ):
+        self.flush_fn = flush_fn
+        self.interval = interval_ms / 1000
+        self.max_rows = max(1, max_rows)
+        self.capacity = max(self.max_rows, capacity)
+        self._pending: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # one bulk write at a time
+        self._closed = False
+        self._counters = {
+            "buffered": 0, "flushed": 0, "flushes": 0,
+            "failed_flushes": 0, "dropped": 0, "requeued": 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="usage-flusher", daemon=True)
+        self._thread.start()
+
+    def add(self, event: Dict[str, Any]) -> bool:
+        """Queue one usage row; False if it was dropped (buffer full or closed)."""
+        event.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        with self._cond:
+            if self._closed or len(self._pending) >= self.capacity:
+                self._counters["dropped"] += 1
+                return False
+            self._pending.append(event)
+            self._counters["buffered"] += 1
+            if len(self._pending) >= self.max_rows:
+                self._cond.notify()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or len(self._pending) >= self.max_rows, self.interval
+                )
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything pending, max_rows per insert. Returns rows stored."""
+        stored = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = self._pending[:self.max_rows]
+                    del self._pending[:self.max_rows]
+                if not batch:
+                    return stored
+
+                try:
+                    ok = self.flush_fn(batch)
+                except Exception as e:
+                    logger.error(f"Usage flush failed: {e}")
+                    ok = False
+
+                with self._cond:
+                    self._counters["flushes"] += 1
+                    if ok:
+                        self._counters["flushed"] += len(batch)
+                        stored += len(batch)
+                        continue
+                    # Put the batch back in front, within capacity, and
+                    # leave the rest for the next interval
+                    self._counters["failed_flushes"] += 1
+                    room = max(0, self.capacity - len(self._pending))
+                    self._pending[:0] = batch[:room]
+                    self._counters["requeued"] += min(room, len(batch))
+                    self._counters["dropped"] += len(batch) - min(room, len(batch))
+                return stored
+
+    def close(self, timeout: Optional[float] = None) -> int:
+        """Stop the flusher and make a final flush; returns rows stored by it."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        stored = self.flush()
+        with self._cond:
+            if self._pending:
+                logger.warning(f"Dropping {len(self._pending)} usage events that could not be flushed")
+                self._counters["dropped"] += len(self._pending)
+                self._pending.clear()
+        return stored
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self._counters, "pending": len(self._pending), "capacity": self.capacity}
+
+
+def _insert_usage_logs(rows: List[Dict[str, Any]]) -> bool:
+    from database_supabase import insert_usage_logs
+    return insert_usage_logs(rows)
+
+
+# Global buffer shared by both data layers
+_buffer: Optional[UsageBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_usage_buffer() -> UsageBuffer:
+    """Lazily create the process-wide buffer from USAGE_* settings."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = UsageBuffer(_insert_usage_logs)
+    return _buffer
+
+
+def buffer_usage(event: Dict[str, Any]) -> Optional[bool]:
+    """
+    Queue a usage_logs row if buffering is enabled; returns whether it was
+    accepted, or None when buffering is off and the caller should write it.
+    """
+    if not USAGE_BUFFER_ENABLED:
+        return None
+    return get_usage_buffer().add(event)
+
+
+def usage_buffer_stats() -> Optional[Dict[str, Any]]:
+    return _buffer.stats() if _buffer is not None else None
+
+
+def close_usage_buffer() -> int:
+    """Final flush on shutdown (called from main.lifespan)."""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is None:
+        return 0
+    start = time.perf_counter()
+    stored = buffer.close()
+    logger.info(f"Flushed {stored} usage events on shutdown in {time.perf_counter() - start:.2f}s")
+    return stored